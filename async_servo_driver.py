@@ -0,0 +1,278 @@
+"""asyncio版舵机驱动（实验性）
+
+与servo_driver.py使用同一套协议编码（encode_packet/PacketEncoder）和应答解析
+（ReplyParser），串口通过pyserial-asyncio的transport/protocol接入事件循环，
+运动、遥测和MQTT/摄像头等IO可以在同一个事件循环里交替进行。
+
+机器人程序（shejimoshi2、test3）不使用这个模块，仍是ServoDriver + ServoBus线程；
+这里只是评估asyncio方案的原型。与同步ServoDriver相比缺少:
+
+    - set_deadband死区过滤、set_guard限位/限速（JointGuard）
+    - mode_write/mode_read、angle_limit/vin_limit/temp_max_limit读写、angle_offset、
+      move_time_wait、move_start/move_stop等其余指令
+    - calibrate_turnaround、tx_drain、set_baudrate
+    - ServoBus的位置指令合并与优先级，这里所有请求只按asyncio.Lock的先后执行
+    - 收发切换时刻受事件循环调度影响：每次发送最后至多SLEEP_SLACK秒（1ms，epoll定时的粒度）
+      用忙等对准，这段时间事件循环不处理别的任务
+
+已实现并有测试（test_async_servo_driver.py，跑在servo_emulator上）的只有:
+move_time_write, move_many, load_or_unload_write, id_read, pos_read, vin_read,
+temp_read, sweep。
+"""
+import asyncio
+import time
+
+import numpy as np
+
+import servo_driver
+from servo_driver import (PACKET_SIZE, READ_TIMEOUT, TURNAROUND_MARGIN, BITS_PER_BYTE, SWEEP_FIELDS, RETRY_BACKOFF,
+                          PacketEncoder, ReplyParser, ReadStats, encode_packet, encode_byte_packet, gpio_init)
+
+try:
+    import serial_asyncio
+    SERIAL_ASYNCIO_AVAILABLE = True
+except ImportError:
+    SERIAL_ASYNCIO_AVAILABLE = False
+
+SLEEP_SLACK = 0.001  # 发送等待的最后这段忙等对准收发切换；不超过事件循环1ms的定时粒度，不阻塞更久
+POLL_INTERVAL = 0.0005  # 直接传入串口对象时事件循环轮询读取的间隔（秒）
+
+
+class _ServoProtocol(asyncio.Protocol):
+    def __init__(self, driver):
+        self.driver = driver
+
+    def data_received(self, data):
+        self.driver._on_data(data)
+
+    def connection_lost(self, exc):
+        self.driver._on_connection_lost(exc)
+
+
+class _PolledTransport(object):
+    """把普通串口对象（如servo_emulator.EmulatedBus）接成transport：写直接调用port.write，
+    读由事件循环每POLL_INTERVAL秒轮询read_all"""
+
+    def __init__(self, port, protocol):
+        self.port = port
+        self.protocol = protocol
+        self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            data = self.port.read_all()
+            if data:
+                self.protocol.data_received(data)
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def write(self, data):
+        self.port.write(data)
+
+    def close(self):
+        self._task.cancel()
+        self.protocol.connection_lost(None)
+
+
+class AsyncServoDriver(object):
+    """用法:
+
+        async with AsyncServoDriver() as servo:
+            await servo.move_many(posture, 20)
+            state, valid = await servo.sweep()
+    """
+
+    def __init__(self, device='/dev/ttyS0', baudrate=115200, port=None):
+        # port可传入已打开的串口对象（如servo_emulator.EmulatedBus），此时不需要pyserial-asyncio
+        self.device = device
+        self.baudrate = baudrate
+        self.port = port
+        self.turnaround = TURNAROUND_MARGIN
+        self.read_timeout = READ_TIMEOUT
+        self._transport = None
+        self._lock = None
+        self._waiter = None  # (node, cmd, future)：当前等待的应答
+        self._scratch = bytearray(PACKET_SIZE)
+        self._scratch_view = memoryview(self._scratch)
+        self._move = PacketEncoder(12)
+        self._parser = ReplyParser()
+        self.read_stats = ReadStats()
+
+    async def open(self):
+        if self.port is None and not SERIAL_ASYNCIO_AVAILABLE:
+            raise ImportError("AsyncServoDriver需要pyserial-asyncio (pip install pyserial-asyncio)")
+        gpio_init()
+        servo_driver.set_direction(False)
+        self._lock = asyncio.Lock()
+        if self.port is not None:
+            self._transport = _PolledTransport(self.port, _ServoProtocol(self))
+        else:
+            self._transport, _ = await serial_asyncio.create_serial_connection(
+                asyncio.get_running_loop(), lambda: _ServoProtocol(self), self.device, baudrate=self.baudrate)
+        return self
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    # ---------- transport回调 ----------
+
+    def _on_data(self, data):
+        parser = self._parser
+        parser.feed(data)
+        frame = parser.pop()
+        while frame is not None:
+            waiter = self._waiter
+            if waiter and frame[0] == waiter[0] and frame[1] == waiter[1] and not waiter[2].done():
+                waiter[2].set_result(frame[2])
+            frame = parser.pop()
+
+    def _on_connection_lost(self, exc):
+        waiter = self._waiter
+        if waiter and not waiter[2].done():
+            waiter[2].set_exception(exc or ConnectionError("servo port closed"))
+
+    # ---------- 底层收发（调用方持有self._lock） ----------
+
+    async def _send(self, data):
+        # 大段发送时间交给事件循环；asyncio.sleep会晚醒约1ms，最后不足SLEEP_SLACK的部分忙等，
+        # 保证收发切换时刻确定。忙等不调用time.sleep，每个包最多占住事件循环SLEEP_SLACK秒
+        servo_driver.set_direction(True)
+        deadline = time.perf_counter() + len(data) * BITS_PER_BYTE / self.baudrate + self.turnaround
+        self._transport.write(bytes(data))
+        remaining = deadline - time.perf_counter()
+        if remaining > SLEEP_SLACK:
+            await asyncio.sleep(remaining - SLEEP_SLACK)
+        while time.perf_counter() < deadline:
+            pass
+        servo_driver.set_direction(False)
+
+    async def _request(self, node, cmd, timeout, retry=False):
+        node &= 0xff
+        parser = self._parser
+        garbage, checksum_errors = parser.garbage, parser.checksum_errors
+        future = asyncio.get_running_loop().create_future()
+        parser.reset()
+        self._waiter = (node, cmd, future)
+        t0 = time.perf_counter()
+        rel = None
+        try:
+            n = encode_packet(self._scratch, node, cmd)
+            await self._send(self._scratch_view[:n])
+            rel = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiter = None
+        self.read_stats.record(node, cmd, rel is not None, time.perf_counter() - t0,
+                               parser.garbage - garbage, parser.checksum_errors - checksum_errors, retry)
+        return rel
+
+    async def _read(self, node, cmd, redo=3, timeout=None):
+        stats = self.read_stats
+        timeout = stats.timeout(node & 0xff, self.read_timeout) if timeout is None else timeout
+        async with self._lock:
+            for attempt in range(stats.attempts(node & 0xff, redo)):
+                if attempt:
+                    await asyncio.sleep(RETRY_BACKOFF * (1 << (attempt - 1)))
+                rel = await self._request(node, cmd, timeout, retry=attempt > 0)
+                if rel is not None:
+                    return rel
+        return False
+
+    def stats(self):
+        return self.read_stats.summary()
+
+    async def _write(self, node, cmd, param1=None, param2=None):
+        async with self._lock:
+            n = encode_packet(self._scratch, node, cmd, param1, param2)
+            await self._send(self._scratch_view[:n])
+
+    async def _write_byte(self, node, cmd, value):
+        async with self._lock:
+            n = encode_byte_packet(self._scratch, node, cmd, value)
+            await self._send(self._scratch_view[:n])
+
+    # ---------- 指令 ----------
+
+    async def move_time_write(self, node, pos, tim):
+        async with self._lock:
+            self._move.pack(0, node, pos, tim)
+            await self._send(self._move.frame(1))
+
+    async def move_many(self, positions, tim, nodes=None):
+        if isinstance(positions, dict):
+            nodes, positions = list(positions.keys()), list(positions.values())
+        elif nodes is None:
+            nodes = range(len(positions))
+        count = len(positions)
+        if not count:
+            return
+        async with self._lock:
+            if count > self._move.slots:
+                self._move = PacketEncoder(count)
+            for slot, (node, pos) in enumerate(zip(nodes, positions)):
+                self._move.pack(slot, node, int(pos), tim)
+            await self._send(self._move.frame(count))
+
+    async def load_or_unload_write(self, node, value):
+        await self._write_byte(node, 31, value)
+
+    async def id_read(self, node):
+        rel = await self._read(node, 14)
+        if not rel or len(rel) != 1:
+            return None
+        return rel[0]
+
+    async def pos_read(self, node):
+        rel = await self._read(node, 28)
+        if not rel or len(rel) != 2:
+            return None
+        return int.from_bytes(rel[:2], 'little'), int.from_bytes(rel[2:], 'little')
+
+    async def vin_read(self, node):
+        rel = await self._read(node, 27)
+        if not rel or len(rel) != 2:
+            return None
+        return int.from_bytes(rel[:2], 'little'), int.from_bytes(rel[2:], 'little')
+
+    async def temp_read(self, node):
+        rel = await self._read(node, 26)
+        if not rel or len(rel) != 1:
+            return None
+        return rel[0]
+
+    async def sweep(self, fields=('pos', 'vin', 'temp'), nodes=range(12), timeout=None):
+        # 与ServoDriver.sweep返回格式相同；每个关节之间释放锁，运动帧可以插进来
+        stats = self.read_stats
+        nodes = list(nodes)
+        data = np.zeros(len(nodes), dtype=[(f, SWEEP_FIELDS[f][2]) for f in fields])
+        valid = np.zeros((len(nodes), len(fields)), dtype=bool)
+        for j, node in enumerate(nodes):
+            node_timeout = stats.timeout(node & 0xff, self.read_timeout) if timeout is None else timeout
+            async with self._lock:
+                for k, field in enumerate(fields):
+                    cmd, size, _ = SWEEP_FIELDS[field]
+                    rel = await self._request(node, cmd, node_timeout)
+                    if rel is not None and len(rel) == size:
+                        data[field][j] = int.from_bytes(rel, 'little', signed=field == 'pos')
+                        valid[j, k] = True
+                    elif stats.is_flaky(node & 0xff):
+                        break
+        return data, valid
+
+
+if __name__ == '__main__':
+    async def demo():
+        async with AsyncServoDriver() as servo:
+            state, valid = await servo.sweep()
+            print(state, valid)
+            await servo.move_time_write(1, 400, 200)
+
+    asyncio.run(demo())
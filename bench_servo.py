@@ -0,0 +1,161 @@
+"""舵机总线微基准
+
+用法: python bench_servo.py encode [次数]
+      python bench_servo.py read [次数] [舵机ID]      （需接真实舵机总线）
+      python bench_servo.py turnaround [舵机ID]       （标定最小收发切换余量）
+      python bench_servo.py gait [帧数]               （整帧move_many吞吐）
+      python bench_servo.py sweep [轮数]              （全关节遥测遍历频率）
+      python bench_servo.py guard [帧数]              （限位/限速每帧开销，不含串口）
+加 --emulate 时使用servo_emulator仿真总线，无需树莓派和舵机。
+"""
+import sys
+import time
+
+from servo_driver import ServoDriver, PacketEncoder, JointGuard, encode_packet
+
+SNAKE_LENGTH = 12
+
+
+def legacy_packet(node, cmd, param1=None, param2=None):
+    # 原ServoDriver._write的组包方式：每包新建list，sum求校验，pyserial再把list转成bytes
+    data = [0x55, 0x55, node & 0xff, 0, cmd & 0xff]
+    data += [param1 & 0xff, (param1 >> 8) & 0xff] if param1 else []
+    data += [param2 & 0xff, (param2 >> 8) & 0xff] if param2 else []
+    data[3] = len(data) - 2
+    data.append(~sum(data[2:]) & 0xff)
+    return bytes(bytearray(data))
+
+
+def _report(name, packets, elapsed):
+    print(f"{name:<28s} {packets / elapsed:>12,.0f} 包/秒  {elapsed / packets * 1e6:7.2f} us/包")
+
+
+def bench_encode(n=200000):
+    print(f"== 组包吞吐（{n} 包，不含串口发送） ==")
+    t0 = time.perf_counter()
+    for k in range(n):
+        legacy_packet(k % SNAKE_LENGTH, 1, 300 + (k & 0xff), 4)
+    _report("legacy _write list", n, time.perf_counter() - t0)
+
+    scratch = bytearray(10)
+    view = memoryview(scratch)
+    t0 = time.perf_counter()
+    for k in range(n):
+        view[:encode_packet(scratch, k % SNAKE_LENGTH, 1, 300 + (k & 0xff), 4)]
+    _report("encode_packet scratch", n, time.perf_counter() - t0)
+
+    enc = PacketEncoder(SNAKE_LENGTH)
+    t0 = time.perf_counter()
+    for k in range(n):
+        enc.pack(k % SNAKE_LENGTH, k % SNAKE_LENGTH, 300 + (k & 0xff), 4)
+    _report("PacketEncoder.pack", n, time.perf_counter() - t0)
+
+    frames = n // SNAKE_LENGTH
+    t0 = time.perf_counter()
+    for k in range(frames):
+        for j in range(SNAKE_LENGTH):
+            enc.pack(j, j, 300 + ((k + j) & 0xff), 4)
+        enc.frame(SNAKE_LENGTH)
+    _report("12关节整帧 (move_many)", frames * SNAKE_LENGTH, time.perf_counter() - t0)
+
+
+def legacy_read(drv, node, cmd):
+    # 原ServoDriver._read的读法：发送后固定等待100ms再read_all
+    drv.port.flush()
+    drv._write(node, cmd)
+    time.sleep(0.1)
+    return drv.port.read_all()
+
+
+def _latency_report(name, samples, failures):
+    samples = sorted(samples)
+    if not samples:
+        print(f"{name:<28s} 全部失败 ({failures} 次)")
+        return
+    p50 = samples[len(samples) // 2]
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<28s} p50 {p50 * 1e3:7.2f} ms  p95 {p95 * 1e3:7.2f} ms  max {samples[-1] * 1e3:7.2f} ms  失败 {failures}")
+
+
+def bench_read(n=50, node=1, drv=None):
+    drv = drv or ServoDriver()
+    print(f"== 寄存器读往返延迟（POS_READ，舵机 {node}，{n} 次） ==")
+    for name, read in (("legacy sleep+read_all", lambda: legacy_read(drv, node, 28)),
+                       ("framed _read", lambda: drv._read(node, 28, redo=0))):
+        samples, failures = [], 0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            rel = read()
+            dt = time.perf_counter() - t0
+            if rel:
+                samples.append(dt)
+            else:
+                failures += 1
+        _latency_report(name, samples, failures)
+
+
+def bench_turnaround(node=1, drv=None):
+    drv = drv or ServoDriver()
+    print(f"== 收发切换余量标定（舵机 {node}，{drv.baudrate} baud） ==")
+    best, chosen = drv.calibrate_turnaround(node)
+    if best is None:
+        print("最大余量下也读不到应答，请检查接线/舵机ID")
+        return
+    print(f"最小可用余量 {best * 1e6:.0f} us，采用 {chosen * 1e6:.0f} us")
+
+
+def bench_gait(frames=500, drv=None):
+    drv = drv or ServoDriver()
+    print(f"== 步态下发吞吐（{frames} 帧 x {SNAKE_LENGTH} 关节） ==")
+    t0 = time.perf_counter()
+    for k in range(frames):
+        drv.move_many([400 + (k + j) % 200 for j in range(SNAKE_LENGTH)], 4)
+    elapsed = time.perf_counter() - t0
+    print(f"{frames / elapsed:8.1f} 帧/秒  {elapsed / frames * 1e3:6.2f} ms/帧")
+
+
+def bench_sweep(rounds=20, drv=None):
+    drv = drv or ServoDriver()
+    print(f"== 全关节遥测遍历（pos/vin/temp，{rounds} 轮） ==")
+    samples, failures = [], 0
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        _, valid = drv.sweep()
+        samples.append(time.perf_counter() - t0)
+        failures += int((~valid).sum())
+    _latency_report("sweep", samples, failures)
+    print(f"约 {len(samples) / sum(samples):.1f} 轮/秒")
+
+
+def bench_guard(frames=20000, drv=None):
+    print(f"== 限位/限速开销（{frames} 帧 x {SNAKE_LENGTH} 关节） ==")
+    guard = JointGuard()
+    for node in range(SNAKE_LENGTH):
+        guard.set_limits(node, 100, 700)
+    nodes = list(range(SNAKE_LENGTH))
+    t0 = time.perf_counter()
+    for k in range(frames):
+        guard.apply(nodes, [400 + (k + j) % 400 for j in range(SNAKE_LENGTH)], 4, now=k * 0.024)
+    elapsed = time.perf_counter() - t0
+    print(f"{elapsed / frames * 1e6:7.2f} us/帧")
+    print(guard.stats())
+
+
+BENCHES = {
+    'encode': bench_encode,
+    'read': bench_read,
+    'turnaround': bench_turnaround,
+    'gait': bench_gait,
+    'sweep': bench_sweep,
+    'guard': bench_guard,
+}
+
+if __name__ == '__main__':
+    argv = [a for a in sys.argv[1:] if a != '--emulate']
+    name = argv[0] if argv else 'encode'
+    args = [int(a) for a in argv[1:]]
+    if '--emulate' in sys.argv and name not in ('encode', 'guard'):
+        from servo_emulator import make_driver
+        BENCHES[name](*args, drv=make_driver())
+    else:
+        BENCHES[name](*args)
@@ -0,0 +1,163 @@
+"""遥测编码对比：JSON+base64（旧）与二进制信封（telemetry_codec）
+
+用法: python bench_telemetry.py [帧数] [图片.jpg]
+不给图片时合成一张320x240、JPEG质量80的带纹理测试图。分别统计带调试字段（ENABLE_DEBUG）
+和只有传感器字段两种情况下每帧的字节数，以及机器人端编码、上位机解码的CPU时间；
+再比较摄像头帧的各种JPEG编码路径（jpeg_encoder）每帧的CPU时间。
+"""
+import base64
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import jpeg_encoder
+import telemetry_codec
+
+SNAKE_LENGTH = 12
+
+
+def legacy_serializable(obj):
+    # 原shejimoshi2.convert_to_serializable：发布前整棵dict递归转换一遍
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.bool_):
+        return bool(obj)
+    elif isinstance(obj, dict):
+        return {k: legacy_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_serializable(i) for i in obj]
+    return obj
+
+
+def legacy_encode(data, jpeg):
+    data = dict(data, camera_frame=base64.b64encode(jpeg).decode('utf-8'))
+    return json.dumps(legacy_serializable(data)).encode()
+
+
+def legacy_decode(payload):
+    data = json.loads(payload.decode())
+    return data, base64.b64decode(data.pop("camera_frame"))
+
+
+def binary_encode(data, jpeg, seq):
+    return (telemetry_codec.encode_scalars(data, seq),
+            telemetry_codec.encode_video(jpeg, data["timestamp"], seq))
+
+
+def binary_decode(scalars, video):
+    return telemetry_codec.decode_scalars(scalars), telemetry_codec.decode_video(video)[1]
+
+
+def test_jpeg():
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (7, 7), 0)
+    cv2.putText(img, 'Snake Robot Control', (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    _, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    return buffer.tobytes()
+
+
+def sample_data(debug):
+    # 与SnakeRobot.get_sensor_data的字段一致
+    data = {
+        "timestamp": time.time(),
+        "current_gait": "蜿蜒模式",
+        "temperature": 26.4,
+        "pressure": 1008.7,
+        "altitude": 38.2,
+        "air_quality": 102,
+        "joint_state": {
+            "pos": [500 + 7 * k for k in range(SNAKE_LENGTH)],
+            "vin": [7400 + k for k in range(SNAKE_LENGTH)],
+            "temp": [38 + k % 3 for k in range(SNAKE_LENGTH)],
+        },
+    }
+    if debug:
+        data["motion_latency"] = {"strategy": "wanyan2", "ms": 18.4}
+        data["tracking"] = {
+            "samples": [120] * SNAKE_LENGTH,
+            "rms_error": [12.5] * SNAKE_LENGTH,
+            "max_error": [40.0] * SNAKE_LENGTH,
+            "mean_residual": [3.1] * SNAKE_LENGTH,
+            "lag_ms": [24.7] * SNAKE_LENGTH,
+            "stalled": [],
+            "stalls": 0,
+        }
+        data["camera_stats"] = {"frames_captured": 1200, "successful": 1198, "failed": 2, "camera_available": True}
+        data["servo_bus"] = {"requests": np.int64(51234), "coalesced": np.int64(812), "queue": 0,
+                             "guard": {"limit_hits": np.zeros(SNAKE_LENGTH, dtype=np.int64)}}
+        data["motion"] = {"ticks": 24000, "late": 3, "rate_hz": np.float64(34.72)}
+    return data
+
+
+def _timeit(fn, n):
+    t0 = time.perf_counter()
+    for k in range(n):
+        fn(k)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def bench(n, jpeg):
+    print(f"JPEG帧 {len(jpeg)} 字节，每项{n}帧")
+    print(f"{'':<16s} {'字节/帧':>9s} {'编码us':>8s} {'解码us':>8s}")
+    for debug in (True, False):
+        data = sample_data(debug)
+        legacy = legacy_encode(data, jpeg)
+        scalars, video = binary_encode(data, jpeg, 1)
+        decoded, frame = binary_decode(scalars, video)
+        assert bytes(frame) == jpeg and decoded["joint_state"] == data["joint_state"]
+        tag = "调试字段" if debug else "仅传感器"
+        enc = _timeit(lambda k: legacy_encode(data, jpeg), n)
+        dec = _timeit(lambda k: legacy_decode(legacy), n)
+        print(f"{'JSON+base64 ' + tag:<16s} {len(legacy):>9d} {enc:>8.1f} {dec:>8.1f}")
+        enc = _timeit(lambda k: binary_encode(data, jpeg, k), n)
+        dec = _timeit(lambda k: binary_decode(scalars, video), n)
+        size = len(scalars) + len(video)
+        print(f"{'二进制 ' + tag:<16s} {size:>9d} {enc:>8.1f} {dec:>8.1f}   "
+              f"（标量{len(scalars)} + 视频{len(video)}，节省{1 - size / len(legacy):.0%}）")
+
+
+def legacy_capture(frame, resolution, quality):
+    # 原OpenCVCamera.capture_frame：resize + imencode + tobytes，每次都新分配
+    if frame.shape[1] != resolution[0] or frame.shape[0] != resolution[1]:
+        frame = cv2.resize(frame, resolution)
+    _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes()
+
+
+def bench_encoders(n, jpeg):
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    raw = np.frombuffer(jpeg, np.uint8).reshape(1, -1)  # MJPEG摄像头read到的数据
+    native = (frame.shape[1], frame.shape[0])
+    half = (native[0] // 2, native[1] // 2)
+    base = jpeg_encoder.create_encoder()
+    mjpeg = jpeg_encoder.MJPEGPassthrough(base, native, 80)
+    cases = [
+        ("legacy imencode", lambda k: legacy_capture(frame, native, 80)),
+        (f"{base.name} BGR", lambda k: base.encode(frame, native, 80)),
+        ("legacy 1/2 resize", lambda k: legacy_capture(frame, half, 55)),
+        (f"{base.name} BGR 1/2", lambda k: base.encode(frame, half, 55)),
+        ("MJPEG passthrough", lambda k: mjpeg.encode(raw, native, 80)),
+        ("MJPEG decode+encode", lambda k: legacy_capture(cv2.imdecode(raw.reshape(-1), cv2.IMREAD_COLOR), half, 55)),
+        ("MJPEG transcode 1/2", lambda k: mjpeg.encode(raw, half, 55)),
+    ]
+    print(f"\n摄像头帧编码 {native[0]}x{native[1]}，每项{n}帧")
+    for name, fn in cases:
+        print(f"{name:<22s} {_timeit(fn, n):>8.1f} us/帧")
+
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'rb') as f:
+            jpeg = f.read()
+    else:
+        jpeg = test_jpeg()
+    bench(frames, jpeg)
+    bench_encoders(max(frames // 10, 50), jpeg)
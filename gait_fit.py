@@ -0,0 +1,193 @@
+"""步态正弦拟合与滞后补偿
+
+把记录下来的关节轨迹（指令与实际位置）按 s = a0*sin(a1*t + a2) + a3 拟合出每个关节的
+幅值、角频率、相位和偏置。所有关节作为一个批量问题求解：先在频率网格上对全部关节
+同时做线性最小二乘（sin/cos/常数三列，按掩码加权，允许每个关节的采样时刻不同），
+再用scipy.optimize.least_squares（块对角稀疏雅可比）一次精修全部参数；没有scipy时
+直接用线性解。
+
+比较同一关节指令与实际的拟合结果可以得到舵机的增益和相位滞后，compensate据此放大
+幅值、提前相位、修正偏置，生成补偿后的GaitGenerator，高频步态下实际轨迹更接近设计值。
+
+轨迹文件为npz：t（秒）、joints（列对应的舵机ID）、commanded、actual（行×列，缺失为nan），
+可由TrackingMonitor.save_trace生成。
+
+用法:
+    python gait_fit.py trace.npz gaits/wanyan2.json [输出.json]
+"""
+import json
+import sys
+
+import numpy as np
+
+from gait_generator import GaitDefinition, GaitGenerator
+
+try:
+    from scipy.optimize import least_squares
+    from scipy.sparse import lil_matrix
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+FREQ_RANGE = (0.1, 5.0)  # 搜索的频率范围（Hz）
+FREQ_STEPS = 400         # 频率网格点数
+GRID_CHUNK_BYTES = 8 << 20  # 频率网格分块求解时每块设计矩阵的大小上限，限制峰值内存
+MIN_SAMPLES = 8          # 少于该样本数的关节不拟合
+MIN_AMPLITUDE = 5.0      # 指令幅值低于该计数的关节（如固定的头部关节）不做幅值/相位补偿
+MAX_GAIN = 1.5           # 幅值补偿的最大倍数
+
+
+def target_func(x, a0, a1, a2, a3):
+    return a0 * np.sin(a1 * x + a2) + a3
+
+
+def _wrap(phase):
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+
+def _normal_equations(A, y, w):
+    # A: (..., n, J, 3)，y/w: (n, J) -> 每个关节的A^T W A (..., J, 3, 3)与A^T W y (..., J, 3)
+    M = np.einsum('...nji,...njk,nj->...jik', A, A, w)
+    b = np.einsum('...nji,nj->...ji', A, w * y)
+    M = M + 1e-9 * np.eye(3)  # 频率接近0时sin列退化
+    return M, b
+
+
+def _design(t, omega):
+    # omega: (..., J) -> 设计矩阵 (..., n, J, 3)
+    wt = np.asarray(omega)[..., None, :] * t[:, None]
+    return np.stack([np.sin(wt), np.cos(wt), np.ones_like(wt)], axis=-1)
+
+
+def _grid_sse(t, yz, w, grid):
+    # 网格上每个频率、每个关节线性解的残差平方和 (len(grid), J)；设计矩阵按GRID_CHUNK_BYTES分块，
+    # 整张网格一次展开是 FREQ_STEPS×n×J×3 个float64（1000个样本、12个关节时约115MB）
+    n, joints = yz.shape
+    step = max(1, GRID_CHUNK_BYTES // (n * joints * 3 * 8))
+    yy = (w * yz * yz).sum(axis=0)
+    sse = np.empty((len(grid), joints))
+    for start in range(0, len(grid), step):
+        chunk = grid[start:start + step]
+        M, b = _normal_equations(_design(t, np.broadcast_to(chunk[:, None], (len(chunk), joints))), yz, w)
+        x = np.linalg.solve(M, b[..., None])[..., 0]
+        # 残差平方和 = y^T W y - x^T A^T W y
+        sse[start:start + step] = yy - (x * b).sum(axis=-1)
+    return sse
+
+
+def fit_sines(t, y, omega=None, refine=True):
+    """拟合y (n×J，nan为缺失) 的每一列，返回各关节参数的dict（numpy数组）
+
+    omega: 已知的角频率（rad/s，标量或每关节一个），None时在FREQ_RANGE内搜索
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    w = (~np.isnan(y)).astype(float)
+    yz = np.nan_to_num(y)
+    joints = y.shape[1]
+    samples = w.sum(axis=0)
+    if omega is None:
+        grid = 2 * np.pi * np.linspace(FREQ_RANGE[0], FREQ_RANGE[1], FREQ_STEPS)
+        omega = grid[np.argmin(_grid_sse(t, yz, w, grid), axis=0)]
+    omega = np.broadcast_to(np.asarray(omega, dtype=float), (joints,)).copy()
+    M, b = _normal_equations(_design(t, omega), yz, w)
+    s, c, offset = np.linalg.solve(M, b[..., None])[..., 0].T
+    params = np.stack([np.hypot(s, c), omega, np.arctan2(c, s), offset], axis=1)
+
+    ok = samples >= MIN_SAMPLES
+    if refine and SCIPY_AVAILABLE and ok.any():
+        cols = np.flatnonzero(ok)
+        sparsity = lil_matrix((len(t) * len(cols), 4 * len(cols)), dtype=int)
+        for k in range(len(cols)):
+            sparsity[k::len(cols), 4 * k:4 * k + 4] = 1
+
+        def residual(p):
+            p = p.reshape(-1, 4)
+            return (w[:, cols] * (target_func(t[:, None], *p.T) - yz[:, cols])).ravel()
+
+        params[cols] = least_squares(residual, params[cols].ravel(), jac_sparsity=sparsity).x.reshape(-1, 4)
+
+    # 统一成正幅值、相位在[-pi, pi)
+    flip = params[:, 0] < 0
+    params[flip, 0] *= -1
+    params[flip, 2] += np.pi
+    params[:, 2] = _wrap(params[:, 2])
+    params[~ok] = np.nan
+    err = w * (target_func(t[:, None], *params.T) - yz)
+    rms = np.sqrt(np.nansum(err ** 2, axis=0) / np.maximum(samples, 1))
+    return {
+        "amplitude": params[:, 0],
+        "omega": params[:, 1],
+        "phase": params[:, 2],
+        "offset": params[:, 3],
+        "rms": np.where(ok, rms, np.nan),
+        "samples": samples.astype(int),
+    }
+
+
+def lag(commanded, actual):
+    """指令 -> 实际的增益、相位滞后（rad）与时间滞后（秒）"""
+    gain = actual["amplitude"] / commanded["amplitude"]
+    phase_lag = _wrap(commanded["phase"] - actual["phase"])
+    return gain, phase_lag, phase_lag / commanded["omega"]
+
+
+def compensate(gait, commanded, actual, max_gain=MAX_GAIN):
+    """按拟合出的增益/滞后修正gait，返回补偿后的GaitGenerator
+
+    commanded/actual为fit_sines的结果，列与gait.joints一一对应；拟合失败或指令幅值
+    太小的关节（轨迹里没有在跑这个步态）保持原参数。
+    """
+    gain, phase_lag, _ = lag(commanded, actual)
+    moving = (commanded["amplitude"] >= MIN_AMPLITUDE) & np.isfinite(gain) & (gain > 0)
+    scale = np.where(moving, np.clip(1 / np.where(moving, gain, 1), 1 / max_gain, max_gain), 1.0)
+    advance = np.where(moving, phase_lag, 0.0)
+    # 偏置在下发空间里比较；invert关节下发的是800 - s，修正方向相反
+    shift = np.where(moving, np.nan_to_num(commanded["offset"] - actual["offset"]), 0.0)
+    shift = np.where(gait.invert, -shift, shift)
+    return GaitGenerator(gait.joints, gait.amplitude * scale, gait.period, phase=gait.phase + advance,
+                         offset=gait.offset, bias=gait.bias + shift, invert=gait.invert, step=gait.step,
+                         tick_shift=gait.tick_shift, name=f"{gait.name}_comp" if gait.name else None)
+
+
+def compensate_spec(spec, gait):
+    """用补偿后的gait参数改写步态文件内容（dict），去掉triggers，确认后再手动启用"""
+    spec = dict(spec)
+    spec["name"] = gait.name
+    spec["label"] = f"{spec.get('label', spec['name'])}（滞后补偿）"
+    spec.pop("triggers", None)
+    spec["amplitude"] = [round(float(a), 1) for a in gait.amplitude]
+    spec["phase_pi"] = [round(float(p / np.pi), 4) for p in gait.phase]
+    spec["bias"] = [round(float(b), 1) for b in gait.bias]
+    return spec
+
+
+def fit_trace(path, spec):
+    """读入轨迹文件，按步态文件spec的关节拟合，返回(commanded, actual, 补偿后的GaitGenerator)"""
+    trace = np.load(path)
+    gait = GaitDefinition(spec, path).gait
+    columns = [list(trace["joints"]).index(j) for j in gait.joints]
+    commanded = fit_sines(trace["t"], trace["commanded"][:, columns])
+    actual = fit_sines(trace["t"], trace["actual"][:, columns], omega=commanded["omega"])
+    return commanded, actual, compensate(gait, commanded, actual)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        spec = json.load(f)
+    commanded, actual, gait = fit_trace(sys.argv[1], spec)
+    gain, phase_lag, delay = lag(commanded, actual)
+    print(f"{'关节':>4} {'样本':>4} {'频率Hz':>7} {'指令幅值':>8} {'实际幅值':>8} {'增益':>6} {'滞后ms':>7} {'偏置差':>7} {'RMS':>6}")
+    for k, j in enumerate(gait.joints):
+        print(f"{j:>4} {actual['samples'][k]:>4} {commanded['omega'][k] / 2 / np.pi:>7.3f} "
+              f"{commanded['amplitude'][k]:>8.1f} {actual['amplitude'][k]:>8.1f} {gain[k]:>6.2f} "
+              f"{delay[k] * 1000:>7.1f} {actual['offset'][k] - commanded['offset'][k]:>7.1f} {actual['rms'][k]:>6.1f}")
+    if not SCIPY_AVAILABLE:
+        print("未安装scipy，使用线性拟合结果")
+    out = sys.argv[3] if len(sys.argv) > 3 else sys.argv[2].replace(".json", "_comp.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(compensate_spec(spec, gait), f, ensure_ascii=False, indent=2)
+    print(f"补偿后的步态已写入 {out}")
@@ -0,0 +1,281 @@
+"""向量化步态表
+
+蛇形机器人的正弦类步态都是 s = A*sin(pi*t/T + phase_j) + offset_j + bias_j 的形式，
+GaitGenerator按关节向量一次算出一个完整周期的目标位置表（行×关节，int16），
+运动循环里只需按行取出用move_many下发，不再逐关节调用math.sin。
+
+取整方式与原先逐关节的写法相同：先int()截断，invert关节再取800 - int(s)；第一个周期内
+逐位一致，之后原写法的t一直递增，恰好落在整数边界上的点可能与循环播放的表相差1个计数。
+
+用法:
+    gait = GaitGenerator(range(0, 12, 2), 150, 25, phase=np.pi * np.arange(0, 12, 2) / 4,
+                         offset=400, bias={0: 50, 10: -80}, invert=True)
+    table = gait.table()
+    servo.move_many(table[t % len(table)], 4, gait.joints)
+
+步态是严格周期的，GaitCache按步态参数缓存一个周期的表（LRU淘汰，可选.npy磁盘存储），
+切换模式时直接取表，第一拍就能下发。TurnBlend是运行中可调的转向偏置（lam权值过渡），
+每拍叠加在表行上，转弯不需要重算表。
+
+步态也可以写成gaits/*.json，load_gaits读入后得到GaitDefinition（GaitGenerator + 播放参数），
+不改代码就能在机器人上调参。
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from fractions import Fraction
+
+import numpy as np
+
+SERVO_MIRROR = 800  # invert关节的镜像基准：800 - int(s)
+MAX_ROWS = 10000  # 周期无法整除时表的最大行数
+LAM_RISE_TIME = 1.0  # 直行 -> 转弯，lam从0到1的时间（秒），与zhuawan__lam_mode.m一致
+LAM_FALL_TIME = 1.0  # 转弯 -> 直行，lam从1到0的时间（秒）
+
+
+def per_joint(value, joints, dtype=float):
+    # 标量、序列或{关节ID: 值}（未列出的关节取0）展开成与joints等长的数组
+    if isinstance(value, dict):
+        return np.array([value.get(j, 0) for j in joints], dtype=dtype)
+    arr = np.asarray(value, dtype=dtype)
+    if arr.ndim == 0:
+        return np.full(len(joints), arr, dtype=dtype)
+    if len(arr) != len(joints):
+        raise ValueError(f"需要{len(joints)}个关节的参数，收到{len(arr)}个")
+    return arr
+
+
+class GaitGenerator(object):
+    """按关节向量描述的正弦步态
+
+    joints: 表中各列对应的舵机ID（即move_many的nodes）
+    amplitude/phase/offset/bias/invert/tick_shift: 标量、序列或{关节ID: 值}
+    period: 正弦的半周期T（单位为t）；step: 每行t推进多少；
+    tick_shift: 各关节t的额外偏移（原先逐关节推进t的写法）
+    name: 仅用于GaitCache的磁盘文件名
+    """
+
+    def __init__(self, joints, amplitude, period, phase=0.0, offset=400, bias=0, invert=False,
+                 step=1, tick_shift=0, name=None):
+        self.name = name
+        self.joints = list(joints)
+        self.amplitude = per_joint(amplitude, self.joints)
+        self.period = float(period)
+        self.phase = per_joint(phase, self.joints)
+        self.offset = per_joint(offset, self.joints)
+        self.bias = per_joint(bias, self.joints)
+        self.invert = per_joint(invert, self.joints, bool)
+        self.step = step
+        self.tick_shift = per_joint(tick_shift, self.joints)
+
+    def key(self):
+        # 决定表内容的全部参数（k偏置、速度挡d已体现在bias/phase里）
+        def vec(a):
+            return tuple(round(float(x), 9) for x in a)
+        return (tuple(self.joints), vec(self.amplitude), round(self.period, 9), vec(self.phase),
+                vec(self.offset), vec(self.bias), tuple(bool(x) for x in self.invert),
+                round(float(self.step), 9), vec(self.tick_shift))
+
+    def cycle_rows(self):
+        # 回到同一相位所需的行数：2T/step化成最简分数后的分子
+        ratio = Fraction(2 * self.period).limit_denominator(1000) / Fraction(self.step).limit_denominator(1000)
+        return min(ratio.numerator, MAX_ROWS)
+
+    def table(self, rows=None, start=0):
+        """从t=start起的rows行目标位置（默认一个完整周期），int16 (行×关节)"""
+        rows = self.cycle_rows() if rows is None else rows
+        t = (start + np.arange(rows) * self.step)[:, None] + self.tick_shift
+        s = self.amplitude * np.sin(np.pi * t / self.period + self.phase) + self.offset + self.bias
+        s = np.trunc(s)
+        s = np.where(self.invert, SERVO_MIRROR - s, s)
+        return s.astype(np.int16)
+
+
+def _joint_keys(value):
+    # JSON对象的键只能是字符串，{"关节ID": 值}转回整数键
+    if isinstance(value, dict):
+        return {int(k): v for k, v in value.items()}
+    return value
+
+
+class GaitDefinition(object):
+    """一个步态文件：GaitGenerator加上播放参数
+
+    必填: name, joints, amplitude, period
+    可选: phase_pi（相位，单位为pi）, offset, bias, invert, step, tick_shift，
+          取值为标量、列表或{"关节ID": 值}，含义同GaitGenerator；
+          label（日志里的名称）, rate_hz（下发频率，缺省用策略的默认频率；
+          移植旧循环时按motion_scheduler.loop_rate换算原先实际的周期）, tim（舵机运动时间）,
+          prepare（姿态未知时是否先回中立位）, triggers（[{"mode": 模式, "direction": 方向}]，
+          由StrategyFactory路由到这个步态）, turn（{"weights": 各关节权值, "k": 转弯幅度}，
+          运行中可用左转/右转在原地叠加TurnBlend偏置）
+    """
+
+    def __init__(self, spec, source=None):
+        try:
+            self.name = spec["name"]
+            joints = [int(j) for j in spec["joints"]]
+            amplitude = _joint_keys(spec["amplitude"])
+            period = spec["period"]
+        except KeyError as e:
+            raise ValueError(f"{source or '步态定义'}缺少字段{e}")
+        self.source = source
+        self.gait = GaitGenerator(
+            joints, amplitude, period,
+            phase=np.pi * per_joint(_joint_keys(spec.get("phase_pi", 0)), joints),
+            offset=_joint_keys(spec.get("offset", 400)),
+            bias=_joint_keys(spec.get("bias", 0)),
+            invert=_joint_keys(spec.get("invert", False)),
+            step=spec.get("step", 1),
+            tick_shift=_joint_keys(spec.get("tick_shift", 0)),
+            name=self.name)
+        self.label = spec.get("label", self.name)
+        self.rate = spec.get("rate_hz")
+        self.tim = int(spec.get("tim", 4))
+        self.prepare = bool(spec.get("prepare", True))
+        self.triggers = [(t["mode"], t["direction"]) for t in spec.get("triggers", ())]
+        turn = spec.get("turn")
+        self.turn_weights = per_joint(_joint_keys(turn["weights"]), joints) if turn else None
+        self.turn_k = float(turn.get("k", 0)) if turn else 0.0
+
+
+def load_gaits(directory):
+    """读入directory下的全部*.json，返回({名称: GaitDefinition}, [(文件, 错误)])
+
+    单个文件有错只跳过该文件，其余步态照常可用。
+    """
+    gaits, errors = {}, []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                definition = GaitDefinition(json.load(f), path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            errors.append((path, e))
+            continue
+        gaits[definition.name] = definition
+    return gaits, errors
+
+
+class GaitCache(object):
+    """一个周期步态表的LRU缓存；directory不为None时同时读写<gait.name>-<参数摘要>.npy"""
+
+    def __init__(self, maxsize=16, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._tables = OrderedDict()  # key -> int16表
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.disk_errors = 0
+
+    def _path(self, gait):
+        digest = hashlib.sha1(repr(gait.key()).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{gait.name or 'gait'}-{digest}.npy")
+
+    def _load(self, gait):
+        path = self._path(gait)
+        try:
+            table = np.load(path)
+        except (OSError, ValueError):
+            return None
+        if table.dtype != np.int16 or table.shape != (gait.cycle_rows(), len(gait.joints)):
+            return None
+        return table
+
+    def _save(self, gait, table):
+        path = self._path(gait)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(path + ".tmp.npy", table)
+            os.replace(path + ".tmp.npy", path)
+        except OSError:
+            self.disk_errors += 1
+
+    def table(self, gait):
+        """返回gait一个周期的表（只读），依次查内存、磁盘，最后现算"""
+        key = gait.key()
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return table
+        self.misses += 1
+        table = self._load(gait) if self.directory else None
+        if table is not None:
+            self.disk_hits += 1
+        else:
+            table = gait.table()
+            if self.directory:
+                self._save(gait, table)
+        table.setflags(write=False)
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return table
+
+    def warm(self, gaits):
+        """预先算好（或从磁盘载入）一组步态"""
+        for gait in gaits:
+            self.table(gait)
+
+    def stats(self):
+        return {
+            "size": len(self._tables),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+        }
+
+
+class TurnBlend(object):
+    """lam权值转向偏置，移植自zhuawan__lam_mode.m
+
+    各关节偏置 = weights_j * k（weights通常取(i-1)，尾部偏置最大）。set(k)之后偏置按lam
+    从当前值线性过渡到新值：目标非0（直行->转弯）用rise_time，目标为0用fall_time；
+    转弯中途改方向也从当前偏置开始过渡，不会跳变。set可在任意线程调用。
+    """
+
+    def __init__(self, weights, rise_time=LAM_RISE_TIME, fall_time=LAM_FALL_TIME):
+        self.weights = np.asarray(weights, dtype=float)
+        self.rise_time = rise_time
+        self.fall_time = fall_time
+        self._ramp = (0.0, 0.0, 0.0, 0.0)  # (起点k, 目标k, 开始时刻, 过渡时间)，整体替换保证线程安全
+
+    def reset(self, k=0.0):
+        self._ramp = (float(k), float(k), 0.0, 0.0)
+
+    def set(self, k, now=None):
+        now = time.monotonic() if now is None else now
+        duration = self.rise_time if k else self.fall_time
+        self._ramp = (self.current(now), float(k), now, duration)
+
+    def lam(self, now=None):
+        # 本次过渡的进度，0..1
+        _, _, t0, duration = self._ramp
+        now = time.monotonic() if now is None else now
+        if duration <= 0 or now - t0 >= duration:
+            return 1.0
+        return (now - t0) / duration
+
+    def current(self, now=None):
+        k_from, k_to, t0, duration = self._ramp
+        now = time.monotonic() if now is None else now
+        if duration <= 0 or now - t0 >= duration:
+            return k_to
+        return k_from + (now - t0) / duration * (k_to - k_from)
+
+    def offsets(self, now=None):
+        """当前各关节偏置（计数），int16，可直接加到步态表的行上"""
+        return np.rint(self.weights * self.current(now)).astype(np.int16)
+
+    def state(self):
+        return {"k": round(self.current(), 3), "target": self._ramp[1], "lam": round(self.lam(), 3)}
@@ -0,0 +1,156 @@
+"""摄像头帧的JPEG编码器
+
+摄像头帧原先每帧都在树莓派CPU上cv2.imencode，再tobytes复制一遍；即使摄像头本身输出
+MJPEG，OpenCV也会先解码成BGR再重新编码。这里把编码做成可替换的一层，
+OpenCVCamera.capture_jpeg只调用encoder.encode(帧, 分辨率, 质量):
+
+    OpenCVEncoder     cv2.imencode，直接返回其输出数组的内存（不再tobytes）
+    TurboJPEGEncoder  装了PyTurboJPEG和libturbojpeg时使用，编码进复用的输出缓冲区
+    MJPEGPassthrough  摄像头直接输出MJPEG时，分辨率和质量满足要求就原样转发，
+                      完全省掉解码->编码；需要缩小/降质量时才解码（整数倍缩小在解码时
+                      完成）再交给上面的编码器
+
+缩放的中间图像复用同一块缓冲区，TurboJPEG的解码和编码输出也写进复用的缓冲区（编码结果
+复制一次取出）。交出去的JPEG不复用：paho对QoS1消息会一直持有payload直到收到确认，
+复用会在重发时发出被覆盖的数据。
+"""
+import inspect
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
+AUTO = "auto"
+OPENCV = "opencv"
+TURBOJPEG = "turbojpeg"
+
+
+def is_jpeg(frame):
+    """摄像头在CAP_PROP_CONVERT_RGB=0时read返回的是1行的压缩数据"""
+    return (frame is not None and frame.dtype == np.uint8 and (frame.ndim == 1 or frame.shape[0] == 1)
+            and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8)
+
+
+def _reuse(buffer, shape):
+    return buffer if buffer is not None and buffer.shape == tuple(shape) else None
+
+
+class OpenCVEncoder(object):
+    name = OPENCV
+
+    def __init__(self):
+        self._resized = None
+        self.frames = 0
+
+    def fit(self, frame, resolution):
+        """缩放到resolution，结果写进复用的缓冲区"""
+        width, height = resolution
+        if frame.shape[1] == width and frame.shape[0] == height:
+            return frame
+        self._resized = cv2.resize(frame, (width, height), dst=_reuse(self._resized, (height, width, frame.shape[2])),
+                                   interpolation=cv2.INTER_AREA)
+        return self._resized
+
+    def _encode(self, image, quality):
+        ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return memoryview(buffer.reshape(-1)) if ok else None
+
+    def encode(self, frame, resolution, quality):
+        self.frames += 1
+        return self._encode(self.fit(frame, resolution), quality)
+
+    def stats(self):
+        return {"encoder": self.name, "frames": self.frames}
+
+
+class TurboJPEGEncoder(OpenCVEncoder):
+    """libturbojpeg编码；找不到动态库时构造会抛出异常，由create_encoder回退到OpenCV"""
+    name = TURBOJPEG
+
+    def __init__(self, lib_path=None):
+        super().__init__()
+        self.tj = TurboJPEG(lib_path)
+        # PyTurboJPEG 2.x起encode/decode支持dst，两者分别检查
+        self._has_dst = "dst" in inspect.signature(self.tj.encode).parameters
+        self._decode_dst = "dst" in inspect.signature(self.tj.decode).parameters
+        self._out = None
+
+    def _encode(self, image, quality):
+        if not self._has_dst:
+            return self.tj.encode(image, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        # 最坏情况大小（同tjBufSize）：按16对齐的像素数 x 3 + 头部余量
+        height, width = image.shape[:2]
+        need = ((width + 15) & ~15) * ((height + 15) & ~15) * 3 + 4096
+        if self._out is None or len(self._out) < need:
+            self._out = np.empty(need, np.uint8)
+        _, size = self.tj.encode(image, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420,
+                                 dst=self._out)
+        return self._out[:size].tobytes()
+
+    def decode(self, data, scale, dst=None):
+        """解码MJPEG帧，scale为整数缩小倍数；dst形状相符时解码进dst"""
+        factor = (1, scale) if scale > 1 else None
+        if self._decode_dst and dst is not None:
+            try:
+                return self.tj.decode(data, pixel_format=TJPF_BGR, scaling_factor=factor, dst=dst)
+            except (ValueError, TypeError):
+                pass  # 分辨率切换后形状变了（或该版本不接受dst），这一次重新分配
+        return self.tj.decode(data, pixel_format=TJPF_BGR, scaling_factor=factor)
+
+
+class MJPEGPassthrough(object):
+    """摄像头已经给出JPEG时的编码器
+
+    native: 摄像头输出的分辨率；min_quality: 请求的质量不低于它时（即不要求降质量）原样转发
+    """
+    name = "mjpeg"
+    REDUCED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+               8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    def __init__(self, fallback, native, min_quality):
+        self.fallback = fallback
+        self.native = tuple(native)
+        self.min_quality = min_quality
+        self._decoded = None
+        self.passed = 0
+        self.transcoded = 0
+
+    def _scale(self, resolution):
+        # 解码时就能完成的最大整数倍缩小（2的幂，不小于目标分辨率）
+        ratio = min(self.native[0] // resolution[0], self.native[1] // resolution[1])
+        return max(s for s in self.REDUCED if s <= max(ratio, 1))
+
+    def encode(self, frame, resolution, quality):
+        if not is_jpeg(frame):
+            return self.fallback.encode(frame, resolution, quality)
+        data = frame.reshape(-1)
+        if tuple(resolution) == self.native and quality >= self.min_quality:
+            self.passed += 1
+            return memoryview(data)
+        scale = self._scale(resolution)
+        if isinstance(self.fallback, TurboJPEGEncoder):
+            self._decoded = self.fallback.decode(data, scale, self._decoded)
+        else:
+            self._decoded = cv2.imdecode(data, self.REDUCED[scale])
+        if self._decoded is None:
+            return None
+        self.transcoded += 1
+        return self.fallback.encode(self._decoded, resolution, quality)
+
+    def stats(self):
+        return dict(self.fallback.stats(), passthrough=self.passed, transcoded=self.transcoded)
+
+
+def create_encoder(prefer=AUTO, lib_path=None):
+    """按prefer（auto/turbojpeg/opencv）创建编码器，TurboJPEG不可用时回退到OpenCV"""
+    if prefer in (AUTO, TURBOJPEG) and TURBOJPEG_AVAILABLE:
+        try:
+            return TurboJPEGEncoder(lib_path)
+        except Exception as e:
+            print(f"TurboJPEG unavailable, falling back to OpenCV: {e}")
+    return OpenCVEncoder()
@@ -28,6 +28,7 @@ except ImportError:
 
 # 引入MQTT客户端库
 import paho.mqtt.client as mqtt
+import telemetry_codec
 
 # 导入PySide6 GUI组件
 from PySide6.QtWidgets import *
@@ -49,17 +50,20 @@ MQTT_CLIENT_ID = "USER001"
 MQTT_USERNAME = "public"
 MQTT_PASSWORD = "UQU92K77cpxc2Tm"
 MQTT_TOPIC_PUBLISH = "USER001"
-MQTT_TOPIC_SUBSCRIBE = "USER002"
+MQTT_TOPIC_SUBSCRIBE = "USER002"  # 旧版JSON+base64遥测
+MQTT_TOPIC_SCALARS = telemetry_codec.scalar_topic(MQTT_TOPIC_SUBSCRIBE)  # 二进制遥测：传感器/关节/步态
+MQTT_TOPIC_VIDEO = telemetry_codec.video_topic(MQTT_TOPIC_SUBSCRIBE)      # 二进制遥测：原始JPEG帧
 
 # 地图配置
 DEFAULT_LATITUDE =  22.902542
 DEFAULT_LONGITUDE = 113.875019
 
 # 模式和颜色配置
-GAIT_MODES = ["蠕动模式", "蜿蜒模式", "复位模式"]
+GAIT_MODES = ["蠕动模式", "蜿蜒模式", "翻滚模式", "复位模式"]
 GAIT_COLORS = {
     "蠕动模式": "#00FF88",
     "蜿蜒模式": "#FF8C00", 
+    "翻滚模式": "#B388FF",
     "复位模式": "#FF6B6B"
 }
 DIRECTIONS = {"前进": "↑", "后退": "↓", "左转": "←", "右转": "→", "复位": "↺"}
@@ -1434,8 +1438,9 @@ class MQTTThread(QThread):
         if rc == 0:
             self.is_connected = True
             self.connection_signal.emit(True)
-            client.subscribe(MQTT_TOPIC_SUBSCRIBE)
-            print(f"已连接MQTT并订阅: {MQTT_TOPIC_SUBSCRIBE}")
+            topics = (MQTT_TOPIC_SUBSCRIBE, MQTT_TOPIC_SCALARS, MQTT_TOPIC_VIDEO)
+            client.subscribe([(topic, 0) for topic in topics])
+            print(f"已连接MQTT并订阅: {', '.join(topics)}")
         else:
             print(f"MQTT连接失败，错误码: {rc}")
             self.connection_signal.emit(False)
@@ -1447,40 +1452,53 @@ class MQTTThread(QThread):
     
     def on_message(self, client, userdata, msg):
         try:
+            if msg.topic == MQTT_TOPIC_VIDEO:
+                # 二进制视频帧：固定头 + 原始JPEG
+                _, jpeg = telemetry_codec.decode_video(msg.payload)
+                self.emit_frame(jpeg)
+                return
+            if msg.topic == MQTT_TOPIC_SCALARS:
+                # 二进制标量帧，解码后与JSON遥测结构相同
+                self.sensor_data_signal.emit(telemetry_codec.decode_scalars(msg.payload))
+                return
+            
             data = json.loads(msg.payload.decode())
             print(f"收到MQTT消息: {msg.topic}")
             
             # 处理视频帧
             if "camera_frame" in data:
-                try:
-                    # Base64编码的图像数据
-                    import base64
-                    img_bytes = base64.b64decode(data["camera_frame"])
-                    np_arr = np.frombuffer(img_bytes, np.uint8)
-                    cv_frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-                    
-                    if cv_frame is not None and cv_frame.size > 0:
-                        # 保存接收到的帧到文件用于调试（如果启用了调试模式）
-                        if YOLO_DEBUG:
-                            timestamp = datetime.now().strftime("%H%M%S")
-                            debug_filename = f"mqtt_frame_{timestamp}.jpg"
-                            cv2.imwrite(debug_filename, cv_frame)
-                            print(f"保存MQTT帧到: {debug_filename}, shape={cv_frame.shape}")
-                        
-                        # 发射视频帧信号
-                        self.video_frame_signal.emit(cv_frame)
-                    else:
-                        print(f"无效的MQTT帧数据: size={0 if cv_frame is None else cv_frame.size}")
-                except Exception as e:
-                    print(f"视频帧解析错误: {e}")
-                    import traceback
-                    traceback.print_exc()
+                # Base64编码的图像数据
+                import base64
+                self.emit_frame(base64.b64decode(data.pop("camera_frame")))
             
             # 发送传感器数据信号
             self.sensor_data_signal.emit(data)
             
         except Exception as e:
-            print(f"消息解析错误: {e}")
+            print(f"消息解析错误({msg.topic}): {e}")
+    
+    def emit_frame(self, jpeg):
+        """解码JPEG字节并发射视频帧信号"""
+        try:
+            np_arr = np.frombuffer(jpeg, np.uint8)
+            cv_frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+            
+            if cv_frame is not None and cv_frame.size > 0:
+                # 保存接收到的帧到文件用于调试（如果启用了调试模式）
+                if YOLO_DEBUG:
+                    timestamp = datetime.now().strftime("%H%M%S")
+                    debug_filename = f"mqtt_frame_{timestamp}.jpg"
+                    cv2.imwrite(debug_filename, cv_frame)
+                    print(f"保存MQTT帧到: {debug_filename}, shape={cv_frame.shape}")
+                
+                # 发射视频帧信号
+                self.video_frame_signal.emit(cv_frame)
+            else:
+                print(f"无效的MQTT帧数据: size={0 if cv_frame is None else cv_frame.size}")
+        except Exception as e:
+            print(f"视频帧解析错误: {e}")
+            import traceback
+            traceback.print_exc()
     
     def publish_command(self, command):
         """发布控制命令"""
@@ -2143,7 +2161,7 @@ class MainDashboard(QMainWindow):
         # 检查是否已选择模式
         if not self.current_mode:
             QMessageBox.warning(self, "警告", 
-                "⚠️ 请先选择运动模式！\n\n需要选择蠕动模式或蜿蜒模式后才能控制方向。")
+                "⚠️ 请先选择运动模式！\n\n需要选择蠕动、蜿蜒或翻滚模式后才能控制方向。")
             # 清除方向选择
             for btn in self.direction_buttons.values():
                 btn.setChecked(False)
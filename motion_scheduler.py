@@ -0,0 +1,118 @@
+"""固定频率的运动调度器
+
+按time.monotonic_ns()的绝对截止时刻逐拍执行，每拍的耗时（组帧、排队、打印）不会累积
+成步态变慢；某一拍超时后按策略补拍（catchup）或跳拍（skip），并记录抖动和超时统计。
+
+用法:
+    sched = MotionScheduler(40)
+    sched.run(frames, lambda frame: servo.move_many(frame, 4, nodes), running_flag)
+frames是逐拍产出目标的迭代器；skip策略下被跳过的拍只从迭代器取出、不下发，
+步态相位始终与墙上时间对齐。整帧写入受串口带宽限制、单拍可能超过周期的循环用delay
+策略：不丢拍也不补拍，步态按行推进，只会比设定频率慢、不会变快。
+
+原先的循环没有节拍，一行的周期是循环里各次sleep之和再加上驱动每条写入后固定的等待，
+loop_rate按此换算出与原先相同步速的频率。
+"""
+import time
+from collections import deque
+
+SKIP = "skip"        # 超时后丢掉已经错过的拍，保持相位与时间对齐
+CATCHUP = "catchup"  # 超时后背靠背补发错过的拍，最多落后max_catchup拍
+DELAY = "delay"      # 超时后从当前时刻重新计时，不丢拍也不补拍
+SPIN_NS = 200000     # 截止前最后这段忙等，避开sleep的唤醒误差
+JITTER_WINDOW = 512  # 用于分位数统计的最近抖动样本数
+LEGACY_WRITE_S = 0.0008  # 原驱动每条MOVE_TIME_WRITE写完后固定sleep 0.8ms再切回接收
+
+_END = object()
+
+
+def loop_rate(sleep_s, writes, write_s=LEGACY_WRITE_S):
+    """原循环每行sleep共sleep_s秒、写writes条舵机指令时实际达到的频率（Hz）"""
+    return 1.0 / (sleep_s + writes * write_s)
+
+
+class MotionScheduler(object):
+    def __init__(self, rate, policy=SKIP, max_catchup=3, spin_ns=SPIN_NS):
+        self.rate = rate
+        self.period_ns = int(1e9 / rate)
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.spin_ns = spin_ns
+        self.reset_stats()
+
+    def set_rate(self, rate):
+        """运行中修改频率，从下一拍起生效"""
+        self.rate = rate
+        self.period_ns = int(1e9 / rate)
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.caught_up = 0
+        self.max_late_ns = 0
+        self.busy_ns = 0
+        self._jitter = deque(maxlen=JITTER_WINDOW)
+        self._started = None
+
+    def _sleep_until(self, deadline):
+        while True:
+            remaining = deadline - time.monotonic_ns()
+            if remaining <= 0:
+                return
+            if remaining > self.spin_ns:
+                time.sleep((remaining - self.spin_ns) / 1e9)
+
+    def run(self, frames, emit, running_flag=None):
+        """每拍从frames取一个目标交给emit，直到frames耗尽或running_flag被清除"""
+        frames = iter(frames)
+        deadline = time.monotonic_ns()
+        self._started = deadline
+        for frame in frames:
+            if running_flag is not None and not running_flag.is_set():
+                break
+            period = self.period_ns
+            t0 = time.monotonic_ns()
+            self._jitter.append(t0 - deadline)
+            emit(frame)
+            self.ticks += 1
+            now = time.monotonic_ns()
+            self.busy_ns += now - t0
+            deadline += period
+            late = now - deadline
+            if late <= 0:
+                self._sleep_until(deadline)
+                continue
+            # 本拍结束时已经过了下一拍的截止时刻
+            self.overruns += 1
+            self.max_late_ns = max(self.max_late_ns, late)
+            if self.policy == DELAY:
+                deadline = now
+                continue
+            missed = late // period
+            if self.policy == CATCHUP and missed < self.max_catchup:
+                self.caught_up += 1
+                continue
+            # 丢掉已经错过的整拍，最近错过的那一拍立即执行
+            for _ in range(missed):
+                if next(frames, _END) is _END:
+                    return
+            self.skipped += missed
+            deadline += missed * period
+
+    def stats(self):
+        jitter = sorted(self._jitter)
+        elapsed = time.monotonic_ns() - self._started if self._started else 0
+        return {
+            "rate": self.rate,
+            "ticks": self.ticks,
+            "achieved_rate": round(self.ticks * 1e9 / elapsed, 2) if elapsed else 0.0,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "caught_up": self.caught_up,
+            "max_late_ms": round(self.max_late_ns / 1e6, 3),
+            "jitter_p50_ms": round(jitter[len(jitter) // 2] / 1e6, 3) if jitter else 0.0,
+            "jitter_p99_ms": round(jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))] / 1e6, 3) if jitter else 0.0,
+            "jitter_max_ms": round(jitter[-1] / 1e6, 3) if jitter else 0.0,
+            "load": round(self.busy_ns / elapsed, 3) if elapsed else 0.0,
+        }
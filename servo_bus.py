@@ -0,0 +1,234 @@
+"""半双工舵机总线的独占线程
+
+所有串口读写和TXE/RXE方向切换都只在一个worker线程里进行，其他线程（步态线程、
+关机流程、list_servos等）通过无锁队列（collections.deque）提交请求，避免多个线程
+的数据包在RS-485总线上交错。
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from servo_driver import SWEEP_FIELDS
+
+PRIO_URGENT = 0      # 停止、上下电等必须尽快执行的指令
+PRIO_NORMAL = 1      # 普通读写，如list_servos
+PRIO_BACKGROUND = 2  # 遥测等可以让路的请求
+
+IDLE_WAIT = 0.05  # 空闲时worker的最长等待时间（秒）
+CALL_TIMEOUT = 2.0  # 透明转发的*_read等阻塞调用等待结果的最长时间（秒），超时抛出TimeoutError
+
+# 除*_read外也需要阻塞等待结果的驱动方法
+BLOCKING_CALLS = ("move_stop",)
+
+
+class ServoBus(object):
+    """ServoDriver的总线拥有者代理
+
+    位置指令（move_time_write/move_many）按关节合并，只下发每个关节最新的目标，
+    并且优先于普通读写，但每下发一次位置帧后，若有普通/后台请求在排队，先执行其中一条，
+    步态线程持续写入时读请求也不会饿死；其他驱动方法通过__getattr__透明转发：*_read类
+    方法阻塞等待结果（最多CALL_TIMEOUT秒），写类方法入队后立即返回。
+    """
+
+    def __init__(self, driver, name="servo-bus"):
+        self.driver = driver
+        self._queues = (deque(), deque(), deque())
+        self._positions = {}  # node -> (pos, tim)，尚未下发的最新目标
+        self._yield = False   # 刚下发过位置帧，下一步先让给排队的普通/后台请求
+        self._driver_lock = threading.Lock()  # worker调用驱动时持有；stats()在别的线程读驱动的统计dict时也持有
+        self._wakeup = threading.Event()
+        self._running = True
+
+        # 统计信息
+        self.started = time.monotonic()
+        self.busy_time = 0.0
+        self.commands = 0
+        self.frames = 0
+        self.position_writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._window_start = self.started
+        self._window_busy = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # ---------- 生产者接口（任意线程） ----------
+
+    def move_time_write(self, node, pos, tim):
+        self._queue_position(node, pos, tim)
+        self._wakeup.set()
+
+    def move_many(self, positions, tim, nodes=None):
+        if isinstance(positions, dict):
+            nodes, positions = positions.keys(), positions.values()
+        elif nodes is None:
+            nodes = range(len(positions))
+        for node, pos in zip(nodes, positions):
+            self._queue_position(node, pos, tim)
+        self._wakeup.set()
+
+    def sweep(self, fields=("pos", "vin", "temp"), nodes=range(12), priority=PRIO_BACKGROUND, timeout=CALL_TIMEOUT):
+        """批量遥测：每个关节单独排队，位置帧可以插在关节之间下发，不会被整轮读取阻塞
+
+        timeout为整轮的总等待时间（秒，None为不限）：到时还没读完的关节在valid中记为无效，
+        其请求若还没开始执行就撤销，不会留在队列里占用总线。
+        """
+        nodes = list(nodes)
+        futures = [self.post("sweep", fields, (node,), priority=priority) for node in nodes]
+        data = np.zeros(len(nodes), dtype=[(f, SWEEP_FIELDS[f][2]) for f in fields])
+        valid = np.zeros((len(nodes), len(fields)), dtype=bool)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for j, future in enumerate(futures):
+            try:
+                part, ok = future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except Exception:
+                future.cancel()
+                continue
+            data[j], valid[j] = part[0], ok[0]
+        return data, valid
+
+    def post(self, name, *args, priority=PRIO_NORMAL):
+        """提交一次驱动方法调用，返回Future"""
+        future = Future()
+        queue = self._queues[priority]
+        queue.append((name, args, future))
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        self._wakeup.set()
+        return future
+
+    def call(self, name, *args, priority=PRIO_NORMAL, timeout=None):
+        """提交一次驱动方法调用并等待结果"""
+        return self.post(name, *args, priority=priority).result(timeout)
+
+    def __getattr__(self, name):
+        if name == "driver" or name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self.driver, name)
+        if not callable(attr):
+            return attr
+        if name.endswith("_read") or name in BLOCKING_CALLS:
+            return lambda *args: self.call(name, *args, timeout=CALL_TIMEOUT)
+        return lambda *args: self.post(name, *args)
+
+    def _queue_position(self, node, pos, tim):
+        if node in self._positions:
+            self.coalesced += 1
+        self._positions[node] = (int(pos), tim)
+
+    # ---------- 状态 ----------
+
+    def queue_depth(self):
+        return sum(len(q) for q in self._queues) + len(self._positions)
+
+    def stats(self):
+        """队列深度与总线占用率；utilisation为上次调用stats()以来的窗口值
+
+        驱动的统计（读取计数、死区、限位）由worker在执行指令时写入，这里在_driver_lock下
+        复制，最多等当前这一条指令执行完。
+        """
+        driver = self.driver
+        with self._driver_lock:
+            deadband = driver.deadband_filter.stats() if driver.deadband_filter else None
+            guard = driver.guard.stats() if driver.guard else None
+            reads = driver.read_stats.totals()
+        now = time.monotonic()
+        window = now - self._window_start
+        busy = self.busy_time - self._window_busy
+        self._window_start, self._window_busy = now, self.busy_time
+        return {
+            "queue_depth": [len(q) for q in self._queues],
+            "pending_positions": len(self._positions),
+            "max_depth": self.max_depth,
+            "commands": self.commands,
+            "frames": self.frames,
+            "position_writes": self.position_writes,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "utilisation": round(busy / window, 3) if window > 0 else 0.0,
+            "utilisation_total": round(self.busy_time / max(now - self.started, 1e-9), 3),
+            "deadband": deadband,
+            "guard": guard,
+            "reads": reads,
+        }
+
+    def drain(self, timeout=2.0):
+        """等待队列中的请求全部执行完"""
+        deadline = time.monotonic() + timeout
+        while self.queue_depth() and time.monotonic() < deadline:
+            time.sleep(0.002)
+        return not self.queue_depth()
+
+    def close(self, timeout=2.0):
+        self.drain(timeout)
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    # ---------- worker线程 ----------
+
+    def _flush_positions(self):
+        # 按运动时间分组，每组一帧move_many
+        groups = {}
+        positions = self._positions
+        while positions:
+            try:
+                node, (pos, tim) = positions.popitem()
+            except KeyError:
+                break
+            groups.setdefault(tim, {})[node] = pos
+        for tim, posture in groups.items():
+            t0 = time.perf_counter()
+            try:
+                with self._driver_lock:
+                    self.driver.move_many(posture, tim)
+            except Exception as e:
+                self.errors += 1
+                print(f"servo bus move_many error: {e}")
+            self.busy_time += time.perf_counter() - t0
+            self.frames += 1
+            self.position_writes += len(posture)
+
+    def _execute(self, name, args, future):
+        if not future.set_running_or_notify_cancel():
+            return  # 调用方已超时撤销
+        t0 = time.perf_counter()
+        try:
+            with self._driver_lock:
+                result = getattr(self.driver, name)(*args)
+            future.set_result(result)
+        except Exception as e:
+            self.errors += 1
+            print(f"servo bus {name}{args} error: {e}")
+            future.set_exception(e)
+        self.busy_time += time.perf_counter() - t0
+        self.commands += 1
+
+    def _step(self):
+        urgent, normal, background = self._queues
+        queue = normal or background
+        if urgent:
+            self._execute(*urgent.popleft())
+        elif self._positions and not (self._yield and queue):
+            self._flush_positions()
+            self._yield = True
+        elif queue:
+            self._execute(*queue.popleft())
+            self._yield = False
+        else:
+            return False
+        return True
+
+    def _run(self):
+        while self._running:
+            # 先清事件再检查队列，避免丢失检查之后到达的唤醒
+            self._wakeup.clear()
+            if not self._step():
+                self._wakeup.wait(IDLE_WAIT)
+        while self._step():
+            pass
@@ -1,68 +1,574 @@
 import serial
-import RPi.GPIO as GPIO
 import time
+import os
+import select
+from bisect import bisect_left
+import numpy as np
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    # 非树莓派环境（开发机/CI）：用servo_emulator.install_gpio_shim()装入替身
+    GPIO = None
 
 TXE = 18
 RXE = 4
 
+PACKET_SIZE = 10  # 最长指令包：2字节包头 + ID + LEN + CMD + 4字节参数 + 校验
+READ_TIMEOUT = 0.01  # 单次应答等待时间（秒）
+BITS_PER_BYTE = 10  # 8N1：起始位 + 8数据位 + 停止位
+TURNAROUND_MARGIN = 0.00005  # 最后一个停止位发完后再保持发送方向的余量（秒），可用calibrate_turnaround标定
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50)  # 读往返延迟直方图的桶上界（毫秒），最后一桶为更慢的
+RETRY_BACKOFF = 0.0005  # 第一次重试前的等待（秒），之后每次翻倍
+FAIL_RATE_ALPHA = 0.1  # 每个关节失败率的指数滑动平均系数
+FLAKY_RATE = 0.5  # 失败率超过该值的关节不再重试，超时时间也随失败率缩短
+
+SERVO_RANGE = (0, 1000)  # 位置指令的有效范围，读不到角度限位的关节使用
+MAX_SLEW = 2000  # 位置指令的最大变化速度（计数/秒），约为步态最快关节的1.3倍
+MAX_NODES = 256  # JointGuard按舵机ID直接索引的数组长度
+
+# sweep可读字段: 名称 -> (读指令, 应答参数字节数, numpy类型)
+SWEEP_FIELDS = {
+    'pos': (28, 2, 'i2'),
+    'vin': (27, 2, 'u2'),
+    'temp': (26, 1, 'u1'),
+    'id': (14, 1, 'u1'),
+}
+
 
 def gpio_init():
+    if GPIO is None:
+        raise RuntimeError("RPi.GPIO不可用；离线运行请使用servo_emulator.make_driver()")
     GPIO.setmode(GPIO.BCM)
     GPIO.setwarnings(False)
     GPIO.setup((TXE, RXE), GPIO.OUT)
 
 
-class ServoDriver(object):
+def set_direction(write=True):
+    GPIO.output(TXE, write)
+    GPIO.output(RXE, not write)
+
+
+def encode_packet(buf, node, cmd, param1=None, param2=None):
+    # 把一条指令原地编码进buf（bytearray），返回包长度
+    node &= 0xff
+    cmd &= 0xff
+    buf[0] = buf[1] = 0x55
+    buf[2] = node
+    buf[4] = cmd
+    n = 5
+    chk = node + cmd
+    for param in (param1, param2):
+        if param is None:
+            continue
+        lo, hi = param & 0xff, (param >> 8) & 0xff
+        buf[n] = lo
+        buf[n + 1] = hi
+        chk += lo + hi
+        n += 2
+    buf[3] = n - 2
+    buf[n] = ~(chk + n - 2) & 0xff
+    return n + 1
+
+
+def encode_byte_packet(buf, node, cmd, value):
+    node &= 0xff
+    cmd &= 0xff
+    value &= 0xff
+    buf[0] = buf[1] = 0x55
+    buf[2] = node
+    buf[3] = 4
+    buf[4] = cmd
+    buf[5] = value
+    buf[6] = ~(node + 4 + cmd + value) & 0xff
+    return 7
+
+
+class PacketEncoder(object):
+    # 预分配的定长帧缓冲区（每个槽位一条双参数指令），包头/LEN/CMD只在初始化时写入，
+    # 之后每次只原地改写ID、两个参数和校验字节
+    def __init__(self, slots=1, cmd=1):
+        self.slots = slots
+        self.cmd = cmd & 0xff
+        self.buf = bytearray(PACKET_SIZE * slots)
+        self.view = memoryview(self.buf)
+        for o in range(0, len(self.buf), PACKET_SIZE):
+            self.buf[o:o + 5] = bytes((0x55, 0x55, 0, 7, self.cmd))
+
+    def pack(self, slot, node, param1, param2):
+        buf = self.buf
+        o = slot * PACKET_SIZE
+        node &= 0xff
+        p1l, p1h = param1 & 0xff, (param1 >> 8) & 0xff
+        p2l, p2h = param2 & 0xff, (param2 >> 8) & 0xff
+        buf[o + 2] = node
+        buf[o + 5] = p1l
+        buf[o + 6] = p1h
+        buf[o + 7] = p2l
+        buf[o + 8] = p2h
+        buf[o + 9] = ~(node + 7 + self.cmd + p1l + p1h + p2l + p2h) & 0xff
+
+    def frame(self, count):
+        return self.view[:count * PACKET_SIZE]
+
+
+class ReplyParser(object):
+    # 流式应答解析：按0x55 0x55包头和LEN字段切帧，遇到杂字节或校验错误时逐字节重新同步
+    def __init__(self):
+        self.buf = bytearray()
+        self.garbage = 0
+        self.checksum_errors = 0
+
+    def reset(self):
+        del self.buf[:]
+
+    def feed(self, data):
+        self.buf += data
+
+    def needed(self):
+        # 凑齐当前候选帧还差的字节数
+        buf = self.buf
+        if len(buf) < 4:
+            return 4 - len(buf)
+        return max(buf[3] + 3 - len(buf), 1)
+
+    def pop(self):
+        # 返回(node, cmd, payload)，帧不完整时返回None
+        buf = self.buf
+        while True:
+            i = buf.find(b'\x55\x55')
+            if i < 0:
+                keep = 1 if buf[-1:] == b'\x55' else 0
+                self.garbage += len(buf) - keep
+                del buf[:len(buf) - keep]
+                return None
+            if i:
+                self.garbage += i
+                del buf[:i]
+            if len(buf) < 4:
+                return None
+            length = buf[3]
+            if length < 3 or length > PACKET_SIZE - 3:
+                self.garbage += 1
+                del buf[:1]
+                continue
+            total = length + 3
+            if len(buf) < total:
+                return None
+            if ~sum(buf[2:total - 1]) & 0xff != buf[total - 1]:
+                self.checksum_errors += 1
+                del buf[:1]
+                continue
+            frame = buf[2], buf[4], bytes(buf[5:total - 1])
+            del buf[:total]
+            return frame
+
+
+class DeadbandFilter(object):
+    # 位置写入的变化检测：与上次实际下发值相差不超过deadband计数的目标直接跳过，
+    # 但每个关节至少每refresh秒重发一次；deadband可以是统一值，也可以按关节ID给出（dict或list）
+    def __init__(self, deadband=2, refresh=0.25):
+        self.deadband = deadband
+        self.refresh = refresh
+        self._last = {}  # node -> (上次下发的位置, 下发时刻)
+        self.sent = 0
+        self.suppressed = 0
+        self.suppressed_by_node = {}
+
+    def threshold(self, node):
+        if isinstance(self.deadband, (int, float)):
+            return self.deadband
+        try:
+            return self.deadband[node]
+        except (IndexError, KeyError):
+            return 0
+
+    def filter(self, nodes, positions, now=None):
+        # 返回需要真正下发的(nodes, positions)
+        now = time.monotonic() if now is None else now
+        last = self._last
+        keep_nodes, keep_positions = [], []
+        for node, pos in zip(nodes, positions):
+            pos = int(pos)
+            prev = last.get(node)
+            if prev is not None and abs(pos - prev[0]) <= self.threshold(node) and now - prev[1] < self.refresh:
+                self.suppressed += 1
+                self.suppressed_by_node[node] = self.suppressed_by_node.get(node, 0) + 1
+                continue
+            last[node] = (pos, now)
+            keep_nodes.append(node)
+            keep_positions.append(pos)
+        self.sent += len(keep_nodes)
+        return keep_nodes, keep_positions
+
+    def forget(self, node=None):
+        # 舵机掉电/重新上电后，下一次写入必须真正下发
+        if node is None:
+            self._last.clear()
+        else:
+            self._last.pop(node, None)
+
+    def stats(self):
+        total = self.sent + self.suppressed
+        return {
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "suppressed_ratio": round(self.suppressed / total, 3) if total else 0.0,
+            "suppressed_by_node": dict(self.suppressed_by_node),
+        }
+
+
+class JointGuard(object):
+    # 位置写入的安全限位（numpy向量化，每帧一次）：目标先裁剪到关节的角度限位，
+    # 再限制相对上次下发值的变化量，允许的步长 = max_slew * max(指令运动时间, 距上次下发的时间)，
+    # 因此给足运动时间的大步移动（如1000ms回中立位）不受影响；两类裁剪都按关节计数
+    def __init__(self, max_slew=MAX_SLEW):
+        self.max_slew = max_slew
+        self.lo = np.full(MAX_NODES, SERVO_RANGE[0], dtype=np.float64)
+        self.hi = np.full(MAX_NODES, SERVO_RANGE[1], dtype=np.float64)
+        self._last = np.zeros(MAX_NODES)  # 上次下发的位置
+        self._time = np.full(MAX_NODES, -np.inf)  # 上次下发的时刻，-inf表示未知，不限制变化量
+        self.limit_hits = np.zeros(MAX_NODES, dtype=np.int64)
+        self.slew_hits = np.zeros(MAX_NODES, dtype=np.int64)
+        self.checked = 0
+
+    def set_limits(self, node, lo, hi):
+        self.lo[node] = max(lo, SERVO_RANGE[0])
+        self.hi[node] = min(hi, SERVO_RANGE[1])
+
+    def apply(self, nodes, positions, tim, now=None):
+        # 返回裁剪后的(nodes, positions)，均为list
+        now = time.monotonic() if now is None else now
+        idx = np.asarray(nodes if isinstance(nodes, (list, np.ndarray)) else list(nodes), dtype=np.intp)
+        pos = np.asarray(positions, dtype=np.float64)
+        clipped = np.clip(pos, self.lo[idx], self.hi[idx])
+        step = self.max_slew * np.maximum(now - self._time[idx], tim / 1000.0)
+        last = self._last[idx]
+        out = np.rint(np.clip(clipped, last - step, last + step))
+        # 一帧里每个关节只出现一次，可以直接按索引累加
+        limited = clipped != pos
+        if limited.any():
+            self.limit_hits[idx[limited]] += 1
+        slewed = out != np.rint(clipped)
+        if slewed.any():
+            self.slew_hits[idx[slewed]] += 1
+        self._last[idx] = out
+        self._time[idx] = now
+        self.checked += len(idx)
+        return idx.tolist(), out.astype(np.int64).tolist()
+
+    def forget(self, node=None):
+        # 舵机掉电后实际位置未知，下一次写入不限制变化量
+        if node is None:
+            self._time[:] = -np.inf
+        else:
+            self._time[node] = -np.inf
+
+    def stats(self):
+        hit = np.flatnonzero(self.limit_hits + self.slew_hits)
+        return {
+            "checked": self.checked,
+            "limit_clips": int(self.limit_hits.sum()),
+            "slew_clips": int(self.slew_hits.sum()),
+            "by_node": {int(n): [int(self.limit_hits[n]), int(self.slew_hits[n])] for n in hit},
+            "limits": {int(n): [int(self.lo[n]), int(self.hi[n])]
+                       for n in np.flatnonzero((self.lo != SERVO_RANGE[0]) | (self.hi != SERVO_RANGE[1]))},
+        }
+
+
+class ReadStats(object):
+    # 每个(关节, 指令)的读统计，以及每个关节的失败率（指数滑动平均），用于自适应重试：
+    # 失败率越高重试次数越少、等待应答的超时越短，掉线的关节不会拖慢整轮sweep
     def __init__(self):
+        self.cells = {}  # (node, cmd) -> 计数
+        self.fail_rate = {}  # node -> 失败率
+
+    def _cell(self, node, cmd):
+        cell = self.cells.get((node, cmd))
+        if cell is None:
+            cell = self.cells[(node, cmd)] = {
+                "requests": 0,
+                "ok": 0,
+                "timeouts": 0,
+                "header_errors": 0,
+                "checksum_errors": 0,
+                "retries": 0,
+                "latency_hist": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        return cell
+
+    def record(self, node, cmd, ok, latency, header_errors=0, checksum_errors=0, retry=False):
+        cell = self._cell(node, cmd)
+        cell["requests"] += 1
+        cell["header_errors"] += header_errors
+        cell["checksum_errors"] += checksum_errors
+        if retry:
+            cell["retries"] += 1
+        if ok:
+            cell["ok"] += 1
+            cell["latency_hist"][bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+        else:
+            cell["timeouts"] += 1
+        rate = self.fail_rate.get(node, 0.0)
+        self.fail_rate[node] = rate + FAIL_RATE_ALPHA * ((0.0 if ok else 1.0) - rate)
+
+    def is_flaky(self, node):
+        return self.fail_rate.get(node, 0.0) >= FLAKY_RATE
+
+    def attempts(self, node, redo):
+        # 健康关节重试redo次；失败率过半的关节只试一次，介于两者之间的最多重试一次
+        rate = self.fail_rate.get(node, 0.0)
+        if rate >= FLAKY_RATE:
+            return 1
+        if rate >= FLAKY_RATE / 2:
+            return min(redo, 1) + 1
+        return redo + 1
+
+    def timeout(self, node, base):
+        return base * max(0.25, 1.0 - self.fail_rate.get(node, 0.0))
+
+    def forget(self, node=None):
+        # 只清失败率（如标定收发切换余量时故意制造的失败），计数保留
+        if node is None:
+            self.fail_rate.clear()
+        else:
+            self.fail_rate.pop(node, None)
+
+    def reset(self):
+        self.cells.clear()
+        self.fail_rate.clear()
+
+    def totals(self):
+        total = {"requests": 0, "ok": 0, "timeouts": 0, "header_errors": 0, "checksum_errors": 0, "retries": 0}
+        for cell in self.cells.values():
+            for key in total:
+                total[key] += cell[key]
+        total["flaky"] = sorted(node for node in self.fail_rate if self.is_flaky(node))
+        return total
+
+    def summary(self):
+        # {node: {cmd: 计数}}，外加合计、各关节失败率和直方图的桶上界
+        by_node = {}
+        for (node, cmd), cell in sorted(self.cells.items()):
+            by_node.setdefault(node, {})[cmd] = dict(cell, latency_hist=list(cell["latency_hist"]))
+        return {
+            "nodes": by_node,
+            "totals": self.totals(),
+            "fail_rate": {node: round(rate, 3) for node, rate in sorted(self.fail_rate.items())},
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+        }
+
+
+class ServoDriver(object):
+    def __init__(self, device='/dev/ttyS0', baudrate=115200, port=None):
+        # port可传入已打开的串口对象（如servo_emulator.EmulatedBus），此时不再打开device
         gpio_init()
-        self.delay = {3: 0.00042, 5: 0.00055, 7: 0.0008}
-        self.port = serial.Serial('/dev/ttyS0', 115200, timeout=0.2)
+        self.baudrate = baudrate
+        self.turnaround = TURNAROUND_MARGIN
+        self.tx_drain = False  # True时用tcdrain等待发送完成，而不是按波特率计算后sleep
+        self.port = port if port is not None else serial.Serial(device, baudrate, timeout=0.2)
+        self._scratch = bytearray(PACKET_SIZE)
+        self._scratch_view = memoryview(self._scratch)
+        self._move = PacketEncoder(12)
+        self._parser = ReplyParser()
+        self.read_timeout = READ_TIMEOUT
+        self.deadband_filter = None  # 可选的位置写入死区过滤，见set_deadband
+        self.guard = None  # 可选的限位/限速，见set_guard
+        self.read_stats = ReadStats()
 
     def _dir(self, write=True):
-        GPIO.output(TXE, write)
-        GPIO.output(RXE, not write)
-
-    def _write(self, node, cmd, param1=None, param2=None):
-        data = [0x55, 0x55, node & 0xff, 0, cmd & 0xff]
-        data += [param1 & 0xff, (param1 >> 8) & 0xff] if param1 else []
-        data += [param2 & 0xff, (param2 >> 8) & 0xff] if param2 else []
-        data[3] = len(data) - 2
-        data.append(~sum(data[2:]) & 0xff)
-        # print('%02X ' * len(data) % tuple(data), self.delay[data[3]])
+        set_direction(write)
+
+    def _port_write(self, data):
+        # POSIX串口直接写fd，避免pyserial把缓冲区再复制成bytes；写不完的部分交回pyserial
+        fd = getattr(self.port, 'fd', None)
+        if fd is None:
+            self.port.write(data)
+            return
+        try:
+            n = os.write(fd, data)
+        except BlockingIOError:
+            n = 0
+        if n < len(data):
+            self.port.write(data[n:])
+
+    def _port_read(self, size, timeout):
+        # 等到有数据或超时即返回，不再固定sleep
+        fd = getattr(self.port, 'fd', None)
+        if fd is None:
+            self.port.timeout = timeout
+            return self.port.read(size)
+        ready, _, _ = select.select((fd,), (), (), timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(fd, size)
+        except BlockingIOError:
+            return b''
+
+    def set_baudrate(self, baudrate):
+        # 高波特率模式：舵机支持时把总线提速，收发切换时间随之按新波特率计算
+        self.port.baudrate = baudrate
+        self.baudrate = baudrate
+
+    def tx_time(self, nbytes):
+        return nbytes * BITS_PER_BYTE / self.baudrate
+
+    def _send(self, data):
+        # 发送方向只保持到最后一个字节移出移位寄存器再加turnaround余量
         self._dir(True)
-        self.port.write(data)
-        time.sleep(self.delay[data[3]])
+        t0 = time.perf_counter()
+        self._port_write(data)
+        if self.tx_drain:
+            self.port.flush()
+            remaining = self.turnaround
+        else:
+            remaining = t0 + self.tx_time(len(data)) + self.turnaround - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
         self._dir(False)
 
-    def _write_byte(self, node, cmd, value):
-        data = [0x55, 0x55, node & 0xff, 4, cmd & 0xff, value & 0xff, ~(node+4+cmd+value) & 0xff]
-        self._dir(True)
-        self.port.write(data)
-        time.sleep(0.00055)
-        self._dir(False)
+    def _write(self, node, cmd, param1=None, param2=None):
+        n = encode_packet(self._scratch, node, cmd, param1, param2)
+        # print('%02X ' * n % tuple(self._scratch[:n]))
+        self._send(self._scratch_view[:n])
 
-    def _read(self, node, cmd, redo=3):
-        self.port.flush()
+    def _write_byte(self, node, cmd, value):
+        n = encode_byte_packet(self._scratch, node, cmd, value)
+        self._send(self._scratch_view[:n])
+
+    def _read_frame(self, node, cmd, timeout):
+        # 只读包头/LEN声明的字节数，收到匹配本次请求的完整帧立即返回
+        parser = self._parser
+        node &= 0xff
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = parser.pop()
+            while frame is not None:
+                if frame[0] == node and frame[1] == cmd:
+                    return frame[2]
+                frame = parser.pop()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            chunk = self._port_read(parser.needed(), remaining)
+            if chunk:
+                parser.feed(chunk)
+
+    def _request(self, node, cmd, timeout, retry=False):
+        parser = self._parser
+        garbage, checksum_errors = parser.garbage, parser.checksum_errors
+        t0 = time.perf_counter()
+        self.port.reset_input_buffer()
+        parser.reset()
         self._write(node, cmd)
-        time.sleep(0.1)
-        rel = self.port.read_all()
-        if len(rel) < 7:
-            print(rel)
-            return self._read(node, cmd, redo - 1) if redo else False
-        if rel[0] != 0x55 or rel[1] != 0x55:
-            print('head error')
-            print('%02X ' * len(rel) % tuple(rel))
-            return self._read(node, cmd, redo - 1) if redo else False
-        if ~sum(rel[2: rel[3] + 2]) & 0xff != rel[rel[3] + 2]:
-            print('checksum error')
-            print('%02X ' * len(rel) % tuple(rel))
-            return self._read(node, cmd, redo - 1) if redo else False
-        rel = rel[5:rel[3] + 2]
-        # print('%02X ' * len(rel) % tuple(rel))
+        rel = self._read_frame(node, cmd, timeout)
+        self.read_stats.record(node & 0xff, cmd, rel is not None, time.perf_counter() - t0,
+                               parser.garbage - garbage, parser.checksum_errors - checksum_errors, retry)
         return rel
 
+    def _read(self, node, cmd, redo=3, timeout=None):
+        # 重试次数、超时随该关节的失败率自适应，见ReadStats
+        stats = self.read_stats
+        timeout = stats.timeout(node & 0xff, self.read_timeout) if timeout is None else timeout
+        for attempt in range(stats.attempts(node & 0xff, redo)):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * (1 << (attempt - 1)))
+            rel = self._request(node, cmd, timeout, retry=attempt > 0)
+            if rel is not None:
+                # print('%02X ' * len(rel) % tuple(rel))
+                return rel
+        return False
+
+    def stats(self):
+        return self.read_stats.summary()
+
+    def sweep(self, fields=('pos', 'vin', 'temp'), nodes=range(12), timeout=None):
+        # 对所有关节背靠背发出读请求（不重试、不打印），返回(关节×字段的结构化数组, 有效位掩码)；
+        # 失败率高的关节超时更短，并且一个字段读不到就跳过它本轮剩下的字段
+        stats = self.read_stats
+        nodes = list(nodes)
+        data = np.zeros(len(nodes), dtype=[(f, SWEEP_FIELDS[f][2]) for f in fields])
+        valid = np.zeros((len(nodes), len(fields)), dtype=bool)
+        for j, node in enumerate(nodes):
+            node_timeout = stats.timeout(node & 0xff, self.read_timeout) if timeout is None else timeout
+            for k, field in enumerate(fields):
+                cmd, size, _ = SWEEP_FIELDS[field]
+                rel = self._request(node, cmd, node_timeout)
+                if rel is not None and len(rel) == size:
+                    data[field][j] = int.from_bytes(rel, 'little', signed=field == 'pos')
+                    valid[j, k] = True
+                elif stats.is_flaky(node & 0xff):
+                    break
+        return data, valid
+
+    def calibrate_turnaround(self, node=1, start=0.0003, stop=-0.0003, step=0.000025, trials=10, safety=0.0001):
+        # 从大到小扫描收发切换余量：太小会截断发送，太大会丢应答开头；
+        # 取最小成功余量加safety（不超过最大成功余量），返回(最小成功余量, 采用值)
+        saved = self.turnaround
+        ok = []
+        margin = start
+        while margin >= stop:
+            self.turnaround = margin
+            if all(self._request(node, 14, self.read_timeout) is not None for _ in range(trials)):
+                ok.append(margin)
+            margin -= step
+        self.read_stats.forget(node & 0xff)
+        if not ok:
+            self.turnaround = saved
+            return None, saved
+        self.turnaround = min(ok[-1] + safety, ok[0])
+        return ok[-1], self.turnaround
+
+    def set_deadband(self, deadband=2, refresh=0.25):
+        # deadband为None时关闭过滤
+        self.deadband_filter = None if deadband is None else DeadbandFilter(deadband, refresh)
+        return self.deadband_filter
+
+    def set_guard(self, max_slew=MAX_SLEW, nodes=None):
+        # 打开位置指令的限位/限速；nodes不为None时立即读取这些关节的角度限位并缓存，
+        # max_slew为None时关闭
+        self.guard = None if max_slew is None else JointGuard(max_slew)
+        if self.guard is not None and nodes is not None:
+            self.load_angle_limits(nodes)
+        return self.guard
+
+    def load_angle_limits(self, nodes):
+        # 每个关节读一次angle_limit_read，读不到的保持SERVO_RANGE
+        for node in nodes:
+            limits = self.angle_limit_read(node)
+            if limits is not None:
+                self.guard.set_limits(node, *limits)
+        return {node: (int(self.guard.lo[node]), int(self.guard.hi[node])) for node in nodes}
+
     def move_time_write(self, node, pos, tim):
-        self._write(node, 1, pos, tim)
+        if self.guard is not None:
+            (node,), (pos,) = self.guard.apply((node,), (pos,), tim)
+        if self.deadband_filter is not None and not self.deadband_filter.filter((node,), (pos,))[0]:
+            return
+        self._move.pack(0, node, pos, tim)
+        self._send(self._move.frame(1))
+
+    def move_many(self, positions, tim, nodes=None):
+        # 一帧下发整组关节：所有MOVE_TIME_WRITE包原地编码进同一个缓冲区，只切换一次收发方向
+        if isinstance(positions, dict):
+            nodes, positions = list(positions.keys()), list(positions.values())
+        elif nodes is None:
+            nodes = range(len(positions))
+        if self.guard is not None and len(positions):
+            nodes, positions = self.guard.apply(nodes, positions, tim)
+        if self.deadband_filter is not None:
+            nodes, positions = self.deadband_filter.filter(nodes, positions)
+        count = len(positions)
+        if not count:
+            return
+        if count > self._move.slots:
+            self._move = PacketEncoder(count)
+        pack = self._move.pack
+        for slot, (node, pos) in enumerate(zip(nodes, positions)):
+            pack(slot, node, int(pos), tim)
+        self._send(self._move.frame(count))
 
     def move_time_read(self, node):
         rel = self._read(node, 2)
@@ -115,6 +621,8 @@ class ServoDriver(object):
 
     def angle_limit_write(self, node, min_angle, max_angle):
         self._write(node, 20, min_angle, max_angle)
+        if self.guard is not None:
+            self.guard.set_limits(node, min_angle, max_angle)
 
     def angle_limit_read(self, node, redo=3):
         rel = self._read(node, 21, redo)
@@ -178,6 +686,10 @@ class ServoDriver(object):
         return int.from_bytes(rel[:2], 'little'), int.from_bytes(rel[2:], 'little')
 
     def load_or_unload_write(self, node, value):
+        if self.deadband_filter is not None:
+            self.deadband_filter.forget(node)
+        if self.guard is not None:
+            self.guard.forget(node)
         self._write_byte(node, 31, value)
 
     def load_or_unload_read(self, node):
@@ -0,0 +1,334 @@
+"""舵机总线仿真
+
+在普通Linux上替代RPi.GPIO和/dev/ttyS0：EmulatedBus是进程内的假serial.Serial，
+按波特率模拟半双工总线上每个字节的发送/到达时间，挂着若干个实现LX总线舵机协议的
+VirtualServo（带位置/转速模型、可配置应答延迟和误码率）；FakeGPIO记录TXE/RXE
+方向切换，方向切换过早会截断发送，过晚会丢失应答开头的字节，与真实总线的失败
+方式一致。
+
+用法:
+    from servo_emulator import make_driver
+    servo = make_driver(reply_latency=0.0005, corruption_rate=0.01)
+    servo.move_many([400] * 12, 20)
+"""
+import random
+import time
+from collections import deque
+
+import servo_driver
+from servo_driver import TXE, BITS_PER_BYTE, ReplyParser
+
+BROADCAST_ID = 0xFE
+
+
+class FakeGPIO(object):
+    """RPi.GPIO替身，只实现servo_driver用到的接口"""
+    BCM = 11
+    OUT = 0
+
+    def __init__(self):
+        self.state = {}
+        self.listeners = []
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pins, mode):
+        for pin in (pins if isinstance(pins, (tuple, list)) else (pins,)):
+            self.state.setdefault(pin, False)
+
+    def output(self, pin, value):
+        value = bool(value)
+        changed = self.state.get(pin) != value
+        self.state[pin] = value
+        if changed:
+            now = time.perf_counter()
+            for listener in self.listeners:
+                listener(pin, value, now)
+
+
+def install_gpio_shim():
+    """把servo_driver的GPIO换成FakeGPIO（已安装时直接返回现有实例）"""
+    if not isinstance(servo_driver.GPIO, FakeGPIO):
+        servo_driver.GPIO = FakeGPIO()
+    return servo_driver.GPIO
+
+
+class VirtualServo(object):
+    """单个虚拟舵机：寄存器 + 线性插值的位置模型（受max_speed限制）"""
+
+    def __init__(self, node, position=500, max_speed=1.0):
+        self.node = node
+        self.max_speed = max_speed  # 每毫秒最多转过的计数
+        self.vin = 7400
+        self.temp = 35
+        self.loaded = 0
+        self.offset = 0
+        self.angle_limit = (0, 1000)
+        self.vin_limit = (4500, 12000)
+        self.temp_max = 85
+        self.mode = (0, 0)
+        self.led_ctrl = 0
+        self.led_error = 0
+        self.wait_move = (position, 0)
+        self._from = float(position)
+        self._to = float(position)
+        self._t0 = 0.0
+        self._duration = 0.0
+        self.last_move = (position, 0)
+
+    def position(self, now):
+        if self._duration <= 0 or now >= self._t0 + self._duration:
+            return self._to
+        return self._from + (self._to - self._from) * (now - self._t0) / self._duration
+
+    def move(self, pos, tim, now):
+        lo, hi = self.angle_limit
+        pos = min(max(pos, lo), hi)
+        current = self.position(now)
+        duration = max(tim / 1000.0, abs(pos - current) / (self.max_speed * 1000.0))
+        self._from, self._to, self._t0, self._duration = current, float(pos), now, duration
+        self.last_move = (pos, tim)
+
+    def stop(self, now):
+        self._to = self._from = self.position(now)
+        self._duration = 0.0
+
+    def handle(self, cmd, params, now):
+        # 返回应答参数（bytes），None表示该指令不应答
+        def u16(i):
+            return params[i] | (params[i + 1] << 8)
+
+        def pair(a, b):
+            return int(a).to_bytes(2, 'little', signed=a < 0) + int(b).to_bytes(2, 'little')
+
+        if cmd == 1 and len(params) == 4:
+            self.move(u16(0), u16(2), now)
+        elif cmd == 2:
+            return pair(*self.last_move)
+        elif cmd == 7 and len(params) == 4:
+            self.wait_move = (u16(0), u16(2))
+        elif cmd == 8:
+            return pair(*self.wait_move)
+        elif cmd == 11:
+            self.move(self.wait_move[0], self.wait_move[1], now)
+        elif cmd == 12:
+            self.stop(now)
+        elif cmd == 13 and len(params) == 1:
+            self.node = params[0]
+        elif cmd == 14:
+            return bytes((self.node,))
+        elif cmd == 17 and len(params) == 1:
+            self.offset = params[0] - 256 if params[0] > 127 else params[0]
+        elif cmd == 19:
+            return bytes((self.offset & 0xff,))
+        elif cmd == 20 and len(params) == 4:
+            self.angle_limit = (u16(0), u16(2))
+        elif cmd == 21:
+            return pair(*self.angle_limit)
+        elif cmd == 22 and len(params) == 4:
+            self.vin_limit = (u16(0), u16(2))
+        elif cmd == 23:
+            return pair(*self.vin_limit)
+        elif cmd == 24 and len(params) == 1:
+            self.temp_max = params[0]
+        elif cmd == 25:
+            return bytes((self.temp_max,))
+        elif cmd == 26:
+            return bytes((self.temp,))
+        elif cmd == 27:
+            return self.vin.to_bytes(2, 'little')
+        elif cmd == 28:
+            return int(round(self.position(now))).to_bytes(2, 'little', signed=True)
+        elif cmd == 29 and len(params) == 4:
+            self.mode = (u16(0), u16(2))
+        elif cmd == 30:
+            return pair(*self.mode)
+        elif cmd == 31 and len(params) == 1:
+            self.loaded = params[0]
+        elif cmd == 32:
+            return bytes((self.loaded,))
+        elif cmd == 33 and len(params) == 1:
+            self.led_ctrl = params[0]
+        elif cmd == 34:
+            return bytes((self.led_ctrl,))
+        elif cmd == 35 and len(params) == 1:
+            self.led_error = params[0]
+        elif cmd == 36:
+            return bytes((self.led_error,))
+        return None
+
+
+class EmulatedBus(object):
+    """进程内的假serial.Serial，实现ServoDriver用到的接口"""
+
+    def __init__(self, servos=12, baudrate=115200, reply_latency=0.0005, corruption_rate=0.0,
+                 max_speed=1.0, gpio=None, seed=None):
+        self.baudrate = baudrate
+        self.reply_latency = reply_latency
+        self.corruption_rate = corruption_rate
+        self.timeout = 0.2
+        self.is_open = True
+        self.servos = {i: VirtualServo(i, max_speed=max_speed) for i in range(servos)}
+        self._random = random.Random(seed)
+        self._tx = deque()   # (完成时刻, 字节)：主机已写出、仍在线上的字节
+        self._tx_busy_until = 0.0
+        self._rx = deque()   # (到达时刻, 字节)：舵机应答、尚未到达或未被读走的字节
+        self._received = bytearray()
+        self._servo_parser = ReplyParser()
+        self.gpio = gpio or install_gpio_shim()
+        self.gpio.listeners.append(self._on_gpio)
+
+        # 统计
+        self.frames = 0
+        self.replies = 0
+        self.corrupted = 0
+        self.truncated_bytes = 0
+        self.lost_tx_bytes = 0
+        self.lost_reply_bytes = 0
+
+    # ---------- 时间模型 ----------
+
+    def _byte_time(self):
+        return BITS_PER_BYTE / self.baudrate
+
+    def _on_gpio(self, pin, value, now):
+        # TXE拉低的时刻：之前发完的字节送给舵机，之后的字节被截断
+        if pin == TXE and not value:
+            self._release(now)
+
+    def _release(self, now):
+        while self._tx:
+            done, byte = self._tx.popleft()
+            if done > now:
+                self.truncated_bytes += 1 + len(self._tx)
+                self._tx.clear()
+                break
+            self._servo_parser.feed(bytes((byte,)))
+            frame = self._servo_parser.pop()
+            if frame is not None:
+                self._dispatch(frame, done, now)
+        self._servo_parser.reset()
+        self._tx_busy_until = min(self._tx_busy_until, now)
+
+    def _dispatch(self, frame, done, released):
+        node, cmd, params = frame
+        self.frames += 1
+        targets = self.servos.values() if node == BROADCAST_ID else [s for s in self.servos.values() if s.node == node]
+        for servo in list(targets):
+            reply = servo.handle(cmd, params, done)
+            if reply is None or node == BROADCAST_ID:
+                continue
+            self._queue_reply(servo.node, cmd, reply, done + self.reply_latency, released)
+
+    def _queue_reply(self, node, cmd, params, start, released):
+        data = bytearray((0x55, 0x55, node, len(params) + 3, cmd)) + params
+        data.append(~sum(data[2:]) & 0xff)
+        if self.corruption_rate and self._random.random() < self.corruption_rate:
+            data[self._random.randrange(len(data))] ^= 1 << self._random.randrange(8)
+            self.corrupted += 1
+        self.replies += 1
+        bt = self._byte_time()
+        for k, byte in enumerate(data):
+            arrival = start + (k + 1) * bt
+            # 主机还在发送方向时到达的字节收不到
+            if arrival <= released:
+                self.lost_reply_bytes += 1
+                continue
+            self._rx.append((arrival, byte))
+
+    def _collect(self, now):
+        rx = self._rx
+        while rx and rx[0][0] <= now:
+            self._received.append(rx.popleft()[1])
+
+    # ---------- serial.Serial接口 ----------
+
+    def write(self, data):
+        data = bytes(data)
+        if not self.gpio.state.get(TXE):
+            self.lost_tx_bytes += len(data)
+            return len(data)
+        now = time.perf_counter()
+        t = max(now, self._tx_busy_until)
+        bt = self._byte_time()
+        for byte in data:
+            t += bt
+            self._tx.append((t, byte))
+        self._tx_busy_until = t
+        return len(data)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + (self.timeout if self.timeout is not None else 1e9)
+        while True:
+            now = time.perf_counter()
+            self._collect(now)
+            if len(self._received) >= size or now >= deadline:
+                break
+            wait = deadline - now
+            if self._rx:
+                wait = min(wait, self._rx[0][0] - now)
+            if wait > 0:
+                time.sleep(wait)
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        return data
+
+    def read_all(self):
+        self._collect(time.perf_counter())
+        data = bytes(self._received)
+        self._received.clear()
+        return data
+
+    @property
+    def in_waiting(self):
+        self._collect(time.perf_counter())
+        return len(self._received)
+
+    @property
+    def out_waiting(self):
+        now = time.perf_counter()
+        return sum(1 for done, _ in self._tx if done > now)
+
+    def flush(self):
+        remaining = self._tx_busy_until - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def reset_input_buffer(self):
+        self._collect(time.perf_counter())
+        self._received.clear()
+
+    def reset_output_buffer(self):
+        self._tx.clear()
+
+    def close(self):
+        self.is_open = False
+        if self._on_gpio in self.gpio.listeners:
+            self.gpio.listeners.remove(self._on_gpio)
+
+    # ---------- 观测 ----------
+
+    def positions(self):
+        now = time.perf_counter()
+        return [int(round(s.position(now))) for s in self.servos.values()]
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "replies": self.replies,
+            "corrupted": self.corrupted,
+            "truncated_bytes": self.truncated_bytes,
+            "lost_tx_bytes": self.lost_tx_bytes,
+            "lost_reply_bytes": self.lost_reply_bytes,
+        }
+
+
+def make_driver(servos=12, baudrate=115200, **kwargs):
+    """装好GPIO替身，返回挂在EmulatedBus上的ServoDriver"""
+    install_gpio_shim()
+    bus = EmulatedBus(servos=servos, baudrate=baudrate, **kwargs)
+    return servo_driver.ServoDriver(baudrate=baudrate, port=bus)
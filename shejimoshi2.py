@@ -1,8 +1,19 @@
 from servo_driver import ServoDriver
+from servo_bus import ServoBus, PRIO_URGENT, PRIO_NORMAL, PRIO_BACKGROUND
+from gait_generator import GaitCache, TurnBlend, load_gaits
+from motion_scheduler import MotionScheduler, loop_rate
+from trajectory import KeyframeTrajectory
+from tracking import TrackingMonitor, JointStateCache
+import telemetry_codec
+from telemetry_pipeline import Pipeline
+from video_control import LinkMonitor, AdaptiveVideoController
+from jpeg_encoder import create_encoder, is_jpeg, MJPEGPassthrough
 import time
 import math
 import numpy as np
 import threading
+import itertools
+import functools
 import paho.mqtt.client as mqtt
 import json
 import cv2
@@ -50,6 +61,9 @@ IMAGE_DATA_DIR = "images"  # 图像数据目录
 MAX_STORAGE_SIZE_MB = 500  # 最大存储空间（MB）
 DATA_SEND_INTERVAL = 60  # 数据发送间隔（秒）
 MAX_FILES_PER_BATCH = 50  # 每批次最大文件数
+GAIT_CACHE_DIR = "/home/pi/snake_robot_data/gait_cache"  # 步态表.npy缓存目录，None时只缓存在内存
+TRACE_DATA_DIR = "traces"  # 每次步态结束时保存的指令/实际位置轨迹（npz，供gait_fit.py拟合）
+TRACE_KEEP = 20  # 最多保留的轨迹文件数
 DATA_RETENTION_DAYS = 7  # 数据保留天数
 
 # 尝试导入SPL06压力/温度传感器
@@ -75,6 +89,30 @@ SNAKE_LENGTH = 12
 DEFAULT_TEMPERATURE = 25.0
 DEFAULT_PRESSURE = 1013.0
 DEFAULT_AIR_QUALITY = 80
+JOINT_STATE_FIELDS = ("pos", "vin", "temp")  # 随传感器数据发布的关节状态字段
+JOINT_STATE_BATCH = 2       # 每个遥测周期最多补读的关节数（只读其过期字段），其余取缓存
+JOINT_STATE_TIMEOUT = 0.05  # 每个遥测周期补读的总等待时间（秒），读不到的下个周期再补
+
+# 中立位姿（按关节ID排列）：1、3号410，9、11号370，其余400
+NEUTRAL_POSTURE = [400, 410, 400, 410, 400, 400, 400, 400, 400, 370, 400, 370]
+
+# 翻滚：先回中立位并稳定1s，然后3/9号与2/10号交替摆到250/550，每步1s，20个循环
+NEUTRAL_KEYFRAME = (dict(enumerate(NEUTRAL_POSTURE)), 1.0, 1.0)
+FANGUN_L_KEYFRAMES = [NEUTRAL_KEYFRAME] + [({3: 250, 9: 250}, 1.0), ({2: 250, 10: 250}, 1.0),
+                                           ({3: 550, 9: 550}, 1.0), ({2: 550, 10: 550}, 1.0)] * 20
+FANGUN_R_KEYFRAMES = [NEUTRAL_KEYFRAME] + [({3: 550, 9: 550}, 1.0), ({2: 250, 10: 250}, 1.0),
+                                           ({3: 250, 9: 250}, 1.0), ({2: 550, 10: 550}, 1.0)] * 20
+
+# 正弦步态定义在gaits/*.json（s = A*sin(pi*t/T + phase) + offset + bias，invert关节写800 - int(s)），
+# 启动时由StrategyFactory.load编译成步态表；新步态放进该目录、写上triggers即可，无需改代码
+GAIT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gaits")
+# 默认步态节拍：原循环每行6个关节各写一条指令、各sleep 0.004s，驱动每条写入后还固定等待0.8ms，
+# 实际周期28.8ms，约34.7Hz。步态文件的rate_hz可单独覆盖（wanyan2每行多写一次0号关节，约33.8Hz）
+GAIT_RATE_HZ = loop_rate(0.004 * 6, 6)
+# 可原地转向的步态（定义里带turn）：左转为+k、右转为-k，k取自步态文件
+TURN_SIGN = {"前进": 0, "左转": 1, "右转": -1}
+TRANSITION_TICKS = 12  # 热切换步态时，从当前姿态过渡到新步态相位的拍数（约0.35s）
+GAIT_CACHE_SIZE = 16  # 内存中最多缓存的步态表个数
 
 # MQTT设置
 MQTT_BROKER = "47.107.36.182"
@@ -87,16 +125,33 @@ MQTT_PASSWORD = "UQU92K77cpxc2Tm"
 MQTT_TOPIC_PUBLISH = "USER002"    # 机器人发布传感器数据
 MQTT_TOPIC_SUBSCRIBE = "USER001"  # 机器人订阅控制命令
 MQTT_TOPIC_DATA_BATCH = "USER002/data_batch"  # 批量数据发送主题
+MQTT_TOPIC_SCALARS = telemetry_codec.scalar_topic(MQTT_TOPIC_PUBLISH)  # 二进制遥测：传感器/关节/步态
+MQTT_TOPIC_VIDEO = telemetry_codec.video_topic(MQTT_TOPIC_PUBLISH)      # 二进制遥测：原始JPEG帧
+# 遥测格式："binary"发到上面两个主题，"json"为原先的JSON+base64（旧版上位机），"both"两种都发
+TELEMETRY_FORMAT = "binary"
+VIDEO_QOS = 1  # 视频帧的QoS；1时按PUBACK测量链路往返时间，供自适应码率使用
 
 # 摄像头设置
 CAMERA_RESOLUTION = (320, 240)
 JPEG_QUALITY = 80
-FRAME_RATE = 10
+FRAME_RATE = 10   # 视频流水线采集频率（Hz）；ADAPTIVE_VIDEO时为最高档的帧率
+JPEG_ENCODER = "auto"  # "auto"：有libturbojpeg时用TurboJPEG，否则OpenCV；也可指定"turbojpeg"/"opencv"
+CAMERA_MJPEG = True    # 摄像头支持MJPEG时直接取压缩数据，分辨率/质量不需要变时原样转发，不解码不重编码
+CAMERA_GRABBER = True  # 后台线程持续读取摄像头，发布时只取最新一帧；False时在发布线程里同步读取
+ADAPTIVE_VIDEO = True  # 按链路拥塞情况调节分辨率/JPEG质量/帧率（video_control.LADDER），False时固定
+SENSOR_RATE = 10  # 标量遥测流水线频率（Hz），与视频互不影响
 ENABLE_DEBUG = True
 TRY_ALTERNATE_BACKENDS = True
 
 # 串口选项
 SERIAL_PORTS = ['/dev/ttyS0', '/dev/ttyAMA0', '/dev/ttyUSB0', '/dev/ttyACM0']
+SERVO_BAUDRATE = 115200  # 舵机总线波特率，舵机支持时可调高
+SERVO_TX_DRAIN = False   # True时用tcdrain判断发送完成，否则按波特率计算发送时间
+SERVO_DEADBAND = 2       # 目标变化不超过该计数时跳过写入，None关闭
+SERVO_REFRESH = 0.25     # 被跳过的关节至少每隔该秒数重发一次
+SERVO_MAX_SLEW = 2000    # 位置指令最大变化速度（计数/秒），超出按拍裁剪；None关闭限位/限速
+FEEDBACK_INTERVAL = 0.005  # 运动中后台位置回读的间隔（秒），按关节轮流，每个关节约每60ms一次
+FEEDBACK_PIPELINE = 2      # 最多同时排队的回读请求，总线空闲时下一条已在队列里
 
 # 单例模式元类
 class Singleton(type):
@@ -139,6 +194,7 @@ class DataStorageManager(metaclass=Singleton):
         self.log_data_file = os.path.join(self.base_dir, f"{self.current_date}_{LOG_DATA_FILE}")
         self.pending_files = []  # 待发送文件列表
         self.send_lock = threading.Lock()  # 发送操作的锁
+        self.latest_image = ""  # 视频流水线最近存下、还没写进CSV的图像
         
         # 初始化存储目录
         self._init_directories()
@@ -350,6 +406,9 @@ class DataStorageManager(metaclass=Singleton):
             image_filename = ""
             if "camera_frame" in data:
                 image_filename = self._store_image(data["camera_frame"], timestamp)
+            else:
+                # 图像由视频流水线单独存储，这里引用最近一帧
+                image_filename, self.latest_image = self.latest_image, ""
             
             # 写入CSV
             with open(self.sensor_data_file, 'a', newline='') as csvfile:
@@ -367,6 +426,14 @@ class DataStorageManager(metaclass=Singleton):
             print_terminal(f"存储传感器数据时出错: {e}")
             return False
     
+    def store_image(self, image_data, timestamp=None):
+        """单独存储一帧图像（视频流水线调用），文件名记入下一行传感器数据"""
+        timestamp = datetime.datetime.fromtimestamp(timestamp or time.time()).strftime("%Y-%m-%d %H:%M:%S")
+        filename = self._store_image(image_data, timestamp)
+        if filename:
+            self.latest_image = filename
+        return filename
+    
     def _store_image(self, image_data, timestamp):
         """存储图像数据到文件"""
         try:
@@ -374,8 +441,8 @@ class DataStorageManager(metaclass=Singleton):
             filename = f"img_{timestamp.replace(' ', '_').replace(':', '-')}_{hash(time.time()) % 1000}.jpg"
             filepath = os.path.join(self.today_image_dir, filename)
             
-            # 将base64解码为二进制
-            image_bytes = base64.b64decode(image_data)
+            # JSON遥测里的帧是base64文本，二进制遥测直接是JPEG数据（bytes或memoryview）
+            image_bytes = base64.b64decode(image_data) if isinstance(image_data, str) else image_data
             
             # 写入文件
             with open(filepath, 'wb') as f:
@@ -511,91 +578,98 @@ class SensorFactory:
 
 # 移动策略的抽象基类
 class MovementStrategy(ABC):
+    rate = GAIT_RATE_HZ  # stream下发步态表的频率（Hz）
+
     @abstractmethod
     def execute(self, robot, running_flag):
         pass
 
-# 蠕动前进策略
-class RudongStrategy(MovementStrategy):
+    def stream(self, robot, running_flag, gait, tim=4, blend=None, rate=None):
+        # 按绝对截止时刻以rate（缺省self.rate）逐行整帧下发步态表，直到running_flag被清除；
+        # 主机负载造成的超时按拍跳过，步态速度不随负载变化；blend为TurnBlend时每拍叠加转向偏置。
+        # 从与当前姿态最接近的相位开始，剩余差值在TRANSITION_TICKS拍内线性消掉
+        table = robot.gait_cache.table(gait)
+        joints = gait.joints
+        start, offset = robot.phase_entry(joints, table)
+        scheduler = MotionScheduler(rate or self.rate)
+        robot.motion_scheduler = scheduler
+
+        def frames():
+            for k in itertools.count():
+                row = table[(start + k) % len(table)]
+                if offset is not None and k < TRANSITION_TICKS:
+                    row = row + offset * (TRANSITION_TICKS - k) // TRANSITION_TICKS
+                yield row
+
+        def emit(row):
+            if blend is not None:
+                row = row + blend.offsets()
+            robot.servo.move_many(row, tim, joints)
+            robot.note_posture(joints, row, tim)
+
+        scheduler.run(frames(), emit, running_flag)
+
+    def play(self, robot, running_flag, trajectory, loop=False):
+        # 从当前姿态出发按trajectory.rate逐拍下发关键帧插值表，每拍之间检查running_flag；
+        # loop时从上一遍的终点接着重复。每拍只下发目标有变化的关节
+        scheduler = MotionScheduler(trajectory.rate)
+        robot.motion_scheduler = scheduler
+        joints = np.array(trajectory.joints)
+        tim = trajectory.tick_ms()
+        last = None
+
+        def frames():
+            while True:
+                yield from trajectory.table(robot.last_posture)
+                if not loop:
+                    return
+
+        def emit(row):
+            nonlocal last
+            changed = slice(None) if last is None else row != last
+            last = row
+            nodes, positions = joints[changed].tolist(), row[changed].tolist()
+            if nodes:
+                robot.servo.move_many(positions, tim, nodes)
+                robot.note_posture(nodes, positions, tim)
+
+        scheduler.run(frames(), emit, running_flag)
+
+# 步态文件策略：gaits/*.json里的正弦步态按文件声明的频率循环下发
+class TableGaitStrategy(MovementStrategy):
+    gait_name = None
+
+    def __init__(self, name=None):
+        self.name = name or self.gait_name
+
+    @property
+    def definition(self):
+        return StrategyFactory.gaits[self.name]
+
     def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting rudong (forward movement)")
+        definition = self.definition
+        print_terminal(f"【执行动作】Starting {self.name} ({definition.source})")
         # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始蠕动前进")
+        robot.data_storage.log_event("MOVEMENT", f"开始{definition.label}")
         
-        # 先重置到中立位置
-        robot.reset_to_neutral()
+        # 姿态未知时先回中立位，否则从当前姿态平滑接上
+        if definition.prepare:
+            robot.prepare_gait()
         
-        t = 0  # 重置时间计数器
-        # 继续移动，直到停止标志设置
-        while running_flag.is_set(): 
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                if i == 0:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 + 50
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)         
-                if i == 2:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 4 or i == 6 or i == 8:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 10:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 - 80
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-            if not running_flag.is_set():
-                break
-            t = t + 1
+        # 继续移动，直到停止标志设置；可转向的步态每拍叠加robot.turn_blend
+        blend = robot.turn_blend if definition.turn_weights is not None else None
+        self.stream(robot, running_flag, definition.gait, definition.tim, blend, definition.rate)
         
         # 记录结束事件
-        robot.data_storage.log_event("MOVEMENT", "结束蠕动前进")
+        robot.data_storage.log_event("MOVEMENT", f"结束{definition.label}")
+
+# 蠕动前进策略
+class RudongStrategy(TableGaitStrategy):
+    gait_name = "rudong"
 
 # 后退策略
-class HoutuiStrategy(MovementStrategy):
-    def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting houtui (backward movement)")
-        # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始后退")
-        
-        t = 0  # 重置时间计数器
-        while running_flag.is_set():
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                if i == 10:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * 0 / 4)) + 400 + 50
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)         
-                if i == 8:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * 2 / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 6:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * 4 / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 4:
-                    s = 150 * (math.sin(math.pi * t / 25 + math.pi * 6 / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 2:
-                    s = 120 * (math.sin(math.pi * t / 25 + math.pi * 8 / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 0:
-                    s = 120 * (math.sin(math.pi * t / 25 + math.pi * 10 / 4)) + 400 - 80
-                    robot.servo.move_time_write(i, 500, 4)
-                    time.sleep(0.004)
-            if not running_flag.is_set():
-                break
-            t = t + 1
-        
-        # 记录结束事件
-        robot.data_storage.log_event("MOVEMENT", "结束后退")
+class HoutuiStrategy(TableGaitStrategy):
+    gait_name = "houtui"
 
 # 左转策略
 class ZuozhuanStrategy(MovementStrategy):
@@ -608,38 +682,14 @@ class ZuozhuanStrategy(MovementStrategy):
         for i in range(1, 4):
             if not running_flag.is_set():
                 return
-            robot.servo.move_time_write(1, 410 + 20 * i, 20)
-            robot.servo.move_time_write(5, 400 + 20 * i, 20)
-            robot.servo.move_time_write(9, 370 + 20 * i, 20)
-            robot.servo.move_time_write(3, 410 + 20 * i, 20)
-            robot.servo.move_time_write(7, 400 + 20 * i, 20)
-            robot.servo.move_time_write(11, 370 + 20 * i, 20)
+            posture = {1: 410 + 20 * i, 5: 400 + 20 * i, 9: 370 + 20 * i,
+                       3: 410 + 20 * i, 7: 400 + 20 * i, 11: 370 + 20 * i}
+            robot.servo.move_many(posture, 20)
+            robot.note_posture(posture.keys(), posture.values(), 20)
             time.sleep(0.060)
 
-        t = 0
         # 继续移动，直到停止标志设置
-        while running_flag.is_set():
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                if i == 0:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 + 50
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)         
-                if i == 2:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 4 or i == 6 or i == 8:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 10:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 - 80
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-          
-            t = t + 1
+        self.stream(robot, running_flag, StrategyFactory.gaits["zhuanwan"].gait)
         
         # 记录结束事件
         robot.data_storage.log_event("MOVEMENT", "结束左转")
@@ -655,204 +705,49 @@ class YouzhuanStrategy(MovementStrategy):
         for i in range(1, 4):
             if not running_flag.is_set():
                 return
-            robot.servo.move_time_write(1, 410 - 20 * i, 20)
-            robot.servo.move_time_write(5, 400 - 20 * i, 20)
-            robot.servo.move_time_write(9, 370 - 20 * i, 20)
-            robot.servo.move_time_write(3, 410 - 20 * i, 20)
-            robot.servo.move_time_write(7, 400 - 20 * i, 20)
-            robot.servo.move_time_write(11, 370 - 20 * i, 20)
+            posture = {1: 410 - 20 * i, 5: 400 - 20 * i, 9: 370 - 20 * i,
+                       3: 410 - 20 * i, 7: 400 - 20 * i, 11: 370 - 20 * i}
+            robot.servo.move_many(posture, 20)
+            robot.note_posture(posture.keys(), posture.values(), 20)
             time.sleep(0.060)
 
-        t = 0
         # 继续移动，直到停止标志设置
-        while running_flag.is_set():
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                if i == 0:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 + 50
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)         
-                if i == 2:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 4 or i == 6 or i == 8:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 10:
-                    s = 130 * (math.sin(math.pi * t / 25 + math.pi * i / 4)) + 400 - 80
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-            
-            t = t + 1
+        self.stream(robot, running_flag, StrategyFactory.gaits["zhuanwan"].gait)
         
         # 记录结束事件
         robot.data_storage.log_event("MOVEMENT", "结束右转")
 
 # 蜿蜒策略
-class WanyanStrategy(MovementStrategy):
-    def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting wanyan (winding movement)")
-        # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始蜿蜒运动")
-        
-        # 先重置到中立位置
-        robot.reset_to_neutral()
-        
-        t = 0  # 重置时间计数器
-        while running_flag.is_set(): 
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                if i == 0:
-                    s = 180 * (math.sin(math.pi * t / 30 + math.pi * i / 5)) + 400 + 50
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)         
-                if i == 2:
-                    s = 180 * (math.sin(math.pi * t / 30 + math.pi * i / 5)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 4 or i == 6 or i == 8:
-                    s = 180 * (math.sin(math.pi * t / 30 + math.pi * i / 5)) + 400
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-                if i == 10:
-                    s = 180 * (math.sin(math.pi * t / 30 + math.pi * i / 5)) + 400 - 80
-                    robot.servo.move_time_write(i, 800 - int(s), 4)
-                    time.sleep(0.004)
-            if not running_flag.is_set():
-                break
-            t = t + 1
-        
-        # 记录结束事件
-        robot.data_storage.log_event("MOVEMENT", "结束蜿蜒运动")
+class WanyanStrategy(TableGaitStrategy):
+    gait_name = "wanyan"
  
+# 左翻滚策略
 class fangunL(MovementStrategy):
-    def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting wanyan (winding movement)")
-        # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始蜿蜒运动")
-        
-        # 先重置到中立位置
-        robot.reset_to_neutral()
-        
-        t = 0  # 重置时间计数器
-        while running_flag.is_set(): 
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-              
-            
-                for i in range(0,SNAKE_LENGTH,1):
-                    print(i)
-                    robot.servo.move_time_write(i,400,1000)
-                    if i==1 or i==3:
-                        robot.servo.move_time_write(i,410,1000)
-                    if i==9 or i==11:
-                        robot.servo.move_time_write(i, 370, 1000) 
-                time.sleep(2)
-                for t in range(20):
-                    robot.servo.move_time_write(3, 250, 1000)
-                    robot.servo.move_time_write(9, 250, 1000)  
-                    time.sleep(1)
-                    robot.servo.move_time_write(2, 250, 1000)
-                    robot.servo.move_time_write(10, 250, 1000)    
-                    time.sleep(1)
-                    robot.servo.move_time_write(3, 550, 1000)
-                    robot.servo.move_time_write(9, 550, 1000)  
-                    time.sleep(1)
-                    robot.servo.move_time_write(2, 550, 1000)
-                    robot.servo.move_time_write(10, 550, 1000)    
-                    time.sleep(1)
-                    #t=t+1
-                if not running_flag.is_set():
-                    break
-                t = t + 1
-        # 记录结束事件
-        robot.data_storage.log_event("MOVEMENT", "结束蜿蜒运动")    
-class fangunR(MovementStrategy):
-    def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting wanyan (winding movement)")
-        # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始蜿蜒运动")
-        
-        # 先重置到中立位置
-        robot.reset_to_neutral()
-        
-        t = 0  # 重置时间计数器
-        while running_flag.is_set(): 
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-              
-            
-                for i in range(0,SNAKE_LENGTH,1):
-                    print(i)
-                    robot.servo.move_time_write(i,400,1000)
-                    if i==1 or i==3:
-                        robot.servo.move_time_write(i,410,1000)
-                    if i==9 or i==11:
-                        robot.servo.move_time_write(i, 370, 1000) 
-                time.sleep(2)
-                for t in range(20):
-                    robot.servo.move_time_write(3, 550, 1000)
-                    robot.servo.move_time_write(9, 550, 1000)  
-                    time.sleep(1)
-                    robot.servo.move_time_write(2, 250, 1000)
-                    robot.servo.move_time_write(10, 250, 1000)    
-                    time.sleep(1)
-                    robot.servo.move_time_write(3, 250, 1000)
-                    robot.servo.move_time_write(9, 250, 1000)  
-                    time.sleep(1)
-                    robot.servo.move_time_write(2, 550, 1000)
-                    robot.servo.move_time_write(10, 550, 1000)    
-                    time.sleep(1)
-                    t=t+1        
-        
- 
- 
- 
+    keyframes = FANGUN_L_KEYFRAMES
+    label = "左翻滚"
 
-class WanyanStrategy2(MovementStrategy):
     def execute(self, robot, running_flag):
-        print_terminal("【执行动作】Starting wanyan (winding movement)")
+        print_terminal(f"【执行动作】Starting {type(self).__name__} (rolling)")
         # 记录事件
-        robot.data_storage.log_event("MOVEMENT", "开始蜿蜒运动")
+        robot.data_storage.log_event("MOVEMENT", f"开始{self.label}")
         
-        # 先重置到中立位置
-        robot.reset_to_neutral()
+        # 姿态未知时先回中立位，否则从当前姿态平滑接上
+        robot.prepare_gait()
+        
+        # 关键帧按min-jerk插值逐拍下发，停止请求在一拍之内生效
+        self.play(robot, running_flag, KeyframeTrajectory(self.keyframes, self.rate), loop=True)
         
-        t = 0  # 重置时间计数器
-        while running_flag.is_set(): 
-            for i in range(0, SNAKE_LENGTH, 2):
-                if not running_flag.is_set():
-                    break
-                robot.servo.move_time_write(0,430,2)
-                    #time.sleep(0.002)
-                for i in range(1,SNAKE_LENGTH,2):    ##1，3，5，7，9，11
-                        s=210*(math.sin(math.pi*t/110+math.pi*(i-1)/(2.0*4)))+410+i*1.2
-                        #print(12-i,int(s),self.t)
-                        print('蜿蜒直行')
-                        robot.servo.move_time_write(12-i,int(s),4)
-                        time.sleep(0.004)
-                        t = t + 1
- 
         # 记录结束事件
-        robot.data_storage.log_event("MOVEMENT", "结束蜿蜒运动")
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
+        robot.data_storage.log_event("MOVEMENT", f"结束{self.label}")
+
+# 右翻滚策略
+class fangunR(fangunL):
+    keyframes = FANGUN_R_KEYFRAMES
+    label = "右翻滚"
+
+# 蜿蜒策略2：头部关节固定，奇数关节按蜿蜒波整组下发；左转/右转只改变robot.turn_blend的目标
+class WanyanStrategy2(TableGaitStrategy):
+    gait_name = "wanyan2"
  
  
 # 复位策略
@@ -862,14 +757,10 @@ class FuweiStrategy(MovementStrategy):
         # 记录事件
         robot.data_storage.log_event("MOVEMENT", "执行复位操作")
         
-        for i in range(0, SNAKE_LENGTH, 1):
-            if not running_flag.is_set():
-                return
-            robot.servo.move_time_write(i, 400, 1000)
-            if i == 1 or i == 3:
-                robot.servo.move_time_write(i, 410, 1000)
-            if i == 9 or i == 11:
-                robot.servo.move_time_write(i, 370, 1000)    
+        if not running_flag.is_set():
+            return
+        robot.servo.move_many(NEUTRAL_POSTURE, 1000)
+        robot.note_posture(range(SNAKE_LENGTH), NEUTRAL_POSTURE, 1000)
         time.sleep(2)
         print_terminal("Reset complete")
         
@@ -878,27 +769,41 @@ class FuweiStrategy(MovementStrategy):
 
 # 策略工厂
 class StrategyFactory:
-    @staticmethod
-    def get_strategy(mode, direction):
+    gaits = {}   # 名称 -> GaitDefinition，来自gaits/*.json
+    routes = {}  # (模式, 方向) -> 步态名称，来自步态文件的triggers
+
+    @classmethod
+    def load(cls, directory, cache):
+        """读入步态文件并把步态表编译进cache；有错的文件只记录并跳过"""
+        gaits, errors = load_gaits(directory)
+        for path, e in errors:
+            print_terminal(f"步态文件无效 {path}: {e}")
+        routes = {}
+        for definition in gaits.values():
+            for trigger in definition.triggers:
+                routes[trigger] = definition.name
+        cache.warm(d.gait for d in gaits.values())
+        cls.gaits, cls.routes = gaits, routes
+        print_terminal(f"已加载{len(gaits)}个步态: {', '.join(sorted(gaits))}")
+        return errors
+
+    @classmethod
+    def get_strategy(cls, mode, direction):
         if direction == "复位" or mode == "复位模式":
             return FuweiStrategy()
         
+        name = cls.routes.get((mode, direction))
+        if name is not None:
+            return TableGaitStrategy(name)
+        
         if mode == "蠕动模式":
-            if direction == "前进":
-                return RudongStrategy()
-            elif direction == "后退":
-                return HoutuiStrategy()
-            elif direction == "左转":
+            if direction == "左转":
                 return ZuozhuanStrategy()
             elif direction == "右转":
                 return YouzhuanStrategy()
         
-        elif mode == "蜿蜒模式":
-            if direction == "前进":
-                return WanyanStrategy2()
-            elif direction == "后退":
-                return HoutuiStrategy()
-            elif direction == "左转":
+        elif mode == "翻滚模式":
+            if direction == "左转":
                 return fangunL()
             elif direction == "右转":
                 return fangunR()
@@ -913,9 +818,15 @@ class CameraInterface(ABC):
         pass
     
     @abstractmethod
-    def capture_frame(self):
+    def capture_jpeg(self, resolution=None, quality=None):
+        """返回一帧JPEG字节，失败时返回None；resolution/quality为None时用默认设置"""
         pass
     
+    def capture_frame(self):
+        """base64编码的JPEG帧，供JSON遥测使用"""
+        jpeg = self.capture_jpeg()
+        return base64.b64encode(jpeg).decode('utf-8') if jpeg else None
+    
     @abstractmethod
     def release(self):
         pass
@@ -925,6 +836,15 @@ class OpenCVCamera(CameraInterface):
         self.resolution = resolution
         self.camera = None
         self.dummy_image = None
+        self.frame_time = None  # 最近一次capture_jpeg所用帧的采集时刻（monotonic）
+        # 采集线程：最新一帧的槽位 (帧, 采集时刻, 序号, 是否已被取走)
+        self._slot = None
+        self._slot_lock = threading.Lock()
+        self._grabber = None
+        self._grabbing = False
+        self.grabbed = 0
+        self.grab_errors = 0
+        self.encoder = create_encoder(JPEG_ENCODER)
         self._create_dummy_image()
     
     def _create_dummy_image(self):
@@ -946,10 +866,68 @@ class OpenCVCamera(CameraInterface):
         # 编码图像
         encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
         _, buffer = cv2.imencode('.jpg', img, encode_param)
-        self.dummy_image = base64.b64encode(buffer).decode('utf-8')
+        self.dummy_image = buffer.tobytes()
         print_terminal(f"Created dummy image: {len(self.dummy_image)/1024:.1f} KB")
     
     def initialize(self):
+        """打开摄像头，成功时启动采集线程"""
+        if not self._open():
+            return False
+        if CAMERA_MJPEG:
+            self._enable_mjpeg()
+        print_terminal(f"JPEG encoder: {self.encoder.name}")
+        if CAMERA_GRABBER:
+            # 驱动里只留一帧缓冲，采集线程读到的总是最新画面
+            self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self._grabbing = True
+            self._grabber = threading.Thread(target=self._grab_loop, name="camera-grab", daemon=True)
+            self._grabber.start()
+        return True
+    
+    def _enable_mjpeg(self):
+        """让摄像头输出MJPEG且不转换成BGR，read直接得到JPEG数据；不支持时恢复原设置"""
+        try:
+            self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+            self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            ret, frame = self.camera.read()
+            if ret and is_jpeg(frame):
+                native = (int(self.camera.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.camera.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                self.encoder = MJPEGPassthrough(self.encoder, native, JPEG_QUALITY)
+                print_terminal(f"Camera MJPEG passthrough enabled: {native[0]}x{native[1]}")
+                return True
+        except Exception as e:
+            print_terminal(f"Error enabling MJPEG: {e}")
+        self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        return False
+    
+    def _grab_loop(self):
+        """持续读取摄像头放进槽位；新帧换入，旧帧未被取走时其缓冲区留作下一次read的目标"""
+        spare = None
+        while self._grabbing:
+            ret, frame = self.camera.read(spare)
+            if not ret:
+                self.grab_errors += 1
+                spare = None
+                time.sleep(0.05)
+                continue
+            with self._slot_lock:
+                old, self._slot = self._slot, (frame, time.monotonic(), self.grabbed, False)
+            self.grabbed += 1
+            # 已交给发布线程的帧不能再被覆盖
+            spare = old[0] if old is not None and not old[3] else None
+    
+    def latest_frame(self):
+        """取走最新一帧，返回(帧, 采集时刻, 序号)，还没有帧时返回None；不复制图像"""
+        with self._slot_lock:
+            if self._slot is None:
+                return None
+            frame, grabbed, seq, _ = self._slot
+            self._slot = (frame, grabbed, seq, True)
+        return frame, grabbed, seq
+    
+    def _open(self):
         """初始化摄像头，包含备选方案"""
         # 尝试不同的后端和API访问摄像头
         if TRY_ALTERNATE_BACKENDS:
@@ -1010,34 +988,34 @@ class OpenCVCamera(CameraInterface):
         print_terminal("No camera available - will use dummy image instead")
         return False
     
-    def capture_frame(self):
-        """捕获摄像头帧，如果摄像头不可用则返回默认图像"""
+    def capture_jpeg(self, resolution=None, quality=None):
+        """捕获摄像头帧并编码为JPEG字节，如果摄像头不可用则返回默认图像"""
+        resolution = resolution or self.resolution
+        self.frame_time = time.monotonic()
         # 如果没有可用的摄像头，返回默认图像
         if self.camera is None or not self.camera.isOpened():
             return self.dummy_image
             
         try:
-            # 尝试从摄像头读取一帧
-            ret, frame = self.camera.read()
-            if not ret:
-                # 如果读取失败，回退到默认图像
-                return self.dummy_image
+            if self._grabber is not None:
+                # 采集线程已经读好的最新一帧
+                latest = self.latest_frame()
+                if latest is None:
+                    return self.dummy_image
+                frame, self.frame_time, _ = latest
+            else:
+                # 尝试从摄像头读取一帧
+                ret, frame = self.camera.read()
+                if not ret:
+                    # 如果读取失败，回退到默认图像
+                    return self.dummy_image
                 
-            # 如果需要，调整到目标分辨率
-            if frame.shape[1] != self.resolution[0] or frame.shape[0] != self.resolution[1]:
-                frame = cv2.resize(frame, self.resolution)
-            
-            # 简单的JPEG编码
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-            _, buffer = cv2.imencode('.jpg', frame, encode_param)
-            
-            if buffer is None:
+            # 缩放并编码（MJPEG摄像头在不需要缩放/降质量时原样转发）
+            jpeg = self.encoder.encode(frame, resolution, quality or JPEG_QUALITY)
+            if not jpeg:
                 # 如果编码失败，回退到默认图像
                 return self.dummy_image
-                
-            # 转换为base64
-            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-            return jpg_as_text
+            return jpeg
             
         except Exception as e:
             print_terminal(f"Error capturing camera frame: {e}")
@@ -1045,6 +1023,10 @@ class OpenCVCamera(CameraInterface):
     
     def release(self):
         """释放摄像头资源"""
+        if self._grabber is not None:
+            self._grabbing = False
+            self._grabber.join(timeout=1.0)
+            self._grabber = None
         if self.camera is not None:
             self.camera.release()
             self.camera = None
@@ -1062,6 +1044,7 @@ class MQTTObserver(metaclass=Singleton):
         self.is_connected = False
         self.observers = []
         self.connection_event = threading.Event()
+        self.link = LinkMonitor()  # QoS1消息的未确认数与往返时间
         
     def connect(self):
         """连接到MQTT代理"""
@@ -1078,6 +1061,7 @@ class MQTTObserver(metaclass=Singleton):
             self.mqtt_client.on_message = self._on_message
             self.mqtt_client.on_disconnect = self._on_disconnect
             self.mqtt_client.on_subscribe = self._on_subscribe  # 添加订阅回调
+            self.mqtt_client.on_publish = self._on_publish
             
             self.mqtt_client.connect(self.broker, self.port, 60)
             self.mqtt_client.loop_start()
@@ -1105,17 +1089,20 @@ class MQTTObserver(metaclass=Singleton):
             except Exception as e:
                 print_terminal(f"断开MQTT连接时出错: {e}")
     
-    def publish(self, topic, message):
-        """发布消息到主题"""
+    def publish(self, topic, message, qos=0):
+        """发布消息到主题；qos>0的消息计入link，等代理确认"""
         if not self.mqtt_client or not self.is_connected:
             print_terminal("无法发布 - 未连接到MQTT代理")
             return False
         
         try:
-            result = self.mqtt_client.publish(topic, message)
+            t0 = time.monotonic()
+            result = self.mqtt_client.publish(topic, message, qos)
             if result.rc != 0:
                 print_terminal(f"发布消息错误: {result.rc}")
                 return False
+            if qos:
+                self.link.sent(result.mid, t0)
             return True
         except Exception as e:
             print_terminal(f"发布到MQTT时出错: {e}")
@@ -1157,6 +1144,10 @@ class MQTTObserver(metaclass=Singleton):
             print_terminal(f"MQTT连接失败，返回码: {rc}")
             self.is_connected = False
     
+    def _on_publish(self, client, userdata, mid):
+        """QoS1收到PUBACK（QoS0为发出）时回调"""
+        self.link.acked(mid)
+    
     def _on_subscribe(self, client, userdata, mid, granted_qos):
         """MQTT订阅回调"""
         print_terminal(f"===== 订阅确认 =====")
@@ -1214,22 +1205,20 @@ def patch_servo_driver():
     try:
         original_init = ServoDriver.__init__
 
-        def patched_init(self):
-            # 初始化GPIO
-            from servo_driver import gpio_init
-            gpio_init()
-            
-            # 初始化延迟字典
-            self.delay = {3: 0.00042, 5: 0.00055, 7: 0.0008}
+        def patched_init(self, device=None, baudrate=115200, port=None):
+            # 已传入串口对象（如仿真总线）时直接使用
+            if port is not None:
+                original_init(self, device, baudrate, port)
+                return
             
             # 查找可用端口
-            port_path = SerialPortFinder.find_available_serial_port()
+            port_path = device or SerialPortFinder.find_available_serial_port()
             if not port_path:
                 print_terminal("No serial port available for servo control!")
                 raise IOError("No suitable serial port found")
             
-            # 打开串口
-            self.port = serial.Serial(port_path, 115200, timeout=0.2)
+            # 其余初始化（GPIO、串口、预分配帧缓冲区）沿用原始构造函数
+            original_init(self, port_path, baudrate)
             print_terminal(f"ServoDriver initialized using port: {port_path}")
 
         # 应用补丁
@@ -1249,13 +1238,23 @@ class SnakeRobot:
         # 初始化数据存储
         self.data_storage = DataStorageManager()
         
+        # 预先算好各步态一个周期的表，切换模式时第一拍即可下发
+        self.gait_cache = GaitCache(GAIT_CACHE_SIZE, GAIT_CACHE_DIR)
+        StrategyFactory.load(GAIT_DIR, self.gait_cache)
+        
         # 初始化MQTT通信
         self.mqtt = MQTTObserver()
         self.mqtt.register_observer(self)
         
         # 初始化舵机驱动
         try:
-            self.servo = ServoDriver()
+            # 串口与TXE/RXE只由总线线程访问，各线程通过ServoBus排队
+            driver = ServoDriver(baudrate=SERVO_BAUDRATE)
+            driver.tx_drain = SERVO_TX_DRAIN
+            driver.set_deadband(SERVO_DEADBAND, SERVO_REFRESH)
+            # 角度限位启动时读一次并缓存，之后每帧向量化裁剪
+            driver.set_guard(SERVO_MAX_SLEW, range(SNAKE_LENGTH))
+            self.servo = ServoBus(driver)
             self.servo_available = True
             self.enable_servos(1)
             self.servo_list = []  # 舵机ID列表
@@ -1289,8 +1288,27 @@ class SnakeRobot:
         self.successful_frames = 0
         self.failed_frames = 0
         
-        # 移动线程
+        # 标量遥测与视频各走一条流水线（start_publishing创建），latest_jpeg供JSON遥测附带
+        self.pipelines = {}
+        self.latest_jpeg = None
+        self.scalar_count = 0
+        self.video_control = AdaptiveVideoController() if ADAPTIVE_VIDEO else None
+        
+        # 常驻运动线程：新策略投进邮箱（只保留最新一个），当前策略在下一拍退出后接着执行
         self.movement_thread = None
+        self._mailbox = deque(maxlen=1)
+        self._mailbox_lock = threading.Lock()
+        self._mailbox_event = threading.Event()
+        self._motion_running = True
+        self.last_posture = {}  # node -> 最近一次下发的目标，空表示姿态未知（刚启动或已掉电）
+        self._motion_pending = None  # (命令时间戳, 收到时间)：等待新策略的第一次下发
+        self.motion_latency = None
+        self.motion_scheduler = None  # 最近一次步态的调度器，用于抖动/超时统计
+        self.current_strategy = None
+        self.turn_blend = None  # 可转向步态（如蜿蜒）运行中的转向偏置，TurnBlend
+        self.tracking = TrackingMonitor(SNAKE_LENGTH)  # 指令与实际位置的跟踪误差
+        self.joint_state = JointStateCache(JOINT_STATE_FIELDS, SNAKE_LENGTH)  # 随遥测发布的关节状态缓存
+        self.feedback_thread = None
         
         # 数据批量发送线程
         self.batch_sender_thread = None
@@ -1318,7 +1336,8 @@ class SnakeRobot:
             return
             
         for i in range(SNAKE_LENGTH):
-            self.servo.load_or_unload_write(i, value)
+            self.servo.post("load_or_unload_write", i, value, priority=PRIO_URGENT)
+        self.last_posture.clear()
     
     def list_servos(self):
         """检查可用舵机并返回舵机ID列表"""
@@ -1326,28 +1345,73 @@ class SnakeRobot:
             print_terminal("Servo driver not available")
             return
             
-        for i in range(SNAKE_LENGTH):
-            n = self.servo.id_read(i)       
-            if n is not None:
-                self.servo_list.append(n)
+        state, valid = self.servo.sweep(("id",), priority=PRIO_NORMAL)
+        self.servo_list = [int(n) for n, ok in zip(state["id"], valid[:, 0]) if ok]
         print_terminal(f"Found servos: {self.servo_list}")
         
         # 记录找到的舵机
         self.data_storage.log_event("INFO", f"检测到舵机: {self.servo_list}")
     
+    def read_joint_state(self):
+        """各关节的位置/电压/温度：从缓存发布，每次只补读JOINT_STATE_BATCH个关节里过期的字段。
+        运动中位置由后台反馈持续刷新；太久没读到的格子为None"""
+        deadline = time.monotonic() + JOINT_STATE_TIMEOUT
+        for node, fields in self.joint_state.due(JOINT_STATE_BATCH):
+            state, valid = self.servo.sweep(fields, (node,), timeout=max(0.0, deadline - time.monotonic()))
+            for k, field in enumerate(fields):
+                if not valid[0, k]:
+                    continue
+                value = int(state[field][0])
+                if field == "pos":
+                    self._observe_position(node, value)  # 遥测顺带读到的位置也记入跟踪监测
+                else:
+                    self.joint_state.update(node, field, value)
+        return self.joint_state.snapshot()
+    
     def reset_to_neutral(self):
         """重置所有舵机到中立位置"""
         if not self.servo_available:
             return
             
-        for i in range(0, SNAKE_LENGTH, 1):
-            self.servo.move_time_write(i, 400, 1000)
-            if i == 1 or i == 3:
-                self.servo.move_time_write(i, 410, 1000)
-            if i == 9 or i == 11:
-                self.servo.move_time_write(i, 370, 1000)    
+        self.servo.move_many(NEUTRAL_POSTURE, 1000)
+        self.note_posture(range(SNAKE_LENGTH), NEUTRAL_POSTURE, 1000)
         time.sleep(0.02)
     
+    def prepare_gait(self):
+        """步态开始前：姿态未知时先回中立位；已在运动时保持当前姿态，由stream从最接近的相位平滑接上"""
+        if not self.last_posture:
+            self.reset_to_neutral()
+    
+    def note_posture(self, joints, positions, tim=0):
+        """记录刚下发的目标姿态（tim为指令的运动时间ms）；新策略的第一次下发同时记录命令到动作的延迟"""
+        joints, positions = list(joints), [int(p) for p in positions]
+        self.last_posture.update(zip(joints, positions))
+        self.tracking.command(joints, positions, tim)
+        pending = self._motion_pending
+        if pending is None:
+            return
+        self._motion_pending = None
+        command_ts, received = pending
+        now = time.time()
+        self.motion_latency = {
+            "receive_to_motion_ms": round((now - received) * 1000, 1),
+            # 含控制端与机器人之间的时钟偏差
+            "command_to_motion_ms": round((now - command_ts) * 1000, 1) if command_ts else None,
+        }
+        print_terminal(f"命令到动作延迟: {self.motion_latency}")
+    
+    def phase_entry(self, joints, table):
+        """返回(起始行, 起始差值)：步态表中与当前姿态最接近的一行，以及当前姿态与该行的差"""
+        posture = self.last_posture
+        cols = [k for k, j in enumerate(joints) if j in posture]
+        if not cols:
+            return 0, None
+        current = np.array([posture[joints[k]] for k in cols], dtype=np.int32)
+        start = int(np.abs(table[:, cols].astype(np.int32) - current).sum(axis=1).argmin())
+        offset = np.zeros(len(joints), dtype=np.int32)
+        offset[cols] = current - table[start, cols]
+        return start, offset
+    
     def on_message(self, topic, payload):
         """处理传入的MQTT消息"""
         try:
@@ -1378,12 +1442,13 @@ class SnakeRobot:
                 self.current_direction = direction
                 print_terminal(f"方向设置为: {direction}")
             
-            # 停止任何现有的移动线程
-            self.stop_movement()
+            # 蜿蜒运动中切换前进/左转/右转：转向偏置原地过渡，不重启移动线程、不复位
+            if self.steer_in_place(direction):
+                return
             
-            # 基于模式和方向开始新的移动
+            # 基于模式和方向切换到新的移动（当前策略在下一拍退出，不等待线程结束）
             if self.servo_available:
-                self.start_movement(mode, direction)
+                self.start_movement(mode, direction, data.get("timestamp"))
             else:
                 print_terminal(f"收到命令: mode={mode}, direction={direction} (模拟模式 - 无舵机控制)")
                 self.data_storage.log_event("INFO", f"模拟模式下的命令: {mode} - {direction}")
@@ -1393,35 +1458,127 @@ class SnakeRobot:
             self.data_storage.log_event("ERROR", f"处理命令时出错: {e}")
     
     def stop_movement(self):
-        """停止任何运行中的移动线程"""
-        # 发信号给线程停止
-        self.running_flag.clear()
-        
-        # 等待线程完成
-        if self.movement_thread and self.movement_thread.is_alive():
-            print_terminal("等待移动停止...")
-            self.movement_thread.join(timeout=1.0)
-        
-        # 重置标志以便新的移动
-        self.running_flag.set()
+        """停止当前策略并丢弃未执行的命令（运动线程保持常驻）"""
+        with self._mailbox_lock:
+            self._mailbox.clear()
+            self.running_flag.clear()
+            # 换一个新的标志给直接调用strategy.execute的兼容接口使用
+            self.running_flag = threading.Event()
+            self.running_flag.set()
     
-    def start_movement(self, mode, direction):
-        """基于模式和方向开始移动"""
+    def _turn_k(self, strategy, direction):
+        # 可原地转向的步态返回方向对应的k，否则返回None
+        if not isinstance(strategy, TableGaitStrategy) or direction not in TURN_SIGN:
+            return None
+        definition = StrategyFactory.gaits.get(strategy.name)
+        if definition is None or definition.turn_weights is None:
+            return None
+        return TURN_SIGN[direction] * definition.turn_k
+    
+    def steer_in_place(self, direction):
+        """正在运行可转向步态（如蜿蜒）时，把方向命令转换成转向偏置目标；返回是否已处理"""
+        strategy = self.current_strategy
+        k = self._turn_k(strategy, direction)
+        if k is None or self._mailbox or self.turn_blend is None:
+            return False
+        # 新命令必须路由到同一个步态，否则按正常流程切换策略
+        if StrategyFactory.routes.get((self.current_mode, direction)) != strategy.name:
+            return False
+        self.turn_blend.set(k)
+        print_terminal(f"原地转向: {direction} (k={k})")
+        self.data_storage.log_event("MOVEMENT", f"{strategy.definition.label}转向过渡: {direction}")
+        return True
+    
+    def start_movement(self, mode, direction, command_ts=None):
+        """基于模式和方向开始移动：策略投进邮箱，由常驻运动线程执行"""
         # 获取适当的策略
         strategy = StrategyFactory.get_strategy(mode, direction)
-        
-        # 在新线程中开始移动
-        self.movement_thread = threading.Thread(
-            target=self._execute_movement,
-            args=(strategy,)
-        )
-        self.movement_thread.daemon = True
-        self.movement_thread.start()
+        k = self._turn_k(strategy, direction)
+        if k is not None:
+            # 从直行开始，按lam过渡到命令的转向
+            self.turn_blend = TurnBlend(strategy.definition.turn_weights)
+            self.turn_blend.set(k)
+        
+        with self._mailbox_lock:
+            self._mailbox.append((strategy, command_ts, time.time()))
+            self.running_flag.clear()  # 当前策略在下一拍退出
+        self._mailbox_event.set()
+        
+        if self.movement_thread is None or not self.movement_thread.is_alive():
+            self.movement_thread = threading.Thread(target=self._motion_loop, name="motion", daemon=True)
+            self.movement_thread.start()
+        if self.servo_available and (self.feedback_thread is None or not self.feedback_thread.is_alive()):
+            self.feedback_thread = threading.Thread(target=self._feedback_loop, name="feedback", daemon=True)
+            self.feedback_thread.start()
+    
+    def _motion_loop(self):
+        """常驻运动线程：依次执行邮箱里的最新策略"""
+        while self._motion_running:
+            self._mailbox_event.wait(1.0)
+            self._mailbox_event.clear()
+            with self._mailbox_lock:
+                if not self._mailbox:
+                    continue
+                strategy, command_ts, received = self._mailbox.popleft()
+                # 每个策略一个独立的标志，投递新命令时只清除当前这个
+                flag = threading.Event()
+                flag.set()
+                self.running_flag = flag
+                self.current_strategy = strategy
+                self._motion_pending = (command_ts, received)
+            # 滞后随步态变化，跟踪统计按策略重新开始
+            self.tracking.reset()
+            self._execute_movement(strategy, flag)
+            self.current_strategy = None
+            self._save_trace(strategy)
     
-    def _execute_movement(self, strategy):
+    def _save_trace(self, strategy):
+        """保存步态文件策略本次的跟踪轨迹，只保留最近TRACE_KEEP个文件"""
+        if not isinstance(strategy, TableGaitStrategy):
+            return
+        trace_dir = os.path.join(self.data_storage.base_dir, TRACE_DATA_DIR)
+        path = os.path.join(trace_dir, f"{strategy.name}-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.npz")
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            if not self.tracking.save_trace(path):
+                return
+            for old in sorted(glob.glob(os.path.join(trace_dir, "*.npz")), key=os.path.getmtime)[:-TRACE_KEEP]:
+                os.remove(old)
+        except OSError as e:
+            print_terminal(f"保存跟踪轨迹失败: {e}")
+    
+    def _feedback_loop(self):
+        """后台位置反馈：运动中按关节轮流回读位置。请求走总线的后台优先级，
+        只占用两帧步态之间的空闲，结果在总线线程完成时立即按读数时刻记入跟踪监测"""
+        nodes = itertools.cycle(range(SNAKE_LENGTH))
+        in_flight = deque()
+        while self._motion_running:
+            while in_flight and in_flight[0].done():
+                in_flight.popleft()
+            if self.current_strategy is not None and len(in_flight) < FEEDBACK_PIPELINE:
+                node = next(nodes)
+                future = self.servo.post("sweep", ("pos",), (node,), priority=PRIO_BACKGROUND)
+                future.add_done_callback(functools.partial(self._on_feedback, node))
+                in_flight.append(future)
+            time.sleep(FEEDBACK_INTERVAL)
+    
+    def _on_feedback(self, node, future):
+        if future.exception() is not None:
+            return
+        state, valid = future.result()
+        if valid[0, 0]:
+            self._observe_position(node, int(state["pos"][0]))
+    
+    def _observe_position(self, node, pos):
+        self.joint_state.update(node, "pos", pos)
+        if self.tracking.observe(node, pos):
+            print_terminal(f"关节{node}跟踪误差持续超限，可能卡滞或负载过大")
+            self.data_storage.log_event("WARNING", f"关节{node}跟踪误差持续超限")
+    
+    def _execute_movement(self, strategy, running_flag):
         """执行移动策略"""
         try:
-            strategy.execute(self, self.running_flag)
+            strategy.execute(self, running_flag)
         except Exception as e:
             print_terminal(f"执行移动时出错: {e}")
             self.data_storage.log_event("ERROR", f"执行移动时出错: {e}")
@@ -1485,47 +1642,52 @@ class SnakeRobot:
         else:
             data["air_quality"] = DEFAULT_AIR_QUALITY
         
+        # 最近一次命令到第一次动作的延迟
+        if self.motion_latency:
+            data["motion_latency"] = self.motion_latency
+        
+        # 关节实时状态
+        if self.servo_available:
+            try:
+                data["joint_state"] = self.read_joint_state()
+            except Exception as e:
+                print_terminal(f"读取关节状态错误: {e}")
+            data["tracking"] = self.tracking.summary()
+        
         # 添加视频统计信息用于调试
         if ENABLE_DEBUG:
             data["camera_stats"] = {
                 "frames_captured": self.frame_count,
                 "successful": self.successful_frames,
                 "failed": self.failed_frames,
-                "camera_available": True if self.camera else False
+                "camera_available": True if self.camera else False,
+                "grabbed": self.camera.grabbed,
+                "grab_errors": self.camera.grab_errors,
+                "encoder": self.camera.encoder.stats(),
             }
+            if self.servo_available:
+                try:
+                    data["servo_bus"] = self.servo.stats()
+                except Exception as e:
+                    print_terminal(f"读取舵机总线统计错误: {e}")
+            if self.motion_scheduler:
+                data["motion"] = self.motion_scheduler.stats()
+            if self.turn_blend is not None:
+                data["turn"] = self.turn_blend.state()
+            if self.pipelines:
+                data["pipelines"] = {name: p.stats() for name, p in self.pipelines.items()}
+            if self.video_control:
+                data["video"] = dict(self.video_control.stats(), **self.mqtt.link.stats())
         
         return data
     
     def publish_data(self):
-        """发布传感器数据和摄像头帧到MQTT，同时保存到本地"""
+        """同步采集并发布一次传感器数据和摄像头帧（流水线未启动时使用）"""
         try:
-            # 获取传感器数据
-            data = self.get_sensor_data()
-            
-            # 如果可用，添加摄像头帧
-            self.frame_count += 1
-            camera_frame = self.camera.capture_frame()
-            if camera_frame:
-                data["camera_frame"] = camera_frame
-                self.successful_frames += 1
-            else:
-                self.failed_frames += 1
-            
-            # 存储数据到本地
-            self.data_storage.store_sensor_data(data)
-            
-            # 将数据转换为JSON可序列化格式
-            data_for_mqtt = convert_to_serializable(data)
-                
-            # 转换为JSON并发布
-            data_json = json.dumps(data_for_mqtt)
-            self.mqtt.publish(MQTT_TOPIC_PUBLISH, data_json)
-            
-            # 定期记录统计信息
-            if ENABLE_DEBUG and self.frame_count % 30 == 0:
-                success_rate = (self.successful_frames / self.frame_count) * 100 if self.frame_count > 0 else 0
-                print_terminal(f"Camera stats: {self.successful_frames}/{self.frame_count} frames ({success_rate:.1f}% success)")
-                print_terminal(f"Camera frame size: {len(data_json)/1024:.1f} KB")
+            frame = self._capture_frame()
+            if frame:
+                self._publish_frame(self._store_frame(frame))
+            self._publish_scalars(self._store_scalars(self.get_sensor_data()))
         except Exception as e:
             print_terminal(f"发布数据错误: {e}")
             self.data_storage.log_event("ERROR", f"发布数据错误: {e}")
@@ -1533,6 +1695,87 @@ class SnakeRobot:
                 import traceback
                 traceback.print_exc()
     
+    def _store_scalars(self, data):
+        self.data_storage.store_sensor_data(data)
+        return data
+    
+    def _publish_scalars(self, data):
+        """发布一条标量遥测；JSON格式附带最近一帧图像，兼容旧版上位机"""
+        self.scalar_count += 1
+        sent = 0
+        if TELEMETRY_FORMAT in ("binary", "both"):
+            payload = telemetry_codec.encode_scalars(data, self.scalar_count)
+            self.mqtt.publish(MQTT_TOPIC_SCALARS, payload)
+            sent += len(payload)
+        if TELEMETRY_FORMAT in ("json", "both"):
+            if self.latest_jpeg:
+                data["camera_frame"] = base64.b64encode(self.latest_jpeg).decode('utf-8')
+            # 将数据转换为JSON可序列化格式，转换为JSON并发布
+            data_json = json.dumps(convert_to_serializable(data))
+            self.mqtt.publish(MQTT_TOPIC_PUBLISH, data_json)
+            sent += len(data_json)
+        return sent
+    
+    def _capture_frame(self):
+        """采集一帧：返回(采集时间戳, 序号, JPEG字节, 采集时刻monotonic)，失败返回None"""
+        self.frame_count += 1
+        control = self.video_control
+        jpeg = self.camera.capture_jpeg(control.resolution, control.quality) if control else self.camera.capture_jpeg()
+        if not jpeg:
+            self.failed_frames += 1
+            return None
+        self.successful_frames += 1
+        grabbed = self.camera.frame_time or time.monotonic()
+        return time.time() - (time.monotonic() - grabbed), self.frame_count, jpeg, grabbed
+    
+    def _store_frame(self, frame):
+        timestamp, _, jpeg, _ = frame
+        self.data_storage.store_image(jpeg, timestamp)
+        self.latest_jpeg = jpeg
+        return frame
+    
+    def _adapt_video(self):
+        """按发布积压、未确认帧数和确认RTT调整视频档位，返回是否发布这一帧"""
+        control = self.video_control
+        if not control or TELEMETRY_FORMAT == "json":
+            return True
+        pipeline = self.pipelines.get("video")
+        inflight = self.mqtt.link.inflight()
+        if control.update(len(pipeline.queue) if pipeline else 0, inflight, self.mqtt.link.rtt):
+            if pipeline:
+                pipeline.set_rate(control.fps)
+            print_terminal(f"视频档位 {control.level}: {control.resolution[0]}x{control.resolution[1]} "
+                           f"质量{control.quality} {control.fps}帧/秒 (未确认{inflight}, RTT {self.mqtt.link.stats()['rtt_ms']}ms)")
+        return control.admit(inflight)
+    
+    def _publish_frame(self, frame):
+        timestamp, seq, jpeg, grabbed = frame
+        if TELEMETRY_FORMAT in ("binary", "both") and self._adapt_video():
+            self.mqtt.publish(MQTT_TOPIC_VIDEO, telemetry_codec.encode_video(jpeg, timestamp, seq), VIDEO_QOS)
+        # 帧龄：从摄像头采集到交给MQTT，计入流水线的阶段统计
+        pipeline = self.pipelines.get("video")
+        if pipeline:
+            pipeline.timer.add("frame_age", time.monotonic() - grabbed)
+        
+        # 定期记录统计信息
+        if ENABLE_DEBUG and seq % 30 == 0:
+            success_rate = (self.successful_frames / self.frame_count) * 100 if self.frame_count > 0 else 0
+            print_terminal(f"Camera stats: {self.successful_frames}/{self.frame_count} frames ({success_rate:.1f}% success)")
+            print_terminal(f"Camera frame size: {len(jpeg)/1024:.1f} KB")
+        return frame
+    
+    def start_publishing(self):
+        """启动标量遥测和视频两条发布流水线，各自按SENSOR_RATE/FRAME_RATE运行"""
+        self.pipelines = {
+            "scalars": Pipeline("scalars", SENSOR_RATE, self.get_sensor_data,
+                                [("store", self._store_scalars), ("publish", self._publish_scalars)]),
+            "video": Pipeline("video", self.video_control.fps if self.video_control else FRAME_RATE, self._capture_frame,
+                              [("store", self._store_frame), ("publish", self._publish_frame)]),
+        }
+        for pipeline in self.pipelines.values():
+            pipeline.start()
+        print_terminal(f"数据发布流水线已启动: 传感器{SENSOR_RATE}Hz, 视频{self.pipelines['video'].rate}Hz")
+    
     def start_batch_sender(self):
         """启动批量数据发送线程"""
         self.batch_sender_thread = threading.Thread(target=self.batch_sender_loop, daemon=True)
@@ -1575,12 +1818,6 @@ class SnakeRobot:
             # 等待下一次发送周期
             time.sleep(DATA_SEND_INTERVAL)
     
-    def data_publishing_loop(self):
-        """连续数据发布的线程函数"""
-        while not self.shutdown_event.is_set():
-            self.publish_data()
-            time.sleep(0.1)  # 10Hz数据速率
-    
     def signal_handler(self, sig, frame):
         """处理终止信号"""
         print_terminal("收到关闭信号，清理中...")
@@ -1592,6 +1829,10 @@ class SnakeRobot:
         # 通知线程停止
         self.shutdown_event.set()
         self.stop_movement()
+        self._motion_running = False
+        self._mailbox_event.set()
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
         
         # 保存最后的日志
         self.data_storage.log_event("SYSTEM", "系统关闭")
@@ -1602,6 +1843,8 @@ class SnakeRobot:
                 # 直接执行策略以立即执行
                 FuweiStrategy().execute(self, threading.Event())
                 self.disable_servos()
+                # 等总线把剩余指令发完再退出
+                self.servo.close()
             except Exception as e:
                 print_terminal(f"舵机清理过程中错误: {e}")
                 self.data_storage.log_event("ERROR", f"舵机清理错误: {e}")
@@ -1644,7 +1887,8 @@ class SnakeRobot:
         print_terminal(f"MQTT配置: 服务器={MQTT_BROKER}, 客户端ID={MQTT_CLIENT_ID}")
         print_terminal(f"订阅主题: {MQTT_TOPIC_SUBSCRIBE}")
         print_terminal(f"发布主题: {MQTT_TOPIC_PUBLISH}")
-        print_terminal(f"批量数据主题: {MQTT_TOPIC_DATA_BATCH}\n")
+        print_terminal(f"批量数据主题: {MQTT_TOPIC_DATA_BATCH}")
+        print_terminal(f"遥测格式: {TELEMETRY_FORMAT} (标量: {MQTT_TOPIC_SCALARS}, 视频: {MQTT_TOPIC_VIDEO})\n")
         
         if not self.mqtt.connect():
             print_terminal("连接MQTT失败，退出")
@@ -1667,10 +1911,8 @@ class SnakeRobot:
             print_terminal("舵机控制不可用 - 运行模拟模式")
             self.data_storage.log_event("INFO", "舵机控制不可用 - 运行模拟模式")
         
-        # 启动数据发布线程
-        data_thread = threading.Thread(target=self.data_publishing_loop)
-        data_thread.daemon = True
-        data_thread.start()
+        # 启动数据发布流水线
+        self.start_publishing()
         
         # 启动批量数据发送线程
         self.start_batch_sender()
@@ -0,0 +1,119 @@
+"""遥测二进制编码（机器人端shejimoshi2与上位机main14共用）
+
+原先每帧遥测是一个JSON文档，摄像头帧以base64嵌在里面：体积多约33%，机器人端要
+convert_to_serializable + json.dumps，上位机要json.loads + b64decode。现在拆成两个主题:
+
+    <基础主题>/scalars  固定头（struct打包：时间戳、步态、传感器、关节状态）
+                        + 可选的紧凑JSON尾部（调试统计等不定长字段）
+    <基础主题>/video    固定头（时间戳、序号）+ 原始JPEG字节
+
+decode_scalars还原成与原JSON相同结构的dict，上位机的处理代码不用改。
+"""
+import json
+import math
+import struct
+
+import numpy as np
+
+VERSION = 1
+MAGIC_SCALARS = b"SS"
+MAGIC_VIDEO = b"SV"
+JOINTS = 12
+GAIT_NAMES = ("休眠模式", "蠕动模式", "蜿蜒模式", "翻滚模式", "复位模式")  # 步态编号，不在表中的为255并写入尾部
+UNKNOWN_GAIT = 255
+
+# 魔数, 版本, 步态编号, 序号, 时间戳, 温度, 气压, 海拔, 空气质量,
+# pos/vin/temp有效位掩码, 12个pos, 12个vin, 12个temp, 尾部长度
+SCALAR_HEADER = struct.Struct(f"<2sBBId3fH3H{JOINTS}h{JOINTS}H{JOINTS}BH")
+# 魔数, 版本, 保留, 序号, 时间戳
+VIDEO_HEADER = struct.Struct("<2sBBId")
+
+# 已打包进固定头的字段，其余字段进入JSON尾部
+HEADER_FIELDS = ("timestamp", "current_gait", "temperature", "pressure", "altitude", "air_quality", "joint_state",
+                 "camera_frame")
+JOINT_FIELDS = ("pos", "vin", "temp")
+
+
+def scalar_topic(base):
+    return f"{base}/scalars"
+
+
+def video_topic(base):
+    return f"{base}/video"
+
+
+def _jsonable(obj):
+    # json.dumps的default：只在遇到numpy类型时调用，不必事先遍历整个dict
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _joint_values(joint_state, field):
+    values = (joint_state or {}).get(field) or ()
+    mask, out = 0, [0] * JOINTS
+    for i, v in enumerate(values[:JOINTS]):
+        if v is not None:
+            mask |= 1 << i
+            out[i] = int(v)
+    return mask, out
+
+
+def encode_scalars(data, seq=0):
+    """把get_sensor_data()的dict打包成bytes"""
+    gait = data.get("current_gait")
+    code = GAIT_NAMES.index(gait) if gait in GAIT_NAMES else UNKNOWN_GAIT
+    extras = {k: v for k, v in data.items() if k not in HEADER_FIELDS}
+    if code == UNKNOWN_GAIT and gait is not None:
+        extras["current_gait"] = gait
+    tail = json.dumps(extras, separators=(",", ":"), ensure_ascii=False, default=_jsonable).encode() if extras else b""
+    joint_state = data.get("joint_state")
+    masks, columns = zip(*(_joint_values(joint_state, f) for f in JOINT_FIELDS))
+    return SCALAR_HEADER.pack(
+        MAGIC_SCALARS, VERSION, code, seq & 0xffffffff, data.get("timestamp", 0.0),
+        data.get("temperature", math.nan), data.get("pressure", math.nan), data.get("altitude", math.nan),
+        int(data.get("air_quality", 0)), *masks, *columns[0], *columns[1], *columns[2], len(tail)) + tail
+
+
+def decode_scalars(payload):
+    """encode_scalars的逆过程，返回与原JSON遥测相同结构的dict（另含seq）"""
+    fields = SCALAR_HEADER.unpack_from(payload)
+    magic, version, code, seq, timestamp, temperature, pressure, altitude, air_quality = fields[:9]
+    if magic != MAGIC_SCALARS or version != VERSION:
+        raise ValueError(f"不是遥测标量帧: magic={magic!r} version={version}")
+    masks = fields[9:12]
+    columns = [fields[12 + k * JOINTS:12 + (k + 1) * JOINTS] for k in range(3)]
+    tail_len = fields[-1]
+    data = {
+        "seq": seq,
+        "timestamp": timestamp,
+        "current_gait": GAIT_NAMES[code] if code < len(GAIT_NAMES) else None,
+        "temperature": round(temperature, 2),
+        "pressure": round(pressure, 2),
+        "altitude": round(altitude, 2),
+        "air_quality": air_quality,
+    }
+    if any(masks):
+        data["joint_state"] = {
+            field: [v if mask >> i & 1 else None for i, v in enumerate(values)]
+            for field, mask, values in zip(JOINT_FIELDS, masks, columns)
+        }
+    if tail_len:
+        start = SCALAR_HEADER.size
+        data.update(json.loads(bytes(payload[start:start + tail_len])))
+    return data
+
+
+def encode_video(jpeg, timestamp, seq=0):
+    """固定头 + 原始JPEG字节；jpeg可以是bytes/memoryview/numpy数组，只复制一次"""
+    return b"".join((VIDEO_HEADER.pack(MAGIC_VIDEO, VERSION, 0, seq & 0xffffffff, timestamp), jpeg))
+
+
+def decode_video(payload):
+    """返回({"seq", "timestamp"}, JPEG的memoryview)，不复制图像数据"""
+    magic, version, _, seq, timestamp = VIDEO_HEADER.unpack_from(payload)
+    if magic != MAGIC_VIDEO or version != VERSION:
+        raise ValueError(f"不是视频帧: magic={magic!r} version={version}")
+    return {"seq": seq, "timestamp": timestamp}, memoryview(payload)[VIDEO_HEADER.size:]
@@ -0,0 +1,170 @@
+"""遥测发布流水线
+
+原先一个线程每100ms依次做传感器读取、摄像头采集、JPEG编码、写CSV、写图片、MQTT发布，
+任何一步慢了（SGP40读数、磁盘刷写）都会拖住其他所有数据。Pipeline把一路数据拆成:
+
+    生产线程  按固定频率（MotionScheduler，跳拍不补）调用produce()，结果放进有界队列
+    消费线程  从队列取数据，依次执行各阶段（存储、编码、发布……）
+
+队列满时丢弃最旧的一条，消费跟不上时发布的总是最新数据，生产也不会被阻塞。
+每个阶段（含produce和排队等待"queue"）都记录耗时，stats()给出实际频率、丢弃数和
+各阶段的平均/p99/最大耗时。
+
+用法:
+    video = Pipeline("video", 10, camera.capture_jpeg, [("store", store), ("publish", publish)])
+    video.start()
+    ...
+    video.stop()
+阶段函数接收上一阶段的返回值；produce()或某个阶段返回None时这条数据到此为止，
+阶段抛出的异常计入errors，不会终止线程。
+"""
+import itertools
+import threading
+import time
+from collections import deque
+
+from motion_scheduler import MotionScheduler, SKIP
+
+PIPELINE_QUEUE = 2     # 每路流水线队列长度
+TIMING_WINDOW = 256    # 每个阶段用于分位数统计的最近样本数
+
+
+class DropOldestQueue(object):
+    """有界队列，满时丢弃最旧的一条"""
+
+    def __init__(self, maxlen=PIPELINE_QUEUE):
+        self._items = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取最早的一条，超时返回None"""
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageTimer(object):
+    """记录各阶段耗时"""
+
+    def __init__(self, window=TIMING_WINDOW):
+        self._window = window
+        self._samples = {}
+        self._count = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self._window)
+                self._count[stage] = 0
+            self._samples[stage].append(seconds)
+            self._count[stage] += 1
+
+    def stats(self):
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            count = dict(self._count)
+        return {
+            stage: {
+                "count": count[stage],
+                "mean_ms": round(sum(s) / len(s) * 1000, 3),
+                "p99_ms": round(s[min(len(s) - 1, int(len(s) * 0.99))] * 1000, 3),
+                "max_ms": round(s[-1] * 1000, 3),
+            }
+            for stage, s in samples.items() if s
+        }
+
+
+class Pipeline(object):
+    def __init__(self, name, rate, produce, stages, queue_size=PIPELINE_QUEUE):
+        self.name = name
+        self.rate = rate
+        self.produce = produce
+        self.stages = list(stages)
+        self.queue = DropOldestQueue(queue_size)
+        self.timer = StageTimer()
+        self.scheduler = MotionScheduler(rate, policy=SKIP, spin_ns=0)  # 10Hz量级不需要忙等
+        self.produced = 0
+        self.completed = 0
+        self.errors = 0
+        self._running = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._produce_loop, name=f"{self.name}-produce", daemon=True),
+            threading.Thread(target=self._consume_loop, name=f"{self.name}-consume", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=1.0):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.scheduler.set_rate(rate)
+
+    def _run_stage(self, stage, fn, *args):
+        t0 = time.monotonic()
+        try:
+            return fn(*args)
+        except Exception as e:
+            self.errors += 1
+            print(f"pipeline {self.name} {stage} error: {e}")
+            return None
+        finally:
+            self.timer.add(stage, time.monotonic() - t0)
+
+    def _tick(self, _):
+        item = self._run_stage("produce", self.produce)
+        if item is not None:
+            self.produced += 1
+            self.queue.put((time.monotonic(), item))
+
+    def _produce_loop(self):
+        self.scheduler.run(itertools.repeat(None), self._tick, self._running)
+
+    def _consume_loop(self):
+        while self._running.is_set():
+            entry = self.queue.get(timeout=0.1)
+            if entry is None:
+                continue
+            queued, item = entry
+            self.timer.add("queue", time.monotonic() - queued)
+            errors = self.errors
+            for stage, fn in self.stages:
+                item = self._run_stage(stage, fn, item)
+                if item is None:
+                    break
+            if self.errors == errors:
+                self.completed += 1
+
+    def stats(self):
+        sched = self.scheduler.stats()
+        return {
+            "rate": self.rate,
+            "achieved_rate": sched["achieved_rate"],
+            "overruns": sched["overruns"],
+            "produced": self.produced,
+            "completed": self.completed,
+            "dropped": self.queue.dropped,
+            "queue": len(self.queue),
+            "errors": self.errors,
+            "stages": self.timer.stats(),
+        }
@@ -5,13 +5,52 @@ import math
 import numpy as np
 import threading
 import scipy.optimize as optimize
+from gait_generator import GaitGenerator, GaitCache
+from motion_scheduler import MotionScheduler, DELAY, loop_rate
+from trajectory import KeyframeTrajectory
+import gait_fit
 # from driver_imu import Imu
         
 SNAKE_LENGTH = 12
 
+EVEN = list(range(0, SNAKE_LENGTH, 2))
+GAIT_CACHE = GaitCache()
+YUEZHANG_GAIT = GaitGenerator([4, 6, 8, 10], {4: 190, 6: 200, 8: 200, 10: 220}, 25,
+                              phase=[math.pi * i / 4 for i in (4, 6, 8, 10)], bias={10: -80})
+##蠕动/蜿蜒转弯：0号+50，10号-80；rudong取800-int(s)
+RUDONG_GAIT = GaitGenerator(EVEN, {0: 170, 2: 210, 4: 240, 6: 240, 8: 240, 10: 240}, 25,
+                            phase=[math.pi * i / 4 for i in EVEN], bias={0: 50, 10: -80}, invert=True)
+ZHUANWAN_GAIT = GaitGenerator(EVEN, {0: 170, 2: 210, 4: 240, 6: 240, 8: 240, 10: 240}, 25,
+                              phase=[math.pi * i / 4 for i in EVEN], bias={0: 50, 10: -80})
+##侧滑：10-i和11-i两个关节同一目标
+CEHUA_JOINTS = [j for i in EVEN for j in (10 - i, 11 - i)]
+CEHUA_PHASE = [math.pi * i / 4 for i in EVEN for _ in range(2)]
+CEHUA_R_GAIT = GaitGenerator(CEHUA_JOINTS, 150, 60, phase=CEHUA_PHASE)
+CEHUA_L_GAIT = GaitGenerator(CEHUA_JOINTS, 160, 60, phase=CEHUA_PHASE, invert=True)
+##侧翻/翻滚关键帧：(姿态, 过渡时间s, 保持时间s)，按KEYFRAME_RATE插值逐拍下发
+KEYFRAME_RATE = 40
+NEUTRAL = {i: 410 if i in (1, 3) else 370 if i in (9, 11) else 400 for i in range(SNAKE_LENGTH)}
+FANSHEN_L90 = KeyframeTrajectory([(NEUTRAL, 1.0, 1.0), ({3: 150, 9: 150}, 0.8),
+                                  ({2: 150, 10: 150}, 1.0, 0.5), (NEUTRAL, 1.0)], KEYFRAME_RATE)
+FANSHEN_R90 = KeyframeTrajectory([(NEUTRAL, 1.0), ({3: 650, 9: 650}, 0.9),
+                                  ({2: 150, 10: 150}, 1.0, 0.5), (NEUTRAL, 1.0)], KEYFRAME_RATE)
+FANSHEN_L180 = KeyframeTrajectory([(NEUTRAL, 1.0, 1.0), ({2: 150, 4: 200, 8: 150, 10: 200}, 0.9),
+                                   ({1: 100, 11: 100}, 1.0, 0.5), (NEUTRAL, 1.0), ({3: 650, 9: 650}, 0.9),
+                                   ({2: 150, 10: 150}, 1.0, 0.5), (NEUTRAL, 1.0)], KEYFRAME_RATE)
+FANSHEN_R180 = KeyframeTrajectory([(NEUTRAL, 1.0, 1.0), ({2: 650, 4: 600, 8: 650, 10: 600}, 0.9),
+                                   ({1: 700, 11: 700}, 1.0, 0.5), (NEUTRAL, 1.0), ({3: 150, 9: 150}, 0.9),
+                                   ({2: 650, 10: 650}, 1.0, 0.5), (NEUTRAL, 1.0)], KEYFRAME_RATE)
+FANGUN_L = KeyframeTrajectory([(NEUTRAL, 1.0, 1.0)] + [({3: 250, 9: 250}, 1.0), ({2: 250, 10: 250}, 1.0),
+                                                       ({3: 550, 9: 550}, 1.0), ({2: 550, 10: 550}, 1.0)] * 20,
+                              KEYFRAME_RATE)
+FANGUN_R = KeyframeTrajectory([(NEUTRAL, 1.0, 1.0)] + [({3: 550, 9: 550}, 1.0), ({2: 250, 10: 250}, 1.0),
+                                                       ({3: 250, 9: 250}, 1.0), ({2: 550, 10: 550}, 1.0)] * 20,
+                              KEYFRAME_RATE)
+
 class Process(object):
     def __init__(self):
         self.servo = ServoDriver()   ###创建类的对象
+        self.servo.set_deadband(2)   ###目标变化不超过2个计数时跳过写入，每0.25s强制刷新
         self.enable(1)
         self.servo_list = []   ##舵机id列表
         # self.demo1 = Imu()#111
@@ -22,6 +61,7 @@ class Process(object):
         self.y=0
         self.N=400   ##直径85cm左右
         self.M=0
+        self.scheduler = None   ##当前步态的MotionScheduler，scheduler.stats()查看抖动/超时
         self.functions = (self.fuwei,self.rudong_u,self.rudong_X,self.wanyan_zhixing, self.fangun_L,self.fangun_R,self.cehua_L, self.cehua_R
              )##复位0 蠕动1 蠕动2 蜿蜒直行3 翻滚左4  翻滚右5 侧滑左边6 侧滑右7
 
@@ -33,9 +73,13 @@ class Process(object):
             print(self.servo_list)
 
     def offset_adjust(self):  ##读取舵机位置
+        state, valid = self.servo.sweep(('pos',))
         for i in range(SNAKE_LENGTH):
-            a, b = self.servo.pos_read(i)
-            print(i, a, b)
+            if not valid[i, 0]:
+                print(i, 'pos read error')
+                continue
+            a = int(state['pos'][i])
+            print(i, a)
             self.servo.angle_offset_adjust(i, a-400)
             self.servo.angle_offset_write(i)
 
@@ -45,12 +89,31 @@ class Process(object):
     def disable(self, value=0):  #
         for i in range(SNAKE_LENGTH):  # 遍历12个舵机
             self.servo.load_or_unload_write(i, value)  # 0 掉电，1装电，恒为0
-    def read(self):     ##读取舵机id
+    def read(self):     ##读取舵机位置、电压、温度
+        state, valid = self.servo.sweep()
         for i in range(SNAKE_LENGTH):
-            a, b = self.servo.pos_read(i)
-            print(i, a, b)
+            print(i, *[state[f][i] if valid[i, k] else None for k, f in enumerate(state.dtype.names)])
     def target_func(self, x, a0, a1, a2, a3):
-        return a0 * np.sin(a1 * x + a2) + a3
+        return gait_fit.target_func(x, a0, a1, a2, a3)
+    def stream(self, gait, tim, interval, run=lambda: True):   ##按self.t逐行整帧下发步态表；interval为原循环每行sleep之和，
+        table = GAIT_CACHE.table(gait)                            ##加上每个关节一次写入的等待即原先的周期，整帧写不完时不跳行
+        def rows():
+            while run():
+                yield table[self.t % len(table)]
+                self.t = self.t + 1
+        self.scheduler = MotionScheduler(loop_rate(interval, len(gait.joints)), policy=DELAY)
+        self.scheduler.run(rows(), lambda row: self.servo.move_many(row, tim, gait.joints))
+    def play(self, trajectory, run=lambda: True):   ##从舵机当前位置出发，逐拍下发关键帧插值表，run()为False时一拍内停止
+        state, valid = self.servo.sweep(('pos',))
+        start = {i: int(state['pos'][i]) for i in range(SNAKE_LENGTH) if valid[i, 0]}
+        table = trajectory.table(start)
+        def rows():
+            for row in table:
+                if not run():
+                    return
+                yield row
+        self.scheduler = MotionScheduler(trajectory.rate)
+        self.scheduler.run(rows(), lambda row: self.servo.move_many(row, trajectory.tick_ms(), trajectory.joints))
 
 
     def fuwei(self):       ##复位
@@ -77,29 +140,7 @@ class Process(object):
             if i==9 or i==11:
                 self.servo.move_time_write(i, 370, 1000)
         time.sleep(1.2)
-        while True:
-            for i in range(2, SNAKE_LENGTH, 2):
-                # if i==2 and 150 * (math.sin( math.pi* self.t/25))>0:
-                #     s = 150 * (math.sin( math.pi* self.t/25)) + 690
-                #     self.servo.move_time_write(i, int(s), 4)
-                #     print (i,int(s),self.t)
-                #     time.sleep(0.004)
-                if i==4:
-                    s = 190 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==10:
-                    s = 220 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400-80
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==6 or i==8:
-                    s = 200 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-            self.t=self.t+1 
+        self.stream(YUEZHANG_GAIT, 4, 0.016)
         # for i in range(1,10,2):    ## 3，5，7，9，11
         #     s=190*(math.sin(math.pi*self.t/125+math.pi*(i-1)/(2*self.d)))+400+i*1.8
         #     print(12-i,int(s),self.t)
@@ -175,42 +216,14 @@ class Process(object):
     def wanyan_zhixing(self):  ###直行
         # self.servo.move_time_write(11, 370, 100)  
         # self.servo.move_time_write(9, 370, 1000)  
-        while True:
-            self.servo.move_time_write(0,430,2)
-            for i in range(1,SNAKE_LENGTH,2):    ##1，3，5，7，9，11
-                s=190*(math.sin(math.pi*self.t/125+math.pi*(i-1)/(2*self.d)))+400+i*1.8
-                # print(12-i,int(s),self.t)
-                print('蜿蜒直行')
-                self.servo.move_time_write(12-i,int(s),2)
-            time.sleep(0.002)
-            self.t=self.t+1
+        odd = range(1,SNAKE_LENGTH,2)    ##1，3，5，7，9，11
+        gait = GaitGenerator([0] + [12-i for i in odd], [0] + [190]*6, 125,
+                             phase=[0] + [math.pi*(i-1)/(2*self.d) for i in odd],
+                             offset=[430] + [400]*6, bias=[0] + [i*1.8 for i in odd])
+        print('蜿蜒直行')
+        self.stream(gait, 2, 0.002)
     def wanyan_zhuanwan(self):  ###蜿蜒转弯
-        while True:
-            for i in range(0, SNAKE_LENGTH, 2):
-                if i==0:
-                    s = 170 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400+50
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)         
-                if i==2:
-                    s = 210 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==4 or i==6 or i==8:
-                    s = 240* (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==10:
-                    s = 240 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400-80
-                    self.servo.move_time_write(i, int(s), 5)
-                    print (i,int(s),self.t)
-                    time.sleep(0.005)
-                # if not self._run:
-                #     print('rudong_s exit')
-                #     return
-            self.t = self.t + 1
+        self.stream(ZHUANWAN_GAIT, 4, 0.025)
             
         # while 1:
         #     # if self.k==0:      
@@ -260,200 +273,25 @@ class Process(object):
                     #     print('home exit')
                     #     return
     def fanshen_L90(self):   #####左边侧翻90°   回正
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)    
-        time.sleep(2)
-        self.servo.move_time_write(3, 150, 1000)
-        self.servo.move_time_write(9, 150, 1000)  
-        time.sleep(0.8)
-        self.servo.move_time_write(2, 150, 1000)
-        self.servo.move_time_write(10, 150, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
+        self.play(FANSHEN_L90)
     def fanshen_R90(self):   #####右边90°侧翻回正
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)    
-        time.sleep(1)
-        self.servo.move_time_write(3, 650, 1000)
-        self.servo.move_time_write(9, 650, 1000)  
-        time.sleep(0.9)
-        self.servo.move_time_write(2, 150, 1000)
-        self.servo.move_time_write(10, 150, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)
+        self.play(FANSHEN_R90)
     def fanshen_L180(self):   #####180°侧翻回正
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)    
-        time.sleep(2)
-        self.servo.move_time_write(2, 150, 1000)
-        self.servo.move_time_write(4, 200, 1000)
-        self.servo.move_time_write(8, 150, 1000)
-        self.servo.move_time_write(10, 200, 1000)  
-        time.sleep(0.9)
-        self.servo.move_time_write(1, 100, 1000)
-        self.servo.move_time_write(11, 100, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
-        time.sleep(1)
-        self.servo.move_time_write(3, 650, 1000)
-        self.servo.move_time_write(9, 650, 1000)  
-        time.sleep(0.9)
-        self.servo.move_time_write(2, 150, 1000)
-        self.servo.move_time_write(10, 150, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)
+        self.play(FANSHEN_L180)
     def fanshen_R180(self):   #####180°侧翻回正
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000)    
-        time.sleep(2)
-        self.servo.move_time_write(2, 650, 1000)
-        self.servo.move_time_write(4, 600, 1000)
-        self.servo.move_time_write(8, 650, 1000)
-        self.servo.move_time_write(10, 600, 1000)  
-        time.sleep(0.9)
-        self.servo.move_time_write(1, 700, 1000)
-        self.servo.move_time_write(11, 700, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
-        time.sleep(1)
-        self.servo.move_time_write(3, 150, 1000)
-        self.servo.move_time_write(9, 150, 1000)  
-        time.sleep(0.9)
-        self.servo.move_time_write(2, 650, 1000)
-        self.servo.move_time_write(10, 650, 1000)    
-        time.sleep(1.5)
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
-
-                
+        self.play(FANSHEN_R180)
     def fangun_R(self):
-        self.n=0
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
-        time.sleep(2)
-        for self.n in range(20):
-            self.servo.move_time_write(3, 550, 1000)
-            self.servo.move_time_write(9, 550, 1000)  
-            time.sleep(1)
-            self.servo.move_time_write(2, 250, 1000)
-            self.servo.move_time_write(10, 250, 1000)    
-            time.sleep(1)
-            self.servo.move_time_write(3, 250, 1000)
-            self.servo.move_time_write(9, 250, 1000)  
-            time.sleep(1)
-            self.servo.move_time_write(2, 550, 1000)
-            self.servo.move_time_write(10, 550, 1000)    
-            time.sleep(1)
-            self.n=self.n+1
+        self.play(FANGUN_R)
     def fangun_L(self):
-        for i in range(0,SNAKE_LENGTH,1):
-            print(i)
-            self.servo.move_time_write(i,400,1000)
-            if i==1 or i==3:
-                self.servo.move_time_write(i,410,1000)
-            if i==9 or i==11:
-                self.servo.move_time_write(i, 370, 1000) 
-        time.sleep(2)
-        for n in range(20):
-            self.servo.move_time_write(3, 250, 1000)
-            self.servo.move_time_write(9, 250, 1000)  
-            time.sleep(1)
-            self.servo.move_time_write(2, 250, 1000)
-            self.servo.move_time_write(10, 250, 1000)    
-            time.sleep(1)
-            self.servo.move_time_write(3, 550, 1000)
-            self.servo.move_time_write(9, 550, 1000)  
-            time.sleep(1)
-            self.servo.move_time_write(2, 550, 1000)
-            self.servo.move_time_write(10, 550, 1000)    
-            time.sleep(1)
-            self.n=self.n+1
+        self.play(FANGUN_L)
 
 
     def cehua_R(self):
-        while self._run:
-            for i in range(0, SNAKE_LENGTH, 2):
-                s = 150 * (math.sin( math.pi* self.t/60 + math.pi * i /4)) + 400
-                self.servo.move_time_write(10-i, int(s), 2)
-                self.servo.move_time_write(11-i, int(s), 2)
-                time.sleep(0.003)
-                if not self._run:
-                    print('fangun exit')
-                    return
-            self.t = self.t + 1
-            print (self.t)
+        self.stream(CEHUA_R_GAIT, 2, 0.018, lambda: self._run)
+        print('fangun exit')
     def cehua_L(self):
-        while self._run:
-            for i in range(0, SNAKE_LENGTH, 2):
-                s = 160 * (math.sin( math.pi* self.t/60 + math.pi * i /4)) + 400
-                self.servo.move_time_write(10-i, 800-int(s), 2)
-                self.servo.move_time_write(11-i, 800-int(s), 2)
-                time.sleep(0.003)
-                if not self._run:
-                    print('fangun exit')
-                    return
-            self.t = self.t + 1
-            print (self.t)
+        self.stream(CEHUA_L_GAIT, 2, 0.018, lambda: self._run)
+        print('fangun exit')
     def rudong_u(self):
         
         while True:
@@ -495,43 +333,17 @@ class Process(object):
                             print('rudong_s exit')
                             return
                     self.t=self.t+1 
-            while self.M==0:
-                for i in range(1, SNAKE_LENGTH, 2):
-                    if i==1:
-                        self.servo.move_time_write(i,self.N+10,500)
-                    if i==3:
-                        self.servo.move_time_write(i,self.N+10,500)
-                    if i==9:
-                        self.servo.move_time_write(i, self.N-30, 500)
-                    if i==11:
-                        self.servo.move_time_write(i, self.N-30, 500)
-                    if i==5: 
-                        self.servo.move_time_write(i,self.N,10)
-                    if i==7: 
-                        self.servo.move_time_write(i,self.N,10)
-                for i in range(0, SNAKE_LENGTH, 2):
-                    if i==0:
-                        s = 170 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400+50
-                        self.servo.move_time_write(i, 800-int(s), 4)
-                        print (i,int(s),self.t)
-                        time.sleep(0.004)         
-                    if i==2:
-                        s = 210 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                        self.servo.move_time_write(i, 800-int(s), 4)
-                        print (i,int(s),self.t)
-                        time.sleep(0.004)
-                    if i==4 or i==6 or i==8:
-                        s = 240* (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                        self.servo.move_time_write(i, 800-int(s), 4)
-                        print (i,int(s),self.t)
-                        time.sleep(0.004)
-                    if i==10:
-                        s = 240 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400-80
-                        self.servo.move_time_write(i, 800-int(s), 5)
-                        print (i,int(s),self.t)
-                        time.sleep(0.005)
-   
-                self.t = self.t + 1
+            table = GAIT_CACHE.table(RUDONG_GAIT)
+            def rows():
+                while self.M==0:
+                    yield table[self.t % len(table)]
+                    self.t = self.t + 1
+            def emit(row):
+                self.servo.move_many({1: self.N+10, 3: self.N+10, 9: self.N-30, 11: self.N-30}, 500)
+                self.servo.move_many({5: self.N, 7: self.N}, 10)
+                self.servo.move_many(row, 4, RUDONG_GAIT.joints)
+            self.scheduler = MotionScheduler(loop_rate(0.025, 6 + len(RUDONG_GAIT.joints)), policy=DELAY)   ##原循环每行另写6个固定关节
+            self.scheduler.run(rows(), emit)
     def rudong_X(self):
         # self.servo.move_time_write(1,330,20)
         # self.servo.move_time_write(5,330,20)
@@ -540,29 +352,7 @@ class Process(object):
         # self.servo.move_time_write(7,470,20)
         # self.servo.move_time_write(11,450,20)
         # time.sleep(0.050)
-        while True:  
-            for i in range(0, SNAKE_LENGTH, 2):
-                if i==0:
-                    s = 170 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400+50
-                    self.servo.move_time_write(i, 800-int(s), 4)
-                    print (i,800-int(s),self.t)
-                    time.sleep(0.004)         
-                if i==2:
-                    s = 210 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, 800-int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==4 or i==6 or i==8:
-                    s = 240* (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400
-                    self.servo.move_time_write(i, 800-int(s), 4)
-                    print (i,int(s),self.t)
-                    time.sleep(0.004)
-                if i==10:
-                    s = 240 * (math.sin( math.pi* self.t/25 + math.pi * i /4)) + 400-80
-                    self.servo.move_time_write(i, 800-int(s), 5)
-                    print (i,int(s),self.t)
-                    time.sleep(0.005)
-            self.t=self.t+1
+        self.stream(RUDONG_GAIT, 4, 0.025)
 
     def main(self):
         while True:
@@ -0,0 +1,91 @@
+"""实验性AsyncServoDriver在EmulatedBus上的往返测试"""
+import asyncio
+import time
+
+import pytest
+
+import async_servo_driver
+from async_servo_driver import AsyncServoDriver
+from servo_emulator import EmulatedBus
+
+
+def run(coro_fn):
+    # 每个测试一条新总线、一个新事件循环；应答延迟放宽，理由同test_servo_emulator，
+    # 事件循环的调度还会再多出几毫秒抖动
+    bus = EmulatedBus(max_speed=1000.0, reply_latency=0.05, seed=0)
+
+    async def main():
+        async with AsyncServoDriver(port=bus) as servo:
+            servo.read_timeout = 0.2
+            return await coro_fn(servo, bus)
+
+    try:
+        return asyncio.run(main())
+    finally:
+        bus.close()
+
+
+def place(bus, positions):
+    now = time.perf_counter()
+    for node, pos in positions.items():
+        bus.servos[node].move(pos, 0, now)
+
+
+def test_reads_round_trip():
+    async def check(servo, bus):
+        place(bus, {2: 333, 8: 701})
+        assert (await servo.pos_read(2))[0] == 333
+        assert (await servo.pos_read(8))[0] == 701
+        assert await servo.id_read(4) == 4
+        assert await servo.temp_read(4) == 35
+        assert (await servo.vin_read(4))[0] == 7400
+        assert await servo.pos_read(20) is None
+        assert servo.stats()["totals"]["timeouts"] == 4   # 20号不存在：1次 + 3次重试
+
+    run(check)
+
+
+def test_writes_reach_servos():
+    async def check(servo, bus):
+        await servo.move_many({1: 420, 6: 580}, 30)
+        await servo.move_time_write(9, 250, 40)
+        await servo.load_or_unload_write(3, 1)
+        await asyncio.sleep(0.01)
+        assert bus.servos[1].last_move == (420, 30) and bus.servos[6].last_move == (580, 30)
+        assert bus.servos[9].last_move == (250, 40)
+        assert bus.servos[3].loaded == 1
+        assert bus.stats()["truncated_bytes"] == 0
+
+    run(check)
+
+
+def test_sweep_values_and_mask():
+    async def check(servo, bus):
+        place(bus, {node: 200 + 20 * node for node in range(12)})
+        state, valid = await servo.sweep(('pos', 'id'), nodes=(0, 5, 11, 12))
+        assert valid[:3].all() and not valid[3].any()
+        assert list(state['pos'][:3]) == [200, 300, 420]
+        assert list(state['id'][:3]) == [0, 5, 11]
+
+    run(check)
+
+
+def test_sweep_interleaves_with_motion():
+    # 关节之间释放锁，同一事件循环里的运动帧可以插进遥测
+    async def check(servo, bus):
+        async def motion():
+            for k in range(5):
+                await servo.move_many([400 + k] * 12, 4)
+                await asyncio.sleep(0.005)
+
+        (state, valid), _ = await asyncio.gather(servo.sweep(('id',), nodes=range(6)), motion())
+        assert valid.all() and list(state['id']) == list(range(6))
+        assert bus.servos[0].last_move == (404, 4)
+
+    run(check)
+
+
+@pytest.mark.skipif(async_servo_driver.SERIAL_ASYNCIO_AVAILABLE, reason="装了pyserial-asyncio")
+def test_open_without_serial_asyncio():
+    with pytest.raises(ImportError):
+        asyncio.run(AsyncServoDriver().open())
@@ -0,0 +1,194 @@
+"""ServoBus的调度顺序：位置帧合并、普通/后台请求不被持续的位置写入饿死、阻塞调用超时"""
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import numpy as np
+import pytest
+
+import servo_bus
+from servo_bus import ServoBus, PRIO_URGENT, PRIO_BACKGROUND
+from servo_emulator import make_driver
+
+
+class RecordingDriver(object):
+    """记录调用顺序的假驱动；gate未放行时move_many阻塞，用来在worker忙时排好队列"""
+    deadband_filter = None
+    guard = None
+
+    def __init__(self):
+        self.log = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def move_many(self, positions, tim, nodes=None):
+        self.gate.wait()
+        self.log.append(("move_many", dict(positions)))
+
+    def pos_read(self, node):
+        self.log.append(("pos_read", node))
+        return node
+
+    def temp_read(self, node):
+        self.log.append(("temp_read", node))
+        return 30
+
+    def sweep(self, fields, nodes):
+        self.log.append(("sweep", tuple(nodes)))
+        data = np.zeros(len(nodes), dtype=[(f, 'i2') for f in fields])
+        data[fields[0]] = nodes
+        return data, np.ones((len(nodes), len(fields)), dtype=bool)
+
+    def move_stop(self, node):
+        self.log.append(("move_stop", node))
+
+    def hang_read(self, node):
+        time.sleep(1.0)
+
+
+class GrowingStats(object):
+    """遍历和插入都让出GIL，两边不加锁时几乎必然撞上dictionary changed size during iteration"""
+
+    def __init__(self):
+        self.cells = {}
+
+    def grow(self, count):
+        for k in range(count):
+            self.cells[len(self.cells)] = k
+            time.sleep(0)
+
+    def totals(self):
+        total = 0
+        for value in self.cells.values():
+            total += value
+            time.sleep(0)
+        return {"requests": len(self.cells)}
+
+
+class StatsDriver(RecordingDriver):
+    def __init__(self):
+        super().__init__()
+        self.read_stats = GrowingStats()
+
+    def grow_read(self, count):
+        self.read_stats.grow(count)
+
+
+@pytest.fixture
+def recording():
+    driver = RecordingDriver()
+    bus = ServoBus(driver)
+    yield driver, bus
+    driver.gate.set()
+    bus.close()
+
+
+def hold_worker(driver, bus):
+    # 让worker卡在一次位置帧里，之后提交的请求都在队列中等待
+    driver.gate.clear()
+    bus.move_many({0: 100}, 4)
+    deadline = time.monotonic() + 1.0
+    while bus._positions and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_positions_coalesce(recording):
+    driver, bus = recording
+    hold_worker(driver, bus)
+    for pos in (200, 210, 220):
+        bus.move_time_write(1, pos, 4)
+    bus.move_time_write(2, 300, 4)
+    driver.gate.set()
+    assert bus.drain()
+    assert driver.log == [("move_many", {0: 100}), ("move_many", {1: 220, 2: 300})]
+    assert bus.coalesced == 2
+
+
+def test_reads_run_between_position_frames(recording):
+    driver, bus = recording
+    hold_worker(driver, bus)
+    normal = bus.post("pos_read", 5)
+    background = bus.post("temp_read", 6, priority=PRIO_BACKGROUND)
+    bus.move_many({0: 110}, 4)
+    driver.gate.set()
+    assert normal.result(1.0) == 5 and background.result(1.0) == 30
+    assert bus.drain()
+    # 每次位置帧之后先让出一条排队的请求，普通优先于后台
+    assert [entry[0] for entry in driver.log] == ["move_many", "pos_read", "move_many", "temp_read"]
+
+
+def test_urgent_goes_first(recording):
+    driver, bus = recording
+    hold_worker(driver, bus)
+    bus.post("pos_read", 5)
+    bus.move_many({0: 120}, 4)
+    bus.post("move_stop", 3, priority=PRIO_URGENT)
+    driver.gate.set()
+    assert bus.drain()
+    assert [entry[0] for entry in driver.log] == ["move_many", "move_stop", "pos_read", "move_many"]
+
+
+def test_sweep_timeout_marks_cells_invalid(recording):
+    driver, bus = recording
+    assert bus.sweep(("pos",), nodes=(1, 2))[1].all()
+    hold_worker(driver, bus)
+    t0 = time.monotonic()
+    state, valid = bus.sweep(("pos", "vin"), nodes=(3, 4), timeout=0.05)
+    assert time.monotonic() - t0 < 0.5
+    assert valid.shape == (2, 2) and not valid.any()
+    driver.gate.set()
+    assert bus.drain()
+    # 超时撤销的请求不再占用总线
+    assert [entry for entry in driver.log if entry[0] == "sweep"] == [("sweep", (1,)), ("sweep", (2,))]
+
+
+def test_blocking_wrapper_times_out(recording, monkeypatch):
+    driver, bus = recording
+    monkeypatch.setattr(servo_bus, "CALL_TIMEOUT", 0.05)
+    t0 = time.monotonic()
+    with pytest.raises(TimeoutError):
+        bus.hang_read(1)
+    assert time.monotonic() - t0 < 0.5
+    assert bus.drain()
+
+
+def test_sweep_completes_under_continuous_writes():
+    # 步态线程不停写位置时，后台遥测仍然每轮都能读完
+    driver = make_driver(max_speed=1000.0, reply_latency=0.02, seed=0)
+    driver.read_timeout = 0.1
+    bus = ServoBus(driver)
+    running = threading.Event()
+    running.set()
+
+    def gait():
+        k = 0
+        while running.is_set():
+            bus.move_many([400 + k % 50] * 12, 4)
+            k += 1
+            time.sleep(0.001)
+
+    writer = threading.Thread(target=gait, daemon=True)
+    writer.start()
+    try:
+        state, valid = bus.sweep(("id",), nodes=range(6), timeout=2.0)
+        assert list(state["id"]) == list(range(6)) and valid.all()
+        assert bus.frames > 0
+    finally:
+        running.clear()
+        writer.join(1.0)
+        bus.close()
+        driver.port.close()
+
+
+def test_stats_while_worker_records():
+    # worker执行读请求时往驱动的统计dict里加新键，别的线程同时调用stats()
+    driver = StatsDriver()
+    bus = ServoBus(driver)
+    try:
+        futures = [bus.post("grow_read", 50) for _ in range(20)]
+        while not futures[-1].done():
+            bus.stats()
+        assert bus.stats()["reads"]["requests"] == 1000
+        assert bus.errors == 0
+    finally:
+        bus.close()
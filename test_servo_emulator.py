@@ -0,0 +1,110 @@
+"""servo_driver在EmulatedBus上的往返测试：读写、重试、sweep、整帧下发和收发切换标定"""
+import time
+
+import pytest
+
+from servo_emulator import make_driver
+
+
+@pytest.fixture
+def servo():
+    # max_speed足够大，move_time_write(.., 0)后位置立即到位。这里测的是数据而不是时序：
+    # 测试机上线程偶尔被挂起几毫秒，切回接收太晚会丢应答开头，所以应答延迟和超时都放宽
+    driver = make_driver(max_speed=1000.0, reply_latency=0.02, seed=0)
+    driver.read_timeout = 0.1
+    yield driver
+    driver.port.close()
+
+
+def place(servo, positions):
+    now = time.perf_counter()
+    for node, pos in positions.items():
+        servo.port.servos[node].move(pos, 0, now)
+
+
+def packet(node, pos, tim):
+    body = [node, 7, 1, pos & 0xff, pos >> 8, tim & 0xff, tim >> 8]
+    return bytes([0x55, 0x55] + body + [~sum(body) & 0xff])
+
+
+def test_pos_read_round_trip(servo):
+    place(servo, {3: 612, 7: 188})
+    assert servo.pos_read(3)[0] == 612
+    assert servo.pos_read(7)[0] == 188
+    assert servo._read(5, 14) == bytes((5,))
+    assert servo.stats()["totals"]["retries"] == 0
+
+
+def test_read_missing_servo(servo):
+    assert servo._read(20, 28, redo=2) is False
+    totals = servo.stats()["totals"]
+    assert totals["timeouts"] == 3 and totals["retries"] == 2 and totals["ok"] == 0
+
+
+def test_read_retries_dropped_reply(servo):
+    bus = servo.port
+    queue_reply = bus._queue_reply
+    dropped = []
+
+    def drop_first(*args):
+        if not dropped:
+            dropped.append(args)
+            return
+        queue_reply(*args)
+
+    bus._queue_reply = drop_first
+    place(servo, {4: 455})
+    assert servo.pos_read(4)[0] == 455
+    assert len(dropped) == 1
+    totals = servo.stats()["totals"]
+    assert totals["timeouts"] == 1 and totals["retries"] == 1 and totals["ok"] == 1
+
+
+def test_sweep_values_and_mask(servo):
+    bus = servo.port
+    place(servo, {node: 300 + 10 * node for node in range(12)})
+    for node, s in bus.servos.items():
+        s.vin = 7000 + node
+        s.temp = 30 + node
+    state, valid = servo.sweep(nodes=range(13))   # 13号关节不存在
+    assert valid.shape == (13, 3)
+    assert valid[:12].all() and not valid[12].any()
+    assert list(state['pos'][:12]) == [300 + 10 * node for node in range(12)]
+    assert list(state['vin'][:12]) == [7000 + node for node in range(12)]
+    assert list(state['temp'][:12]) == [30 + node for node in range(12)]
+
+
+def test_sweep_field_subset(servo):
+    state, valid = servo.sweep(('pos', 'id'), nodes=(2, 9))
+    assert state.dtype.names == ('pos', 'id')
+    assert valid.all()
+    assert list(state['id']) == [2, 9]
+
+
+def test_move_many_frame_bytes(servo):
+    bus = servo.port
+    written = []
+    write = bus.write
+    bus.write = lambda data: written.append(bytes(data)) or write(data)
+    servo.move_many({2: 300, 5: 650, 11: 1000}, 20)
+    assert written == [packet(2, 300, 20) + packet(5, 650, 20) + packet(11, 1000, 20)]
+    assert bus.stats()["frames"] == 3 and bus.stats()["truncated_bytes"] == 0
+    assert [bus.servos[n].last_move for n in (2, 5, 11)] == [(300, 20), (650, 20), (1000, 20)]
+
+    written.clear()
+    servo.move_many([400, 401], 4, nodes=[0, 1])
+    assert written == [packet(0, 400, 4) + packet(1, 401, 4)]
+
+
+def test_calibrate_turnaround():
+    # 标定测的正是收发切换的时间窗口，用默认的应答延迟
+    servo = make_driver(seed=0)
+    start, stop = 0.0003, -0.0003
+    smallest, adopted = servo.calibrate_turnaround(node=1, start=start, stop=stop, trials=3)
+    assert smallest is not None
+    assert stop <= smallest <= adopted <= start
+    assert servo.turnaround == adopted
+    # 标定时故意制造的失败不计入该关节的失败率
+    assert 1 not in servo.stats()["fail_rate"]
+    assert servo.id_read(1) == 1
+    servo.port.close()
@@ -0,0 +1,31 @@
+"""JointStateCache：过期字段的轮询补读与发布快照"""
+from tracking import JointStateCache
+
+MAX_AGE = {"pos": 0.25, "vin": 2.0, "temp": 2.0}
+
+
+def test_due_round_robin_over_expired_fields():
+    cache = JointStateCache(joints=4, max_age=MAX_AGE)
+    assert cache.due(2, now=0.0) == [(0, ("pos", "vin", "temp")), (1, ("pos", "vin", "temp"))]
+    assert cache.due(2, now=0.0) == [(2, ("pos", "vin", "temp")), (3, ("pos", "vin", "temp"))]
+    for node in range(4):
+        for field in ("pos", "vin", "temp"):
+            cache.update(node, field, 100 + node, now=0.0)
+    assert cache.due(2, now=0.1) == []
+    # 位置先过期；后台反馈刷新过的关节跳过
+    cache.update(1, "pos", 101, now=0.5)
+    assert cache.due(2, now=0.6) == [(0, ("pos",)), (2, ("pos",))]
+    assert cache.due(2, now=0.6) == [(3, ("pos",)), (0, ("pos",))]
+
+
+def test_snapshot_marks_stale_cells():
+    cache = JointStateCache(joints=3, max_age=MAX_AGE, stale=5.0)
+    cache.update(0, "pos", 412, now=10.0)
+    cache.update(1, "vin", 7390, now=3.0)
+    cache.update(2, "current", 1, now=10.0)   # 不在字段表里的忽略
+    assert cache.snapshot(now=10.5) == {
+        "pos": [412, None, None],
+        "vin": [None, None, None],
+        "temp": [None, None, None],
+    }
+    assert cache.snapshot(now=7.0)["vin"] == [None, 7390, None]
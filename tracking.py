@@ -0,0 +1,209 @@
+"""关节跟踪误差监测
+
+MATLAB原型里每步都记录指令角与实际角（thetaAct），真机运动中却从不回读位置。
+TrackingMonitor保存每个关节最近的指令（command，每拍由运动线程记录）和位置回读
+（observe，来自总线空闲时的后台读取），在环形缓冲区里算出:
+
+    误差  实际位置 - 读数时刻之前最近一次指令
+    滞后  最近LAG_WINDOW秒的指令里与实际位置最接近的那一条距读数时刻多久
+    残差  实际位置 - 按该关节滞后的中位数回推的那条指令，即扣除正常滞后之后的误差
+
+舵机跟不上快速步态时误差会很大但残差很小；残差连续STALL_COUNT次超过STALL_ERROR的
+关节判为卡滞（堵转、负载过大或掉线），指令的运动时间（如1000ms回中立位）结束前不计。
+summary()给出每个关节的RMS/最大误差、平均滞后和卡滞标记，可直接随遥测发布。
+trace()/save_trace()导出最近的样本，供gait_fit拟合舵机滞后。所有方法都可在任意线程调用。
+
+JointStateCache缓存每个关节最近读到的pos/vin/temp，遥测从缓存发布，每个周期只补读
+少数几个过期的格子，不再每周期整轮读12x3次、与步态帧争抢总线。
+"""
+import threading
+import time
+
+import numpy as np
+
+TRACK_HISTORY = 64   # 每个关节保留的指令条数（约1.8s@34.7Hz）
+TRACK_SAMPLES = 128  # 每个关节保留的误差/滞后样本数
+LAG_WINDOW = 0.5     # 估计滞后时回看的指令时间（秒）
+STALL_ERROR = 60     # 残差超过该计数视为超差
+STALL_COUNT = 3      # 连续超差该次数判为卡滞
+MIN_LAG_SAMPLES = 8  # 滞后样本不足时中位数还不可靠，不判卡滞
+JOINT_STATE_MAX_AGE = {"pos": 0.25, "vin": 2.0, "temp": 2.0}  # 缓存超过该秒数需要补读（运动中pos由后台反馈刷新）
+JOINT_STATE_STALE = 5.0  # 超过该秒数没读到的格子发布为None
+
+
+def _round(x, ndigits):
+    return None if np.isnan(x) else round(float(x), ndigits)
+
+
+class TrackingMonitor(object):
+    def __init__(self, joints=12, history=TRACK_HISTORY, samples=TRACK_SAMPLES):
+        self.joints = joints
+        self._cmd_pos = np.zeros((joints, history))
+        self._cmd_t = np.full((joints, history), -np.inf)
+        self._due = np.full(joints, -np.inf)  # 最近一次指令运动时间结束的时刻
+        self._cmd_n = np.zeros(joints, dtype=np.int64)
+        self._err = np.full((joints, samples), np.nan)
+        self._lag = np.full((joints, samples), np.nan)
+        self._residual = np.full((joints, samples), np.nan)
+        self._t = np.full((joints, samples), np.nan)  # 样本的读数时刻
+        self._actual = np.full((joints, samples), np.nan)
+        self._n = np.zeros(joints, dtype=np.int64)
+        self._over = np.zeros(joints, dtype=np.int64)  # 连续超差次数
+        self.stalls = 0
+        self._lock = threading.Lock()
+
+    def command(self, nodes, positions, tim=0, now=None):
+        """记录刚下发的指令，tim为指令的运动时间（ms）"""
+        now = time.monotonic() if now is None else now
+        idx = np.asarray(nodes, dtype=np.intp)
+        with self._lock:
+            k = self._cmd_n[idx] % self._cmd_t.shape[1]
+            self._cmd_pos[idx, k] = positions
+            self._cmd_t[idx, k] = now
+            self._cmd_n[idx] += 1
+            self._due[idx] = now + tim / 1000.0
+
+    def observe(self, node, actual, now=None):
+        """记录一次位置回读，返回该关节是否刚进入卡滞"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            t, p = self._cmd_t[node], self._cmd_pos[node]
+            known = np.isfinite(t) & (t <= now)  # 未写过的槽时间为-inf
+            if not known.any():
+                return False
+            error = actual - p[np.argmax(np.where(known, t, -np.inf))]
+            window = known & (t >= now - LAG_WINDOW)
+            settled = now >= self._due[node]
+            if window.any():
+                best = np.argmin(np.where(window, np.abs(p - actual), np.inf))
+                lag = now - t[best]
+                # 卡住的关节也总能在往复的指令里找到接近的一条，所以残差按历史滞后回推，
+                # 不用本次的最佳匹配
+                lags = self._lag[node]
+                lags = lags[~np.isnan(lags)]
+                if len(lags):
+                    best = np.argmin(np.where(known, np.abs(t - (now - np.median(lags))), np.inf))
+                settled = settled and len(lags) >= MIN_LAG_SAMPLES
+                residual = actual - p[best]
+            else:
+                lag, residual = np.nan, error
+            k = self._n[node] % self._err.shape[1]
+            self._err[node, k] = error
+            self._lag[node, k] = lag
+            self._residual[node, k] = residual
+            self._t[node, k] = now
+            self._actual[node, k] = actual
+            self._n[node] += 1
+            if settled:
+                self._over[node] = self._over[node] + 1 if abs(residual) > STALL_ERROR else 0
+            stalled = self._over[node] == STALL_COUNT
+            if stalled:
+                self.stalls += 1
+            return bool(stalled)
+
+    def stalled(self):
+        return [int(j) for j in np.flatnonzero(self._over >= STALL_COUNT)]
+
+    def reset(self):
+        with self._lock:
+            self._err[:] = np.nan
+            self._lag[:] = np.nan
+            self._residual[:] = np.nan
+            self._t[:] = np.nan
+            self._actual[:] = np.nan
+            self._n[:] = 0
+            self._over[:] = 0
+
+    def trace(self):
+        """最近的样本按时间排成(t, commanded, actual)：t为(n,)秒，另两个为(n, joints)，
+        每行只有读数的那个关节有值，其余为nan；commanded是读数时刻之前最近一次指令"""
+        with self._lock:
+            t, actual, err = self._t.copy(), self._actual.copy(), self._err.copy()
+        node, k = np.nonzero(~np.isnan(t))
+        order = np.argsort(t[node, k])
+        node, k = node[order], k[order]
+        rows = np.arange(len(node))
+        commanded = np.full((len(node), self.joints), np.nan)
+        measured = np.full((len(node), self.joints), np.nan)
+        commanded[rows, node] = actual[node, k] - err[node, k]
+        measured[rows, node] = actual[node, k]
+        return t[node, k], commanded, measured
+
+    def save_trace(self, path):
+        t, commanded, actual = self.trace()
+        if not len(t):
+            return False
+        np.savez(path, t=t - t[0], joints=np.arange(self.joints), commanded=commanded, actual=actual)
+        return True
+
+    def summary(self):
+        with self._lock:
+            err, lag, residual = self._err.copy(), self._lag.copy(), self._residual.copy()
+            n = self._n.copy()
+            stalled = self.stalled()
+        has = ~np.isnan(err)
+        count = np.maximum(has.sum(axis=1), 1)
+        safe = np.where(has, err, 0.0)
+        rms = np.where(has.any(axis=1), np.sqrt((safe ** 2).sum(axis=1) / count), np.nan)
+        worst = np.where(has.any(axis=1), np.abs(safe).max(axis=1), np.nan)
+        residual = np.where(has, np.abs(residual), 0.0)
+        residual = np.where(has.any(axis=1), np.nan_to_num(residual).sum(axis=1) / count, np.nan)
+        lag_has = ~np.isnan(lag)
+        lag_mean = np.where(lag_has.any(axis=1),
+                            np.where(lag_has, lag, 0.0).sum(axis=1) / np.maximum(lag_has.sum(axis=1), 1), np.nan)
+        return {
+            "samples": [int(x) for x in n],
+            "rms_error": [_round(x, 1) for x in rms],
+            "max_error": [_round(x, 0) for x in worst],
+            "mean_residual": [_round(x, 1) for x in residual],
+            "lag_ms": [_round(x * 1000, 1) for x in lag_mean],
+            "stalled": stalled,
+            "stalls": self.stalls,
+        }
+
+
+class JointStateCache(object):
+    """各关节最近一次读到的状态字段及读数时刻，update可在总线线程回调里调用"""
+
+    def __init__(self, fields=("pos", "vin", "temp"), joints=12, max_age=JOINT_STATE_MAX_AGE, stale=JOINT_STATE_STALE):
+        self.fields = tuple(fields)
+        self.max_age = np.array([max_age[f] for f in self.fields])
+        self.stale = stale
+        self._values = np.zeros((joints, len(self.fields)), dtype=np.int64)
+        self._t = np.full((joints, len(self.fields)), -np.inf)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def update(self, node, field, value, now=None):
+        if field not in self.fields:
+            return
+        k = self.fields.index(field)
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._values[node, k] = value
+            self._t[node, k] = now
+
+    def due(self, batch, now=None):
+        """从上次停下的关节起轮询，返回最多batch个有过期字段的关节：[(关节, (字段, ...)), ...]"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = now - self._t > self.max_age
+        joints = len(expired)
+        out = []
+        for node in [(self._next + i) % joints for i in range(joints)]:
+            if len(out) >= batch:
+                break
+            if expired[node].any():
+                out.append((node, tuple(f for f, e in zip(self.fields, expired[node]) if e)))
+                self._next = (node + 1) % joints
+        return out
+
+    def snapshot(self, now=None):
+        """{字段: [各关节的值]}，超过stale秒没读到的为None"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            values, fresh = self._values.copy(), now - self._t <= self.stale
+        return {
+            field: [int(v) if ok else None for v, ok in zip(values[:, k], fresh[:, k])]
+            for k, field in enumerate(self.fields)
+        }
@@ -0,0 +1,80 @@
+"""关键帧轨迹插值
+
+翻滚、侧翻这类动作原先写成move_time_write(..., 1000) + time.sleep(1)的序列：每秒最多一个
+姿态，sleep期间运动线程也收不到停止请求。KeyframeTrajectory把(姿态, 过渡时间, 保持时间)
+序列按调度器频率插值成逐拍的目标位置表（行×关节，int16），交给MotionScheduler下发，
+每拍之间都会检查running_flag，一拍之内即可打断。
+
+插值曲线（u为本段进度0..1）:
+    linear    u
+    cubic     3u^2 - 2u^3               两端速度为0
+    min_jerk  10u^3 - 15u^4 + 6u^5      两端速度、加速度为0，冲击最小
+
+用法:
+    traj = KeyframeTrajectory([({3: 250, 9: 250}, 1.0), ({2: 250, 10: 250}, 1.0, 0.5)], 40)
+    sched = MotionScheduler(traj.rate)
+    sched.run(traj.table(last_posture), lambda row: servo.move_many(row, traj.tick_ms(), traj.joints))
+"""
+import numpy as np
+
+LINEAR = "linear"
+CUBIC = "cubic"
+MIN_JERK = "min_jerk"
+
+
+def ease(u, profile=MIN_JERK):
+    """把0..1的进度映射成0..1的位移比例"""
+    if profile == LINEAR:
+        return u
+    if profile == CUBIC:
+        return u * u * (3 - 2 * u)
+    if profile == MIN_JERK:
+        return u * u * u * (10 + u * (6 * u - 15))
+    raise ValueError(f"未知的插值曲线: {profile}")
+
+
+class KeyframeTrajectory(object):
+    """关键帧序列
+
+    keyframes: [(姿态{关节ID: 位置}, 过渡时间s[, 保持时间s])]，姿态里未列出的关节保持上一目标
+    rate: 插值频率（Hz），应与下发用的MotionScheduler一致
+    profile: 插值曲线，见ease
+    """
+
+    def __init__(self, keyframes, rate, profile=MIN_JERK):
+        self.keyframes = [(dict(k[0]), float(k[1]), float(k[2]) if len(k) > 2 else 0.0) for k in keyframes]
+        self.rate = rate
+        self.profile = profile
+        ease(np.zeros(1), profile)  # 尽早发现写错的曲线名
+        self.joints = sorted({j for posture, _, _ in self.keyframes for j in posture})
+        self._cols = {j: k for k, j in enumerate(self.joints)}
+        # 起始姿态里没有的关节，从它第一次出现的目标开始（不插值）
+        self._first = {}
+        for posture, _, _ in self.keyframes:
+            for j, p in posture.items():
+                self._first.setdefault(j, p)
+
+    def duration(self):
+        return sum(d + h for _, d, h in self.keyframes)
+
+    def tick_ms(self):
+        # 每拍下发时舵机的运动时间：正好一拍，舵机在相邻两个插值点之间自行平滑
+        return max(1, int(round(1000.0 / self.rate)))
+
+    def table(self, start=None):
+        """从start姿态（{关节ID: 位置}，可为None）出发的逐拍目标表，int16 (行×关节)"""
+        start = start or {}
+        current = np.array([start.get(j, self._first[j]) for j in self.joints], dtype=float)
+        parts = []
+        for posture, duration, hold in self.keyframes:
+            target = current.copy()
+            for j, p in posture.items():
+                target[self._cols[j]] = p
+            n = max(1, int(round(duration * self.rate)))
+            u = ease(np.arange(1, n + 1) / n, self.profile)
+            parts.append(current + (target - current) * u[:, None])
+            n = int(round(hold * self.rate))
+            if n:
+                parts.append(np.repeat(target[None, :], n, axis=0))
+            current = target
+        return np.rint(np.concatenate(parts)).astype(np.int16)
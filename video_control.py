@@ -0,0 +1,163 @@
+"""自适应视频码率控制
+
+远程代理经常走蜂窝网络，固定320x240、JPEG质量80、10帧/秒在弱链路上会让paho的发送
+队列越积越长，画面延迟到几秒甚至几十秒。视频帧改用QoS1发布，LinkMonitor跟踪每一帧
+从publish到PUBACK的往返时间和还没确认的帧数；AdaptiveVideoController据此在档位表
+（分辨率, JPEG质量, 帧率）上升降:
+
+    拥塞  发布队列有积压，或未确认帧 >= INFLIGHT_HIGH，或RTT > RTT_HIGH
+          -> 立即降一档（两次降档至少间隔DOWN_HOLD秒，等上一次调整见效）
+    空闲  无积压、未确认帧 <= 1、RTT < RTT_LOW，持续UP_HOLD秒
+          -> 升一档
+
+未确认帧达到INFLIGHT_MAX时直接丢掉新帧不发（admit返回False），宁可掉帧也不排队。
+"""
+import threading
+import time
+
+# (分辨率, JPEG质量, 帧率)，从低到高；最高档即原先的固定设置
+LADDER = (
+    ((160, 120), 40, 3),
+    ((160, 120), 55, 5),
+    ((240, 180), 55, 5),
+    ((240, 180), 65, 8),
+    ((320, 240), 65, 10),
+    ((320, 240), 80, 10),
+)
+INFLIGHT_HIGH = 3   # 未确认帧达到该数视为拥塞
+INFLIGHT_MAX = 6    # 未确认帧达到该数时新帧直接丢弃
+RTT_HIGH = 0.8      # 确认往返时间超过该秒数视为拥塞
+RTT_LOW = 0.3       # 低于该秒数才允许升档
+RTT_ALPHA = 0.2     # RTT指数平均系数
+UP_HOLD = 2.0       # 持续空闲该秒数后升一档（按时间而不是帧数，低帧率时也能及时回升）
+DOWN_HOLD = 1.0     # 两次降档的最小间隔（秒）
+ACK_TIMEOUT = 5.0   # 超过该秒数未确认的帧按丢失处理
+
+
+class LinkMonitor(object):
+    """跟踪QoS>0消息的确认：未确认数与往返时间（RTT）
+
+    sent由发布线程在publish返回后调用，acked由paho网络线程的on_publish调用；paho在持有
+    内部锁时回调on_publish，所以调用方不能持有这里的锁去publish。确认可能先于sent
+    到达，先记下来，sent时直接算完成。
+    """
+
+    def __init__(self, alpha=RTT_ALPHA, timeout=ACK_TIMEOUT):
+        self.alpha = alpha
+        self.timeout = timeout
+        self._pending = {}  # mid -> 发布时刻
+        self._early = {}    # 先于sent到达的确认：mid -> 确认时刻
+        self._lock = threading.Lock()
+        self.rtt = None
+        self.acked_count = 0
+        self.lost = 0
+
+    def _sample(self, rtt):
+        self.rtt = rtt if self.rtt is None else self.rtt + self.alpha * (rtt - self.rtt)
+        self.acked_count += 1
+
+    def sent(self, mid, t0):
+        with self._lock:
+            acked = self._early.pop(mid, None)
+            if acked is None:
+                self._pending[mid] = t0
+            else:
+                self._sample(acked - t0)
+
+    def acked(self, mid, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            t0 = self._pending.pop(mid, None)
+            if t0 is None:
+                self._early[mid] = now
+            else:
+                self._sample(now - t0)
+
+    def inflight(self, now=None):
+        """未确认的消息数，超时的按丢失清掉"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [mid for mid, t0 in self._pending.items() if now - t0 > self.timeout]
+            for mid in expired:
+                del self._pending[mid]
+            self.lost += len(expired)
+            if expired:
+                # 丢失的帧至少算一个超时的RTT，避免链路断开时RTT停在旧值
+                self._sample(self.timeout)
+            # QoS0消息发出时paho也会回调on_publish，这些mid永远等不到sent
+            for mid in [mid for mid, t in self._early.items() if now - t > self.timeout]:
+                del self._early[mid]
+            return len(self._pending)
+
+    def stats(self):
+        return {
+            "inflight": len(self._pending),
+            "rtt_ms": None if self.rtt is None else round(self.rtt * 1000, 1),
+            "acked": self.acked_count,
+            "lost": self.lost,
+        }
+
+
+class AdaptiveVideoController(object):
+    def __init__(self, ladder=LADDER, level=None):
+        self.ladder = tuple(ladder)
+        self.level = len(self.ladder) - 1 if level is None else level
+        self._clear_since = None
+        self._last_down = -float("inf")
+        self.downs = 0
+        self.ups = 0
+        self.skipped = 0
+
+    @property
+    def resolution(self):
+        return self.ladder[self.level][0]
+
+    @property
+    def quality(self):
+        return self.ladder[self.level][1]
+
+    @property
+    def fps(self):
+        return self.ladder[self.level][2]
+
+    def update(self, backlog, inflight, rtt, now=None):
+        """每帧发布前调用一次，返回档位是否变化"""
+        now = time.monotonic() if now is None else now
+        congested = backlog > 0 or inflight >= INFLIGHT_HIGH or (rtt is not None and rtt > RTT_HIGH)
+        if congested:
+            self._clear_since = None
+            if self.level > 0 and now - self._last_down >= DOWN_HOLD:
+                self.level -= 1
+                self._last_down = now
+                self.downs += 1
+                return True
+            return False
+        if inflight <= 1 and (rtt is None or rtt < RTT_LOW):
+            if self._clear_since is None:
+                self._clear_since = now
+            elif now - self._clear_since >= UP_HOLD and self.level < len(self.ladder) - 1:
+                self.level += 1
+                self._clear_since = now
+                self.ups += 1
+                return True
+        else:
+            self._clear_since = None
+        return False
+
+    def admit(self, inflight):
+        """未确认帧太多时丢掉这一帧"""
+        if inflight >= INFLIGHT_MAX:
+            self.skipped += 1
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "resolution": list(self.resolution),
+            "quality": self.quality,
+            "fps": self.fps,
+            "downs": self.downs,
+            "ups": self.ups,
+            "skipped": self.skipped,
+        }
@@ -5,13 +5,18 @@ import math
 import numpy as np
 import threading
 import scipy.optimize as optimize
+from gait_generator import GaitGenerator, GaitCache, TurnBlend
+from motion_scheduler import MotionScheduler, DELAY, loop_rate
+import gait_fit
 # from driver_imu import Imu
         
 SNAKE_LENGTH = 12
+GAIT_CACHE = GaitCache()   ##按k、d缓存一个周期的步态表
 
 class Process(object):
     def __init__(self):
         self.servo = ServoDriver()   ###创建类的对象
+        self.servo.set_deadband(2)   ###目标变化不超过2个计数时跳过写入，每0.25s强制刷新
         self.enable(1)
         self.servo_list = []   ##舵机id列表
         # self.demo1 = Imu()#111
@@ -22,6 +27,9 @@ class Process(object):
         self.y=0
         self.N=400   ##直径85cm左右
         self.M=0
+        self.scheduler = None   ##当前步态的MotionScheduler，scheduler.stats()查看抖动/超时
+        self.turn = TurnBlend([i-1 for i in range(1,12,2)])   ##转弯偏置(i-1)*k，set_k()时按lam过渡
+        self.turn.reset(self.k)
         self.functions = (self.wanyan_zhixing
              )##复位0 蠕动1 蠕动2 蜿蜒直行3 翻滚左4  翻滚右5 侧滑左边6 侧滑右7
 
@@ -33,9 +41,13 @@ class Process(object):
             print(self.servo_list)
 
     def offset_adjust(self):  ##读取舵机位置
+        state, valid = self.servo.sweep(('pos',))
         for i in range(SNAKE_LENGTH):
-            a, b = self.servo.pos_read(i)
-            print(i, a, b)
+            if not valid[i, 0]:
+                print(i, 'pos read error')
+                continue
+            a = int(state['pos'][i])
+            print(i, a)
             self.servo.angle_offset_adjust(i, a-400)
             self.servo.angle_offset_write(i)
 
@@ -45,12 +57,12 @@ class Process(object):
     def disable(self, value=0):  #
         for i in range(SNAKE_LENGTH):  # 遍历12个舵机
             self.servo.load_or_unload_write(i, value)  # 0 掉电，1装电，恒为0
-    def read(self):     ##读取舵机id
+    def read(self):     ##读取舵机位置、电压、温度
+        state, valid = self.servo.sweep()
         for i in range(SNAKE_LENGTH):
-            a, b = self.servo.pos_read(i)
-            print(i, a, b)
+            print(i, *[state[f][i] if valid[i, k] else None for k, f in enumerate(state.dtype.names)])
     def target_func(self, x, a0, a1, a2, a3):
-        return a0 * np.sin(a1 * x + a2) + a3
+        return gait_fit.target_func(x, a0, a1, a2, a3)
 
 
     def fuwei(self):       ##复位
@@ -66,17 +78,27 @@ class Process(object):
 
     ######  蜿蜒
     def wanyan_zhixing(self):  
-        while True:
+        odd = range(1,12,2)    ##1，3，5，7，9，11
+        # s=190*(math.sin(math.pi*self.t/125+math.pi*(i-1)/(2.0*self.d)+math.pi/4))+410+(i-1)*self.k，每个关节t推进1
+        gait = GaitGenerator([12-i for i in odd], 190, 125,
+                             phase=[math.pi*(i-1)/(2.0*self.d)+math.pi/4 for i in odd],
+                             offset=410, step=6, tick_shift=range(6))
+        table = GAIT_CACHE.table(gait)
+        print('蜿蜒直行')
+        def rows():
+            while True:
+                yield table[(self.t // 6) % len(table)]
+                self.t = self.t + 6
+        def emit(row):
             self.servo.move_time_write(0,430,2)
-            for i in range(1,12,2):    ##1，3，5，7，9，11
-               # s=190*(math.sin(math.pi*self.t/125+math.pi*(i-1)/(2.0*self.d)+math.pi/4))+410+i*1.2
-                s=190*(math.sin(math.pi*self.t/125+math.pi*(i-1)/(2.0*self.d)+math.pi/4))+410+(i-1)*self.k
-                #print(12-i,int(s),self.t)
-                print('蜿蜒直行')
-                self.servo.move_time_write(12-i,int(s),4)
-                time.sleep(0.002)
-                self.t = self.t + 1
+            self.servo.move_many(row + self.turn.offsets(), 4, gait.joints)
+        self.scheduler = MotionScheduler(loop_rate(0.012, 7), policy=DELAY)   ##原循环每行7次写入+6次0.002s，约56.8Hz，整帧写不完时不跳行
+        self.scheduler.run(rows(), emit)
     
+    def set_k(self, k):   ##运行中改转弯系数，偏置在LAM_RISE_TIME/LAM_FALL_TIME内平滑过渡
+        self.k = k
+        self.turn.set(k)
+
     def main(self):
         while True:
             user_input = input("请输入数字0到7(蜿蜒)（输入'q'退出）：")